@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge
+
+# define prometheus metrics
+QUEUE_DEPTH = Gauge(
+    "search_admission_queue_depth", "Number of searches waiting for an execution slot"
+)
+INFLIGHT = Gauge(
+    "search_inflight_requests", "Number of searches currently executing"
+)
+DEGRADATION_LEVEL = Gauge(
+    "search_degradation_level", "Current degradation level (0 = full pipeline, see DEGRADE_* levels)"
+)
+REJECTED = Counter(
+    "search_rejected_total", "Searches rejected by admission control", ["reason"]
+)
+
+# Degradation levels, each one implies the ones below it
+DEGRADE_NONE = 0
+DEGRADE_NO_PRF = 1          # skip the Rocchio refine_query round
+DEGRADE_REDUCED_WINDOW = 2  # score from tier-1 champion lists only
+DEGRADE_STALE_CACHE = 3     # serve cached windows past their TTL instead of recomputing
+
+# queue fill ratio at which each level kicks in
+DEGRADE_THRESHOLDS = (
+    (DEGRADE_STALE_CACHE, 0.75),
+    (DEGRADE_REDUCED_WINDOW, 0.5),
+    (DEGRADE_NO_PRF, 0.0),
+)
+
+MAX_INFLIGHT = int(os.environ.get("SEARCH_MAX_INFLIGHT", "8"))
+MAX_QUEUE = int(os.environ.get("SEARCH_MAX_QUEUE", "32"))
+REQUEST_TIMEOUT = float(os.environ.get("SEARCH_REQUEST_TIMEOUT", "10"))
+RETRY_AFTER = int(os.environ.get("SEARCH_RETRY_AFTER", "1"))
+
+
+class Overloaded(Exception):
+    """Raised when a search can't be admitted (queue full) or misses its deadline."""
+    def __init__(self, message: str, retry_after: int = RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Concurrency limiter with a bounded wait queue.
+    At most `max_inflight` searches execute at once, up to `max_queue` more wait
+    for a slot until their deadline; anything beyond that is rejected right away.
+    """
+    def __init__(self, max_inflight: int = MAX_INFLIGHT, max_queue: int = MAX_QUEUE,
+                 retry_after: int = RETRY_AFTER):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.inflight = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def level(self) -> int:
+        # degradation level from how full the queue is, nothing waiting -> full pipeline
+        with self._cond:
+            return self._level()
+
+    def _level(self) -> int:
+        if self.waiting == 0:
+            return DEGRADE_NONE
+        fill = self.waiting / self.max_queue if self.max_queue else 1.0
+        for level, threshold in DEGRADE_THRESHOLDS:
+            if fill > threshold:
+                return level
+        return DEGRADE_NONE
+
+    def _update_gauges(self):
+        QUEUE_DEPTH.set(self.waiting)
+        INFLIGHT.set(self.inflight)
+        DEGRADATION_LEVEL.set(self._level())
+
+    @contextmanager
+    def slot(self, deadline: float):
+        """Hold an execution slot for the duration of the block, waiting until `deadline` (time.monotonic())."""
+        with self._cond:
+            if self.inflight >= self.max_inflight:
+                if self.waiting >= self.max_queue:
+                    REJECTED.labels(reason="queue_full").inc()
+                    raise Overloaded("Search queue is full", self.retry_after)
+                self.waiting += 1
+                self._update_gauges()
+                try:
+                    while self.inflight >= self.max_inflight:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            REJECTED.labels(reason="deadline").inc()
+                            raise Overloaded("Search deadline exceeded while queued", self.retry_after)
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+                    self._update_gauges()
+            self.inflight += 1
+            self._update_gauges()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.inflight -= 1
+                self._update_gauges()
+                self._cond.notify()
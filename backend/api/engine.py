@@ -2,9 +2,22 @@ import redis
 import hashlib
 import os
 import json
+import resource
 import subprocess
-from typing import List, Dict # Tuple removed as _get_metrics is removed
+import sys
+import threading
+import time
+from typing import List, Dict, Optional, Tuple
 from prometheus_client import Counter, Histogram
+from .admission import (
+    AdmissionController, Overloaded, REJECTED, REQUEST_TIMEOUT,
+    DEGRADE_NONE, DEGRADE_NO_PRF, DEGRADE_REDUCED_WINDOW, DEGRADE_STALE_CACHE,
+)
+from .profiling import profile_call, profile_search
+from .instrumentation import (
+    query_type, parse_script_stats, record_script_counters, record_query, record_term_cache, record_memory,
+    QUERY_MEMORY_PEAK,
+)
 
 # define prometheus metrics
 CACHE_HITS = Counter(
@@ -13,89 +26,278 @@ CACHE_HITS = Counter(
 CACHE_MISSES = Counter(
     "search_cache_misses_total", "Total number of cache misses"
 )
+PAGE_CACHE_HITS = Counter(
+    "search_page_cache_hits_total", "Total number of cache hits served as pre-encoded response pages"
+)
+STALE_SERVED = Counter(
+    "search_stale_served_total", "Total number of cached windows served past their TTL"
+)
 # Note: For true p95 latency, a Prometheus server should scrape /metrics and calculate it.
 REQUEST_LATENCY = Histogram(
     "search_request_latency_seconds", "Latency of search requests"
 )
 
 PAGINATION_RESULT_WINDOW = 100
+RANKINGS = ("tfidf", "bm25")
+# "auto" is exhaustive, switching to fast (tier-1 champion lists) while more than FAST_MODE_INFLIGHT
+# searches are running (this one included). Has to stay below SEARCH_MAX_INFLIGHT to ever kick in
+MODES = ("auto", "exhaustive", "fast")
+FAST_MODE_INFLIGHT = int(os.environ.get("SEARCH_FAST_MODE_INFLIGHT", "6"))
+# resident mode: run searches in this process against an index loaded once, instead of one
+# search.py process per cache miss. Needed for anything cached across queries (the term score cache)
+RESIDENT = os.environ.get("SEARCH_RESIDENT", "0") == "1"
+TERM_CACHE_MB = int(os.environ.get("SEARCH_TERM_CACHE_MB", "256"))
+# per-query cap on the memory of scored candidates, broader queries keep a bounded exact top-k (0 = no cap)
+MAX_CANDIDATE_MB = int(os.environ.get("SEARCH_MAX_CANDIDATE_MB", "0"))
+SEARCH_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'search'))
+
+def _search_module():
+    # search/ is a script directory, not a package
+    if SEARCH_DIR not in sys.path:
+        sys.path.insert(0, SEARCH_DIR)
+    import search
+    return search
 
 class SearchEngine:
-    def search(self, query: str, page: int = 1, limit: int = 10) -> Dict:
+    def search(self, query: str, page: int = 1, limit: int = 10, ranking: str = "tfidf", mode: str = "auto") -> Dict:
         """
         Abstract search interface.
+        `ranking` selects the ranking function (one of RANKINGS),
+        `mode` trades recall for latency (one of MODES).
         Returns a dict with 'page_results' and 'total_in_window'.
         Metrics (avg_latency_ms, cache_hit_rate) are removed from this response.
         They should be fetched from the /metrics endpoint.
         """
         raise NotImplementedError
 
+    def profile(self, query: str, ranking: str = "tfidf", mode: str = "exhaustive", no_prf: bool = False,
+                sort: str = "cumulative", top: int = 30) -> Dict:
+        """
+        Run one uncached search under cProfile.
+        Returns the top `top` functions by `sort` (one of profiling.PROFILE_SORTS).
+        """
+        raise NotImplementedError
+
 class PythonSearchEngine(SearchEngine):
-    def __init__(self):
+    def __init__(self, index_dir: Optional[str] = None, metadata_file: Optional[str] = None, redis_client=None,
+                 resident: Optional[bool] = None):
+        # index_dir / metadata_file / redis_client default to the repo layout and a local Redis,
+        # the benchmarks point them at a generated index and a fake Redis.
+        # resident defaults to SEARCH_RESIDENT
         base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        index_dir = index_dir or os.path.join(base_dir, 'search')
         self.search_script = os.path.join(base_dir, 'search', 'search.py')
-        self.dict_file = os.path.join(base_dir, 'search', 'dictionary.txt')
-        self.postings_file = os.path.join(base_dir, 'search', 'postings.txt')
-        self.metadata_file = os.path.join(base_dir, 'scripts', 'corpus.jsonl')  # adjust if needed
-        self.redis = redis.Redis(host='localhost', port=6379, db=0)
+        self.dict_file = os.path.join(index_dir, 'dictionary.txt')
+        self.postings_file = os.path.join(index_dir, 'postings.txt')
+        self.metadata_file = metadata_file or os.path.join(base_dir, 'scripts', 'corpus.jsonl')  # adjust if needed
+        self.impacts_dict_file = os.path.join(index_dir, 'impacts_dictionary.txt')
+        self.impacts_file = os.path.join(index_dir, 'impacts.txt')
+        self.champions_dict_file = os.path.join(index_dir, 'champions_dictionary.txt')
+        self.champions_file = os.path.join(index_dir, 'champions.txt')
+        # segmented index (search/segments.py), searched instead of dict/postings files once it exists.
+        # `segments.py ingest` starts it from this index (the base segment), segments hold newer documents
+        self.segments_manifest = os.path.join(index_dir, 'segments', 'segments.json')
+        self._manifest_mtime = None
+        # materialized boolean conjunctions (search/intersections.py), used by search.py once built
+        self.intersections_manifest = os.path.join(index_dir, 'intersections.json')
+        self._index_generation = 0
+        self.redis = redis_client or redis.Redis(host='localhost', port=6379, db=0)
         self.cache_ttl = 3600  # 1 hour
+        self.degraded_cache_ttl = 60  # windows computed while degraded
+        self.stale_ttl = 86400  # how long past its TTL a window can still be served when degraded
+        self.admission = AdmissionController()
+        self._terms_version = self._index_version()
         self._dictionary_terms = self._load_dictionary_terms()
+        self.resident = RESIDENT if resident is None else resident
+        self._index = None  # search.SearchIndex, loaded by the first resident search
+        self._index_lock = threading.Lock()  # held while checking for / loading a new index
+        self.term_cache = None
+        if self.resident:
+            self.term_cache = _search_module().TermScoreCache(TERM_CACHE_MB << 20)
+        self.memory_report()
 
-    def _cache_key(self, query: str) -> str: # Cache key will be for the whole window
+    def _cache_key(self, query: str, ranking: str = "tfidf", mode: str = "exhaustive") -> str: # Cache key will be for the whole window
         # Use a hash to ensure key length stays reasonable
-        h = hashlib.sha256(f"{query}|{PAGINATION_RESULT_WINDOW}".encode()).hexdigest()
+        h = hashlib.sha256(f"{query}|{PAGINATION_RESULT_WINDOW}|{ranking}|{mode}|{self._index_version()}".encode()).hexdigest()
         return f"search_window:{h}"
 
+    def _index_version(self) -> int:
+        # generation of the segments manifest (0 without one). Part of the cache key, so newly
+        # ingested or deleted documents show up without waiting for cached windows to expire
+        try:
+            mtime = os.stat(self.segments_manifest).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+        if mtime != self._manifest_mtime:
+            try:
+                with open(self.segments_manifest) as f:
+                    self._index_generation = json.load(f)["generation"]
+                self._manifest_mtime = mtime
+            except (OSError, ValueError) as e:
+                print(f"Failed to read segments manifest: {e}")
+        return self._index_generation
+
     def _load_dictionary_terms(self) -> List[str]:
-        # Load all terms from dictionary.txt, strip whitespace, ignore empty lines
+        # Load all terms from dictionary.txt, strip whitespace, ignore empty lines.
+        # With a segmented index, terms that only its segments have are added
         if not os.path.exists(self.dict_file):
             print(f"Dictionary file not found: {self.dict_file}")
             return []
         with open(self.dict_file, 'r', encoding='utf-8') as f:
-            terms = [line.strip() for line in f if line.strip()]
-        return terms
+            terms = {line.split(None, 1)[0]: line.strip() for line in f if line.strip()}
+        seg_dir = os.path.dirname(self.segments_manifest)
+        try:
+            with open(self.segments_manifest) as f:
+                segments = [seg for seg in json.load(f)["segments"] if not seg.get("base")]
+        except (OSError, ValueError):
+            segments = []
+        for seg in segments:
+            try:
+                with open(os.path.join(seg_dir, seg["name"], "dictionary.txt"), 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            terms.setdefault(line.split(None, 1)[0], line.strip())
+            except FileNotFoundError:
+                continue  # retired by a merge since the manifest was read, its terms are in the merged segment
+        return [terms[zk] for zk in sorted(terms)]
+
+    def memory_report(self) -> Dict:
+        # estimated size of what this process keeps in memory between requests, also sets the
+        # search_resident_* gauges. Without resident mode every search.py process loads its own
+        # index, /debug/memory/query reports that one's structures
+        search = _search_module()
+        index = self._index
+        usage = {"_dictionary_terms": {"entries": len(self._dictionary_terms),
+                                       "bytes": search.estimate_sizeof(self._dictionary_terms)}}
+        if index is not None:
+            usage.update(index.memory_usage())
+        if self.term_cache is not None:
+            usage["term_cache"] = {"entries": len(self.term_cache), "bytes": self.term_cache.bytes}
+        record_memory(usage)
+        return {
+            "resident": self.resident,
+            "index_version": index.version if index is not None else None,
+            "structures": usage,
+            "total_bytes": sum(sizes["bytes"] for sizes in usage.values()),
+            "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,  # ru_maxrss is in KiB on Linux
+            "max_candidate_bytes": MAX_CANDIDATE_MB << 20,
+            "max_candidates": search.candidate_limit(MAX_CANDIDATE_MB),
+        }
+
+    def suggestions_version(self) -> int:
+        # version of the terms get_suggestions sees (a stat, cheap enough to call per keystroke)
+        return self._index_version()
 
     def get_suggestions(self, prefix: str, limit: int = 5) -> List[str]:
-        # Case-insensitive prefix matching, return up to 'limit' suggestions
+        # Case-insensitive prefix matching, return up to 'limit' suggestions.
+        # Terms are reloaded once a new segments generation is published
+        version = self._index_version()
+        if version != self._terms_version:
+            self._dictionary_terms = self._load_dictionary_terms()
+            self._terms_version = version
         prefix_lower = prefix.lower()
         suggestions = [term for term in self._dictionary_terms if term.lower().startswith(prefix_lower)]
         return suggestions[:limit]
 
+    def _page_key(self, window_key: str, page: int, limit: int) -> str:
+        # encoded /search response for one page of a window, derived from the window key
+        # so it changes with the index version as well
+        return f"search_page:{window_key.split(':', 1)[1]}:{page}:{limit}"
+
+    def _cache_get(self, key: str) -> Tuple[Optional[bytes], Optional[int]]:
+        # Returns (cached window or None, seconds it stays fresh, None once stale). Entries are kept
+        # stale_ttl past their TTL so they can still be served when the engine is degraded or overloaded.
+        pipe = self.redis.pipeline()
+        pipe.get(key)
+        pipe.ttl(key)
+        cached_window, ttl = pipe.execute()
+        if cached_window is None:
+            return None, None
+        if ttl < 0:
+            return cached_window, self.cache_ttl  # no expiry set
+        return cached_window, (ttl - self.stale_ttl if ttl > self.stale_ttl else None)
+
     @REQUEST_LATENCY.time() # This will still record latency for the current request
-    def search(self, query: str, page: int = 1, limit: int = 10) -> Dict:
-        key = self._cache_key(query) # Cache based on query for the PAGINATION_RESULT_WINDOW
+    def search(self, query: str, page: int = 1, limit: int = 10, ranking: str = "tfidf", mode: str = "auto") -> Dict:
+        page_results, total_in_window, _ = self._search(query, page, limit, ranking, mode)
+        # Metrics are no longer calculated and returned here
+        return {
+            "page_results": page_results,
+            "total_in_window": total_in_window
+            # avg_latency_ms and cache_hit_rate removed
+        }
+
+    @REQUEST_LATENCY.time()
+    def search_json(self, query: str, page: int = 1, limit: int = 10, ranking: str = "tfidf",
+                    mode: str = "auto") -> bytes:
+        """
+        Same as search, but returns the encoded /search response body ({"results", "total_in_window"}).
+        Encoded pages are cached next to their window, so a hit is one Redis GET: no JSON decoding
+        or encoding of the window and no response model validation.
+        """
+        start = time.perf_counter()
+        page_key = self._page_key(self._cache_key(query, ranking, mode), page, limit)
+        body = self.redis.get(page_key)
+        if body is not None:
+            CACHE_HITS.inc()
+            PAGE_CACHE_HITS.inc()
+            total = time.perf_counter() - start
+            qtype = query_type(query)
+            record_query(query, qtype, {"cache_lookup": total},
+                         {"query_type": qtype, "ranking": ranking, "mode": mode, "cache": "page"}, total)
+            return body
+
+        page_results, total_in_window, page_ttl = self._search(query, page, limit, ranking, mode)
+        body = json.dumps({"results": page_results, "total_in_window": total_in_window}).encode()
+        if page_ttl:
+            self.redis.set(page_key, body, ex=page_ttl)
+        return body
+
+    def _search(self, query: str, page: int, limit: int, ranking: str, mode: str) -> Tuple[List[Dict], int, Optional[int]]:
+        # (page results, total in window, seconds the page may be cached as-is, None for stale/failed windows)
+        if ranking not in RANKINGS:
+            raise ValueError(f"Unknown ranking: {ranking}")
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode: {mode}")
+        deadline = time.monotonic() + REQUEST_TIMEOUT
+        start = time.perf_counter()
+        qtype = query_type(query)
+        timings: Dict[str, float] = {}
+        plan: Dict = {"query_type": qtype, "ranking": ranking, "mode": mode}
+        key = self._cache_key(query, ranking, mode) # Cache based on query for the PAGINATION_RESULT_WINDOW
         
         all_results_in_window: List[Dict] = []
 
-        # 1) Try cache for the entire window
-        cached_window = self.redis.get(key)
-        if cached_window:
+        # 1) Try cache for the entire window (hits bypass admission control)
+        cached_window, page_ttl = self._cache_get(key)
+        fresh = page_ttl is not None
+        timings["cache_lookup"] = time.perf_counter() - start
+        if cached_window and (fresh or self.admission.level() >= DEGRADE_STALE_CACHE):
             CACHE_HITS.inc()
+            if not fresh:
+                STALE_SERVED.inc()
+            plan["cache"] = "hit" if fresh else "stale"
+            decode_start = time.perf_counter()
             all_results_in_window = json.loads(cached_window)
+            timings["decode"] = time.perf_counter() - decode_start
         else:
             CACHE_MISSES.inc()
-            # 2) Cache miss: run subprocess to get the window
-            cmd = [
-                "python3", self.search_script,
-                "--dict-file", self.dict_file,
-                "--postings-file", self.postings_file,
-                "--metadata-file", self.metadata_file,
-                "--query", query,
-                "--topk", str(PAGINATION_RESULT_WINDOW), # Fetch the whole window
-                "--output-format", "json"
-            ]
+            plan["cache"] = "miss"
+            # 2) Cache miss: run subprocess to get the window, once admitted
+            queued = time.perf_counter()
             try:
-                output = subprocess.check_output(cmd, text=True)
-                all_results_in_window = json.loads(output)
-                # 3) Store the entire window in cache
-                self.redis.set(key, json.dumps(all_results_in_window), ex=self.cache_ttl)
-            except subprocess.CalledProcessError as e:
-                # Handle errors from the script, e.g., if it returns non-zero exit code
-                print(f"Search script error: {e}")
-                all_results_in_window = [] # Return empty if script fails
-            except json.JSONDecodeError as e:
-                print(f"Failed to parse JSON from search script: {e}")
-                all_results_in_window = []
+                with self.admission.slot(deadline):
+                    timings["queue_wait"] = time.perf_counter() - queued
+                    all_results_in_window, page_ttl = self._run_search(key, query, ranking, mode, deadline,
+                                                                       timings, plan)
+            except Overloaded:
+                # a stale window beats a 503
+                if not cached_window:
+                    raise
+                STALE_SERVED.inc()
+                plan["cache"] = "stale"
+                page_ttl = None
+                all_results_in_window = json.loads(cached_window)
 
         total_in_window = len(all_results_in_window)
 
@@ -103,10 +305,191 @@ class PythonSearchEngine(SearchEngine):
         start_index = (page - 1) * limit
         end_index = start_index + limit
         page_results = all_results_in_window[start_index:end_index]
-        
-        # Metrics are no longer calculated and returned here
-        return {
-            "page_results": page_results,
-            "total_in_window": total_in_window
-            # avg_latency_ms and cache_hit_rate removed
-        }
\ No newline at end of file
+        record_query(query, qtype, timings, plan, time.perf_counter() - start)
+        return page_results, total_in_window, page_ttl
+
+    def _search_cmd(self, query: str, ranking: str, mode: str, no_prf: bool = False) -> List[str]:
+        # search.py invocation for one query window ("auto" mode must already be resolved)
+        cmd = [
+            "python3", self.search_script,
+            "--dict-file", self.dict_file,
+            "--postings-file", self.postings_file,
+            "--metadata-file", self.metadata_file,
+            "--query", query,
+            "--topk", str(PAGINATION_RESULT_WINDOW), # Fetch the whole window
+            "--output-format", "json",
+            "--ranking", ranking,
+            "--impacts-dict-file", self.impacts_dict_file,
+            "--impacts-file", self.impacts_file,
+            "--mode", mode,
+            "--champions-dict-file", self.champions_dict_file,
+            "--champions-file", self.champions_file,
+            "--max-candidate-mb", str(MAX_CANDIDATE_MB),
+            "--stats"
+        ]
+        if no_prf:
+            cmd.append("--no-prf")
+        if os.path.exists(self.segments_manifest):
+            cmd += ["--segments-manifest", self.segments_manifest]
+        if os.path.exists(self.intersections_manifest):
+            cmd += ["--intersections-manifest", self.intersections_manifest]
+        return cmd
+
+    def _run_search(self, key: str, query: str, ranking: str, mode: str, deadline: float,
+                    timings: Dict[str, float], plan: Dict) -> Tuple[List[Dict], Optional[int]]:
+        # (window, TTL it was cached with, None if it couldn't be computed)
+        # Degrade based on the load at the time the search actually runs:
+        # skip PRF first, then score from the tier-1 champion lists ("auto" mode only,
+        # an explicitly requested mode is respected).
+        level = self.admission.level()
+        # an "auto" window computed in fast mode is approximate: cached briefly, like degraded ones,
+        # so a full window replaces it once the load is gone
+        reduced = False
+        if mode == "auto":
+            reduced = level >= DEGRADE_REDUCED_WINDOW or bool(FAST_MODE_INFLIGHT and self.admission.inflight > FAST_MODE_INFLIGHT)
+            mode = "fast" if reduced else "exhaustive"
+        no_prf = level >= DEGRADE_NO_PRF
+        plan["degradation_level"] = level
+        ttl = None
+        try:
+            if self.resident:
+                all_results_in_window = self._run_resident(query, ranking, mode, no_prf, deadline, timings, plan)
+            else:
+                all_results_in_window = self._run_script(query, ranking, mode, no_prf, deadline, timings, plan)
+
+            # 3) Store the entire window in cache, degraded windows only briefly so full results replace them
+            store_start = time.perf_counter()
+            window_ttl = self.degraded_cache_ttl if level > DEGRADE_NONE or reduced else self.cache_ttl
+            self.redis.set(key, json.dumps(all_results_in_window), ex=window_ttl + self.stale_ttl)
+            ttl = window_ttl
+            timings["cache_store"] = time.perf_counter() - store_start
+        except subprocess.TimeoutExpired:
+            REJECTED.labels(reason="deadline").inc()
+            raise Overloaded("Search deadline exceeded")
+        except subprocess.CalledProcessError as e:
+            # Handle errors from the script, e.g., if it returns non-zero exit code
+            print(f"Search script error: {e}")
+            parse_script_stats(e.stderr or "")
+            all_results_in_window = [] # Return empty if script fails
+        except json.JSONDecodeError as e:
+            print(f"Failed to parse JSON from search script: {e}")
+            all_results_in_window = []
+        return all_results_in_window, ttl
+
+    def _run_script(self, query: str, ranking: str, mode: str, no_prf: bool, deadline: float,
+                    timings: Dict[str, float], plan: Dict) -> List[Dict]:
+        # one search.py process for the window
+        cmd = self._search_cmd(query, ranking, mode, no_prf=no_prf)
+        spawned = time.perf_counter()
+        proc = subprocess.run(cmd, capture_output=True, text=True, check=True,
+                              timeout=max(deadline - time.monotonic(), 0.001))
+        wall = time.perf_counter() - spawned
+        script_stats = parse_script_stats(proc.stderr)
+        if script_stats:
+            # the script times itself from its first import, the rest is process spawn & interpreter startup
+            script_times = script_stats.get("times", {})
+            timings["process_spawn"] = max(wall - script_times.pop("total", 0.0), 0.0)
+            timings.update(script_times)
+            record_script_counters(plan["query_type"], script_stats.get("counters", {}))
+            plan.update(script_stats.get("plan", {}))
+        else:
+            timings["process"] = wall
+
+        decode_start = time.perf_counter()
+        all_results_in_window = json.loads(proc.stdout)
+        timings["decode"] = time.perf_counter() - decode_start
+        return all_results_in_window
+
+    def _run_resident(self, query: str, ranking: str, mode: str, no_prf: bool, deadline: float,
+                      timings: Dict[str, float], plan: Dict) -> List[Dict]:
+        # search in this process. Postings are read with pread, so resident searches run concurrently
+        # and only wait for each other while the index is (re)loaded. The deadline only bounds that
+        # wait, a running query can't be interrupted the way a search.py process can be killed
+        search = _search_module()
+        waited = time.perf_counter()
+        if not self._index_lock.acquire(timeout=max(deadline - time.monotonic(), 0.001)):
+            REJECTED.labels(reason="deadline").inc()
+            raise Overloaded("Search deadline exceeded")
+        try:
+            timings["index_wait"] = time.perf_counter() - waited
+            stats = search.reset_query_stats()
+            index = self._resident_index(search)
+        finally:
+            self._index_lock.release()
+        all_results_in_window = search.run_query(index, query, PAGINATION_RESULT_WINDOW, ranking, mode,
+                                                 no_prf, self.term_cache, search.candidate_limit(MAX_CANDIDATE_MB))
+        timings.update(stats.times)
+        record_script_counters(plan["query_type"], stats.counters)
+        record_term_cache(self.term_cache)
+        plan.update(stats.plan)
+        return all_results_in_window
+
+    def _resident_index(self, search):
+        # the loaded index, reloaded once a new segments generation is published or postings.txt is rebuilt
+        # (the reload's load stages land in this query's timings). A swapped out index is closed once
+        # the last query still using it drops it
+        segmented = os.path.exists(self.segments_manifest)
+        if segmented:
+            version = f"g{self._index_version()}"
+        else:
+            st = os.stat(self.postings_file)
+            version = f"{st.st_mtime_ns}-{st.st_size}"
+        if self._index is None or self._index.version != version:
+            index = search.SearchIndex(
+                self.dict_file, self.postings_file, self.metadata_file,
+                self.impacts_dict_file, self.impacts_file,
+                self.champions_dict_file, self.champions_file,
+                self.segments_manifest if segmented else None,
+                self.intersections_manifest,
+            )
+            self._index = index
+            self.memory_report()
+        return self._index
+
+    def profile(self, query: str, ranking: str = "tfidf", mode: str = "exhaustive", no_prf: bool = False,
+                sort: str = "cumulative", top: int = 30, timeout: float = REQUEST_TIMEOUT) -> Dict:
+        # run one uncached search under cProfile, it takes an execution slot like any other search.
+        # Resident searches are profiled in this process against the live index (term score cache
+        # included). Otherwise a search.py process is profiled, index loading and all
+        with self.admission.slot(time.monotonic() + timeout):
+            if not self.resident:
+                return profile_search(self._search_cmd(query, ranking, mode, no_prf=no_prf),
+                                      top=top, sort=sort, timeout=timeout)
+            search = _search_module()
+            with self._index_lock:
+                search.reset_query_stats()
+                index = self._resident_index(search)
+            return profile_call(lambda: search.run_query(
+                index, query, PAGINATION_RESULT_WINDOW, ranking, mode, no_prf, self.term_cache,
+                search.candidate_limit(MAX_CANDIDATE_MB)), top=top, sort=sort)
+
+    def trace_query_memory(self, query: str, ranking: str = "tfidf", mode: str = "exhaustive",
+                           no_prf: bool = False, timeout: float = REQUEST_TIMEOUT) -> Dict:
+        # run one uncached search under tracemalloc: its peak allocation & top allocation sites.
+        # Resident searches are traced in this process, so searches running at the same time add to
+        # the peak. Otherwise the search.py process traces itself and reports its index's structures too
+        qtype = query_type(query)
+        if self.resident:
+            search = _search_module()
+            with self._index_lock:
+                stats = search.reset_query_stats()
+                index = self._resident_index(search)
+            _, memory = search.trace_memory(lambda: search.run_query(
+                index, query, PAGINATION_RESULT_WINDOW, ranking, mode, no_prf, self.term_cache,
+                search.candidate_limit(MAX_CANDIDATE_MB)))
+            counters, plan = stats.counters, stats.plan
+        else:
+            cmd = self._search_cmd(query, ranking, mode, no_prf=no_prf) + ["--trace-memory"]
+            proc = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=timeout)
+            script_stats = parse_script_stats(proc.stderr) or {}
+            if "memory" not in script_stats:
+                raise RuntimeError("search.py reported no memory trace")
+            memory = script_stats["memory"]
+            counters, plan = script_stats.get("counters", {}), script_stats.get("plan", {})
+        QUERY_MEMORY_PEAK.labels(query_type=qtype).observe(memory["peak_bytes"])
+        memory.update({
+            "query_type": qtype,
+            "candidates_scored": counters.get("candidates_scored", 0),
+            "candidate_cap": plan.get("candidate_cap"),
+        })
+        return memory
@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+from typing import Dict, Optional
+from prometheus_client import Counter, Gauge, Histogram
+
+# define prometheus metrics, all labelled by query type (see query_type)
+STAGE_LATENCY = Histogram(
+    "search_stage_latency_seconds", "Latency of each search pipeline stage", ["stage", "query_type"]
+)
+POSTINGS_BYTES_READ = Counter(
+    "search_postings_bytes_read_total", "Total bytes of postings read", ["query_type"]
+)
+POSTINGS_READS = Counter(
+    "search_postings_reads_total", "Total number of postings lists read from disk", ["query_type"]
+)
+POSTINGS_DECODED = Counter(
+    "search_postings_decoded_total", "Total number of postings entries decoded", ["query_type"]
+)
+CANDIDATES_SCORED = Counter(
+    "search_candidates_scored_total", "Total number of candidate documents scored", ["query_type"]
+)
+TERMS_EXPANDED = Counter(
+    "search_terms_expanded_total", "Total number of terms added by pseudo-relevance feedback", ["query_type"]
+)
+TERM_CACHE_EVICTIONS = Counter(
+    "search_term_cache_evictions_total", "Total number of term score vectors evicted from the term cache", ["query_type"]
+)
+INTERSECTION_HITS = Counter(
+    "search_intersection_hits_total", "Boolean queries served partly from materialized intersections", ["query_type"]
+)
+INTERSECTION_MISSES = Counter(
+    "search_intersection_misses_total", "Boolean queries with no materialized intersection to use", ["query_type"]
+)
+INTERSECTION_STALE = Counter(
+    "search_intersection_stale_total", "Materialized intersections skipped because they were built for another index version", ["query_type"]
+)
+CANDIDATES_CAPPED = Counter(
+    "search_candidates_capped_total", "Scoring passes that reached the per-query candidate memory cap", ["query_type"]
+)
+SEGMENTED_DOWNGRADES = Counter(
+    "search_segmented_downgrades_total", "BM25 or fast mode queries run as tf-idf/exhaustive because the index has segments", ["query_type"]
+)
+# search.py counter name -> metric
+SCRIPT_COUNTERS = {
+    "postings_bytes_read": POSTINGS_BYTES_READ,
+    "postings_reads": POSTINGS_READS,
+    "postings_decoded": POSTINGS_DECODED,
+    "candidates_scored": CANDIDATES_SCORED,
+    "terms_expanded": TERMS_EXPANDED,
+    "term_cache_evictions": TERM_CACHE_EVICTIONS,
+    "intersections_used": INTERSECTION_HITS,
+    "intersections_missed": INTERSECTION_MISSES,
+    "intersections_stale": INTERSECTION_STALE,
+    "candidates_capped": CANDIDATES_CAPPED,
+    "segmented_downgrades": SEGMENTED_DOWNGRADES,
+}
+# term cache lookups arrive as "term_cache_hit:<df class>" / "term_cache_miss:<df class>" counters,
+# labelled by df bucket rather than by term so the label set stays bounded
+TERM_CACHE_PREFIX = "term_cache_"
+TERM_CACHE_LOOKUPS = Counter(
+    "search_term_cache_lookups_total", "Term score cache lookups per zone key", ["result", "df_class"]
+)
+TERM_CACHE_BYTES = Gauge(
+    "search_term_cache_bytes", "Memory held by the resident term score cache"
+)
+TERM_CACHE_ENTRIES = Gauge(
+    "search_term_cache_entries", "Zone keys in the resident term score cache"
+)
+# sampled estimates of what stays in memory (search.estimate_sizeof), updated when the resident
+# index is (re)loaded and by /debug/memory
+RESIDENT_BYTES = Gauge(
+    "search_resident_bytes", "Estimated memory held by each resident structure", ["structure"]
+)
+RESIDENT_ENTRIES = Gauge(
+    "search_resident_entries", "Entries in each resident structure", ["structure"]
+)
+QUERY_MEMORY_PEAK = Histogram(
+    "search_query_memory_peak_bytes", "Peak allocation of queries traced with tracemalloc (/debug/memory/query)",
+    ["query_type"], buckets=tuple(2 ** i for i in range(16, 34, 2)),  # 64KiB .. 8GiB
+)
+
+STATS_PREFIX = "search-stats: "
+SLOW_QUERY_MS = float(os.environ.get("SEARCH_SLOW_QUERY_MS", "1000"))
+
+slow_log = logging.getLogger("search.slowlog")
+if os.environ.get("SEARCH_SLOW_QUERY_LOG"):
+    _handler = logging.FileHandler(os.environ["SEARCH_SLOW_QUERY_LOG"])
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    slow_log.addHandler(_handler)
+    slow_log.propagate = False
+
+# sampled boolean queries, mined by search/intersections.py for term pairs worth materializing
+QUERY_LOG_SAMPLE = float(os.environ.get("SEARCH_QUERY_LOG_SAMPLE", "1.0"))
+
+query_log = logging.getLogger("search.querylog")
+if os.environ.get("SEARCH_QUERY_LOG"):
+    _handler = logging.FileHandler(os.environ["SEARCH_QUERY_LOG"])
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    query_log.addHandler(_handler)
+    query_log.propagate = False
+
+
+def query_type(query: str) -> str:
+    # mirrors search.query_type: boolean queries with a quoted phrase count as phrase queries
+    if 'AND' not in query:
+        return "free_text"
+    return "phrase" if '"' in query else "boolean"
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def parse_script_stats(stderr: str) -> Optional[Dict]:
+    # pull the --stats line out of search.py's stderr, pass everything else through
+    stats = None
+    for line in stderr.splitlines():
+        if line.startswith(STATS_PREFIX):
+            try:
+                stats = json.loads(line[len(STATS_PREFIX):])
+            except json.JSONDecodeError:
+                pass
+        elif line:
+            print(line, file=sys.stderr)
+    return stats
+
+
+def record_script_counters(qtype: str, counters: Dict[str, int]):
+    for name, value in counters.items():
+        if name in SCRIPT_COUNTERS:
+            SCRIPT_COUNTERS[name].labels(query_type=qtype).inc(value)
+        elif name.startswith(TERM_CACHE_PREFIX) and ":" in name:
+            result, df_class = name[len(TERM_CACHE_PREFIX):].split(":", 1)
+            TERM_CACHE_LOOKUPS.labels(result=result, df_class=df_class).inc(value)
+
+
+def record_term_cache(cache):
+    # size of the resident mode's search.TermScoreCache
+    TERM_CACHE_BYTES.set(cache.bytes)
+    TERM_CACHE_ENTRIES.set(len(cache))
+
+
+def record_memory(usage: Dict[str, Dict[str, int]]):
+    # {structure: {"entries", "bytes"}} -> resident structure gauges
+    for structure, sizes in usage.items():
+        RESIDENT_BYTES.labels(structure=structure).set(sizes["bytes"])
+        RESIDENT_ENTRIES.labels(structure=structure).set(sizes["entries"])
+
+
+def record_query(query: str, qtype: str, timings: Dict[str, float], plan: Dict, total: float):
+    # per-stage histograms, plus a slow-query log entry once the threshold is exceeded
+    for stage, seconds in timings.items():
+        STAGE_LATENCY.labels(stage=stage, query_type=qtype).observe(seconds)
+    if qtype != "free_text" and query_log.handlers and random.random() < QUERY_LOG_SAMPLE:
+        # every boolean query counts, cache hits included: the log measures traffic, not misses.
+        # Case is kept, the AND operators must survive
+        query_log.warning(json.dumps({"query": " ".join(query.split()), "ts": round(time.time(), 3)}))
+    if total * 1000 >= SLOW_QUERY_MS:
+        slow_log.warning(json.dumps({
+            "query": normalize_query(query),
+            "query_type": qtype,
+            "total_ms": round(total * 1000, 3),
+            "plan": plan,
+            "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()},
+        }))
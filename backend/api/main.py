@@ -1,14 +1,22 @@
-from fastapi import FastAPI, HTTPException, Response, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Response, WebSocket, Depends, Header
 from pydantic import BaseModel
+from typing import Literal, Optional
 from .engine import PythonSearchEngine
+from .admission import Overloaded, REQUEST_TIMEOUT
+from .profiling import DEBUG_TOKEN, ProfileSort, sample_stacks
+from .suggestions import SuggestionCache, serve_suggestions
 from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
-import json
+import hmac
+import subprocess
+import time
 
 
 class SearchRequest(BaseModel):
     query: str
     page: int = 1
     limit: int = 10
+    ranking: Literal["tfidf", "bm25"] = "tfidf"
+    mode: Literal["auto", "exhaustive", "fast"] = "auto"
 
 class SearchResult(BaseModel):
     id: str
@@ -22,6 +30,20 @@ class SearchResponse(BaseModel):
     results: list[SearchResult]
     total_in_window: int
 
+class ProfileRequest(BaseModel):
+    query: str
+    ranking: Literal["tfidf", "bm25"] = "tfidf"
+    mode: Literal["exhaustive", "fast"] = "exhaustive"
+    no_prf: bool = False
+    top: int = 30
+    sort: ProfileSort = "cumulative"
+
+class MemoryTraceRequest(BaseModel):
+    query: str
+    ranking: Literal["tfidf", "bm25"] = "tfidf"
+    mode: Literal["exhaustive", "fast"] = "exhaustive"
+    no_prf: bool = False
+
 app = FastAPI(title="Search Engine API")
 
 # Mount Prometheus metrics at /metrics
@@ -39,28 +61,82 @@ def health():
 
 @app.post("/search", response_model=SearchResponse)
 def search_endpoint(req: SearchRequest):
+    # the engine hands back the encoded body (cached per page), so it's returned as-is:
+    # engine results already have SearchResult's shape, validating & re-encoding them is wasted work
     try:
-        engine_response = engine.search(req.query, req.page, req.limit)
-        return {
-            "results": engine_response["page_results"],
-            "total_in_window": engine_response["total_in_window"]
-        }
+        body = engine.search_json(req.query, req.page, req.limit, req.ranking, req.mode)
+        return Response(content=body, media_type="application/json")
+    except Overloaded as e:
+        # shed load fast, tell clients when to come back
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         print(f"Error during search: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# hot-prefix cache shared by all suggestion connections of this worker
+suggestion_cache = SuggestionCache(lambda prefix, limit: engine.get_suggestions(prefix, limit=limit),
+                                   version=engine.suggestions_version)
+
 @app.websocket("/ws/suggestions")
 async def websocket_suggestions(websocket: WebSocket):
     await websocket.accept()
+    await serve_suggestions(websocket, suggestion_cache)
+
+def require_debug_token(x_debug_token: Optional[str] = Header(None)):
+    # debug endpoints don't exist unless SEARCH_DEBUG_TOKEN is set
+    if not DEBUG_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_debug_token or "", DEBUG_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+
+@app.post("/debug/profile", dependencies=[Depends(require_debug_token)])
+def debug_profile(req: ProfileRequest):
+    # run one uncached search under cProfile, it still takes an execution slot like any other search
+    try:
+        return engine.profile(req.query, req.ranking, req.mode, req.no_prf, sort=req.sort, top=req.top)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        raise HTTPException(status_code=500, detail=f"Profiled search failed: {e}")
+
+@app.post("/debug/profile/sample", dependencies=[Depends(require_debug_token)])
+def debug_profile_sample(seconds: float = 10, interval_ms: float = 5, include_idle: bool = False):
+    # sample this worker's threads across live traffic, returns collapsed stacks for flamegraph tools
+    try:
+        collapsed = sample_stacks(seconds, interval_ms / 1000, include_idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(content=collapsed, media_type="text/plain")
+
+@app.get("/debug/term-cache", dependencies=[Depends(require_debug_token)])
+def debug_term_cache(top: int = 50):
+    # what the resident term score cache holds, most hit zone keys first
+    cache = engine.term_cache
+    if cache is None:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "index_version": cache.version,
+        "bytes": cache.bytes,
+        "max_bytes": cache.max_bytes,
+        "entries": len(cache),
+        "top": cache.top(top),
+    }
+
+@app.get("/debug/memory", dependencies=[Depends(require_debug_token)])
+def debug_memory():
+    # estimated size of each structure this worker keeps in memory, refreshes the search_resident_* gauges
+    return engine.memory_report()
+
+@app.post("/debug/memory/query", dependencies=[Depends(require_debug_token)])
+def debug_memory_query(req: MemoryTraceRequest):
+    # trace one uncached search with tracemalloc, it still takes an execution slot like any other search
     try:
-        while True:
-            data = await websocket.receive_text()
-            try:
-                msg = json.loads(data)
-                prefix = msg.get("prefix", "")
-                suggestions = engine.get_suggestions(prefix, limit=5) # Limit to 5 suggestions, can be changed
-                await websocket.send_text(json.dumps({"suggestions": suggestions}))
-            except Exception as e:
-                await websocket.send_text(json.dumps({"error": str(e)}))
-    except WebSocketDisconnect:
-        pass
+        with engine.admission.slot(time.monotonic() + REQUEST_TIMEOUT):
+            return engine.trace_query_memory(req.query, req.ranking, req.mode, req.no_prf, timeout=REQUEST_TIMEOUT)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        raise HTTPException(status_code=500, detail=f"Traced search failed: {e}")
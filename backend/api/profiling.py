@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import pstats
+import cProfile
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+from typing import Callable, Dict, List, Literal, get_args
+
+# Debug endpoints are only mounted when this is set, and require it as the X-Debug-Token header
+DEBUG_TOKEN = os.environ.get("SEARCH_DEBUG_TOKEN")
+MAX_SAMPLE_SECONDS = 60
+ProfileSort = Literal["cumulative", "tottime", "ncalls"]
+PROFILE_SORTS = get_args(ProfileSort)
+# leaf frames of threads that are just parked (idle thread-pool workers etc.)
+IDLE_LEAVES = {"threading.py:wait"}
+
+_sampling = threading.Lock()
+
+
+def _top_functions(stats: pstats.Stats, wall: float, top: int, sort: str) -> Dict:
+    stats.sort_stats(sort)
+    functions = []
+    for func in stats.fcn_list[:top]:
+        primitive_calls, ncalls, tottime, cumtime, _ = stats.stats[func]
+        filename, line, name = func
+        functions.append({
+            "function": name,
+            "file": filename,
+            "line": line,
+            "ncalls": ncalls,
+            "primitive_calls": primitive_calls,
+            "tottime": tottime,
+            "cumtime": cumtime,
+        })
+    return {"wall_s": wall, "profiled_s": stats.total_tt, "sort": sort, "functions": functions}
+
+
+def profile_search(cmd: List[str], top: int = 30, sort: str = "cumulative", timeout: float = 60) -> Dict:
+    """
+    Run one search.py invocation under cProfile and return its top functions.
+    `cmd` is the engine's search command, the cProfile flags are inserted after the interpreter.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "search.prof")
+        cmd = [cmd[0], "-m", "cProfile", "-o", out] + cmd[1:]
+        start = time.perf_counter()
+        subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=timeout)
+        wall = time.perf_counter() - start
+        return _top_functions(pstats.Stats(out), wall, top, sort)
+
+
+def profile_call(fn: Callable[[], object], top: int = 30, sort: str = "cumulative") -> Dict:
+    """
+    Call `fn` in this process under cProfile and return its top functions, same shape as profile_search.
+    cProfile only hooks the calling thread, so other requests running meanwhile don't show up.
+    """
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        fn()
+    finally:
+        profiler.disable()
+    wall = time.perf_counter() - start
+    return _top_functions(pstats.Stats(profiler), wall, top, sort)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def sample_stacks(seconds: float, interval: float = 0.005, include_idle: bool = False) -> str:
+    """
+    Sample the stacks of every other thread in this process for `seconds`.
+    Returns collapsed stacks ("outer;inner;leaf count" per line), the input format of
+    flamegraph.pl and speedscope. Nothing runs outside of a sampling session.
+    """
+    if not _sampling.acquire(blocking=False):
+        raise RuntimeError("A sampling session is already running")
+    try:
+        me = threading.get_ident()
+        counts = Counter()
+        end = time.monotonic() + min(seconds, MAX_SAMPLE_SECONDS)
+        while time.monotonic() < end:
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                if not include_idle and _frame_name(frame) in IDLE_LEAVES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                counts[";".join(reversed(stack))] += 1
+            time.sleep(interval)
+        return "\n".join(f"{stack} {n}" for stack, n in counts.most_common()) + "\n"
+    finally:
+        _sampling.release()
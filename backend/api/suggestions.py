@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+from fastapi import WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from prometheus_client import Counter, Histogram
+
+# define prometheus metrics
+SUGGESTION_LATENCY = Histogram(
+    "search_suggestion_latency_seconds", "Time from receiving a prefix to sending its suggestions",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+SUGGESTIONS_SUPERSEDED = Counter(
+    "search_suggestions_superseded_total", "Prefixes dropped because a newer one arrived on the same connection"
+)
+SUGGESTION_CACHE = Counter(
+    "search_suggestion_cache_total", "Hot-prefix cache lookups", ["result"]  # hit, shared (joined a running lookup), miss
+)
+
+# a prefix is answered once no newer one arrived on its connection for this long
+DEBOUNCE_SECONDS = float(os.environ.get("SEARCH_SUGGEST_DEBOUNCE_MS", "25")) / 1000
+CACHE_SIZE = int(os.environ.get("SEARCH_SUGGEST_CACHE_SIZE", "4096"))
+SUGGESTION_LIMIT = 5  # Limit to 5 suggestions, can be changed
+
+
+class SuggestionCache:
+    """
+    Hot-prefix cache shared by all connections of a worker. Lookups run in the thread pool, off the
+    event loop, and connections asking for the same prefix at the same time share one lookup.
+    Only used from the event loop, so it needs no locking. `version` (optional) returns the version of
+    the terms the lookups see, the cache is emptied when it changes.
+    """
+    def __init__(self, lookup: Callable[[str, int], List[str]], size: int = CACHE_SIZE,
+                 version: Optional[Callable[[], object]] = None):
+        self.lookup = lookup
+        self.size = size
+        self.version = version
+        self._version = version() if version else None
+        self._entries: "OrderedDict[Tuple[str, int], List[str]]" = OrderedDict()
+        self._inflight = {}  # key -> asyncio.Future of the running lookup
+
+    async def get(self, prefix: str, limit: int = SUGGESTION_LIMIT) -> List[str]:
+        key = (prefix.lower(), limit)
+        if self.version:
+            version = self.version()
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            SUGGESTION_CACHE.labels(result="hit").inc()
+            return self._entries[key]
+        future = self._inflight.get(key)
+        if future is None:
+            SUGGESTION_CACHE.labels(result="miss").inc()
+            future = asyncio.ensure_future(run_in_threadpool(self.lookup, prefix, limit))
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._store(key, f))
+        else:
+            SUGGESTION_CACHE.labels(result="shared").inc()
+        # shielded: a connection that moves on doesn't cancel the lookup for the others
+        return await asyncio.shield(future)
+
+    def _store(self, key, future):
+        self._inflight.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        self._entries[key] = future.result()
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+async def serve_suggestions(websocket: WebSocket, cache: SuggestionCache, debounce: float = DEBOUNCE_SECONDS):
+    """
+    Answer {"prefix": ...} messages with {"prefix", "suggestions"} (or {"error"}).
+    Keystrokes are coalesced: only the newest prefix of a connection is answered, once it has been
+    the newest for `debounce` seconds, and an answer that got superseded while it was looked up
+    is dropped instead of sent.
+    """
+    latest: Optional[Tuple[str, float]] = None  # newest (prefix, received at) not answered yet
+    arrived = asyncio.Event()
+
+    async def receive():
+        nonlocal latest
+        while True:
+            data = await websocket.receive_text()
+            received = time.perf_counter()
+            try:
+                prefix = json.loads(data).get("prefix", "")
+            except Exception as e:
+                await websocket.send_text(json.dumps({"error": str(e)}))
+                continue
+            if latest is not None:
+                SUGGESTIONS_SUPERSEDED.inc()
+            latest = (prefix, received)
+            arrived.set()
+
+    async def respond():
+        nonlocal latest
+        while True:
+            await arrived.wait()
+            # debounce: wait until no newer prefix arrived for `debounce` seconds
+            while arrived.is_set():
+                arrived.clear()
+                await asyncio.sleep(debounce)
+            prefix, received = latest
+            try:
+                reply = {"prefix": prefix, "suggestions": await cache.get(prefix)}
+            except Exception as e:
+                reply = {"prefix": prefix, "error": str(e)}
+            if arrived.is_set():
+                # superseded during the lookup, the newer prefix gets the answer
+                continue
+            latest = None
+            await websocket.send_text(json.dumps(reply))
+            SUGGESTION_LATENCY.observe(time.perf_counter() - received)
+
+    responder = asyncio.ensure_future(respond())
+    try:
+        await receive()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        responder.cancel()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Synthetic legal corpus generator.
+
+Usage:
+    cd backend
+    python3 -m benchmarks.corpus --docs 10000 --out /tmp/bench/corpus.jsonl
+
+Writes corpus.jsonl in the same shape as scripts/data_loader.py
+(id, title, content, court, date). Terms follow a Zipfian distribution
+over a vocabulary of legal seed words followed by generated pseudo-words,
+so postings lengths look like a real collection. Output is deterministic
+for a given seed and streams, so 10M-document corpora don't need 10M
+documents in memory.
+"""
+import argparse
+import itertools
+import json
+import random
+
+# most frequent terms first, they end up with the longest postings lists
+LEGAL_TERMS = """
+court appeal judge case law claim contract party plaintiff defendant
+evidence damages order decision trial right breach liability duty act
+section statute agreement negligence appellant respondent counsel witness
+judgment application jurisdiction proceedings hearing tribunal
+property injury compensation loss payment notice term clause obligation
+company director trust estate settlement offence sentence conviction
+criminal civil fraud misrepresentation tort nuisance defamation employment
+dismissal tenancy lease landlord tenant mortgage insurance policy
+arbitration award costs interest remedy injunction declaration
+discretion precedent authority principle test standard reasonable
+""".split()
+
+# names as used by search.COURT_BOOST, so court boosts apply to generated docs
+COURTS = [
+    ("SG Court of Appeal", 3), ("SG Privy Council", 1), ("UK House of Lords", 2),
+    ("UK Supreme Court", 3), ("High Court of Australia", 2), ("CA Supreme Court", 2),
+    ("SG High Court", 8), ("Singapore International Commercial Court", 2),
+    ("HK High Court", 5), ("HK Court of First Instance", 4), ("UK Crown Court", 4),
+    ("UK Court of Appeal", 6), ("UK High Court", 8), ("Federal Court of Australia", 5),
+    ("NSW Court of Appeal", 4), ("NSW Court of Criminal Appeal", 3), ("NSW Supreme Court", 6),
+    ("NSW District Court", 10), ("UK Employment Tribunal", 8), ("SG District Court", 14),
+]
+
+SYLLABLES = "ba be bi bo bu da de di do du ka ke ki ko ku la le li lo lu ma me mi mo mu na ne ni no nu ra re ri ro ru sa se si so su ta te ti to tu va ve vi vo vu".split()
+
+
+def build_vocabulary(size, rng):
+    # legal seed terms first, then deterministic pseudo-words (only letters, so they survive tokenization)
+    vocab = list(LEGAL_TERMS)
+    seen = set(vocab)
+    while len(vocab) < size:
+        w = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if w not in seen:
+            seen.add(w)
+            vocab.append(w)
+    return vocab[:size]
+
+
+def zipf_cum_weights(n, s):
+    return list(itertools.accumulate(1.0 / (r ** s) for r in range(1, n + 1)))
+
+
+class ZipfSampler:
+    """Draws items with probability proportional to 1 / rank^s."""
+    def __init__(self, items, s, rng):
+        self.items = items
+        self.cum = zipf_cum_weights(len(items), s)
+        self.rng = rng
+
+    def sample(self, k):
+        return self.rng.choices(self.items, cum_weights=self.cum, k=k)
+
+
+def generate_docs(n_docs, vocab_size=50000, zipf_s=1.07, mean_length=300, seed=42):
+    """Yield n_docs synthetic documents (ids 1..n_docs)."""
+    rng = random.Random(seed)
+    vocab = build_vocabulary(vocab_size, rng)
+    words = ZipfSampler(vocab, zipf_s, rng)
+    court_names = [c for c, _ in COURTS]
+    court_weights = list(itertools.accumulate(w for _, w in COURTS))
+    for doc_id in range(1, n_docs + 1):
+        length = max(20, int(rng.lognormvariate(0, 0.6) * mean_length))
+        title = ' '.join(words.sample(rng.randint(4, 12)))
+        content = ' '.join(words.sample(length))
+        court = rng.choices(court_names, cum_weights=court_weights)[0]
+        date = f"{rng.randint(1980, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 00:00:00"
+        yield {"id": str(doc_id), "title": title, "content": content, "court": court, "date": date}
+
+
+def generate_corpus(path, n_docs, **kwargs):
+    """Write n_docs synthetic documents to path as JSONL, return the number written."""
+    count = 0
+    with open(path, 'w', encoding='utf-8', buffering=1 << 20) as f:
+        for doc in generate_docs(n_docs, **kwargs):
+            f.write(json.dumps(doc) + '\n')
+            count += 1
+    return count
+
+
+def main():
+    p = argparse.ArgumentParser(description="Generate a synthetic legal corpus.jsonl")
+    p.add_argument("--docs", type=int, default=10000, help="Number of documents (10k to 10M)")
+    p.add_argument("--out", required=True, help="Where to write corpus.jsonl")
+    p.add_argument("--vocab-size", type=int, default=50000, help="Distinct terms")
+    p.add_argument("--zipf-s", type=float, default=1.07, help="Zipf exponent of the term distribution")
+    p.add_argument("--mean-length", type=int, default=300, help="Mean content length in words")
+    p.add_argument("--seed", type=int, default=42)
+    args = p.parse_args()
+    n = generate_corpus(args.out, args.docs, vocab_size=args.vocab_size, zipf_s=args.zipf_s,
+                        mean_length=args.mean_length, seed=args.seed)
+    print(f"Wrote {n} documents to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+In-memory stand-in for the few redis.Redis calls the engine makes
+(get/set with ex/ttl/pipeline), so the engine and API can be benchmarked
+without a Redis server.
+"""
+import threading
+import time
+
+
+class _Pipeline:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def get(self, key):
+        self._ops.append((self._client.get, key))
+        return self
+
+    def ttl(self, key):
+        self._ops.append((self._client.ttl, key))
+        return self
+
+    def execute(self):
+        ops, self._ops = self._ops, []
+        return [op(key) for op, key in ops]
+
+
+class FakeRedis:
+    def __init__(self):
+        self._data = {}  # key -> (value, expires_at or None)
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        item = self._data.get(key)
+        if item and item[1] is not None and item[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(key)
+            return item[0] if item else None
+
+    def set(self, key, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode()
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def ttl(self, key):
+        # same conventions as Redis: -2 missing, -1 no expiry
+        with self._lock:
+            item = self._live(key)
+            if item is None:
+                return -2
+            if item[1] is None:
+                return -1
+            return int(item[1] - time.monotonic())
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(k, None) is not None for k in keys)
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+
+    def pipeline(self):
+        return _Pipeline(self)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Cache-hit throughput of POST /search, before and after the pre-encoded page fast path.
+
+Usage:
+    cd backend
+    python3 -m benchmarks.hotpath --requests 5000 --index-dir search --out hotpath.json
+
+Both handlers are driven through the FastAPI app as ASGI calls (no sockets, Redis replaced
+by FakeRedis), after one warm-up request per query so every measured request is a cache hit:
+  - legacy: engine.search, then the SearchResponse model validates & re-encodes the page
+  - fast:   engine.search_json, the cached page bytes are returned as a raw Response
+Requests run one after another on one thread, so requests per CPU-second is requests/s per core.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from .overlap import BACKEND_DIR, SEARCH_DIR
+
+QUERIES = [
+    "breach of contract damages",
+    "negligence duty of care",
+    "contract AND damages",
+    '"breach of contract" AND damages',
+]
+
+
+def build_apps(index_dir, metadata_file):
+    sys.path.insert(0, BACKEND_DIR)
+    from fastapi import FastAPI
+    from api import main
+    from api.engine import PythonSearchEngine
+    from .fake_redis import FakeRedis
+    main.engine = PythonSearchEngine(index_dir, metadata_file, FakeRedis())
+
+    # the /search handler as it was before the fast path
+    legacy = FastAPI()
+
+    @legacy.post("/search", response_model=main.SearchResponse)
+    def legacy_search(req: main.SearchRequest):
+        engine_response = main.engine.search(req.query, req.page, req.limit, req.ranking, req.mode)
+        return {
+            "results": engine_response["page_results"],
+            "total_in_window": engine_response["total_in_window"]
+        }
+
+    return {"legacy": legacy, "fast": main.app}
+
+
+async def post(app, path, payload):
+    body = json.dumps(payload).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 8000),
+    }
+    received = False
+    status, chunks = None, []
+
+    async def receive():
+        nonlocal received
+        if received:
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+async def measure(app, requests, pages):
+    for payload in pages:
+        status, _ = await post(app, "/search", payload)  # warm-up, fills the cache
+        if status != 200:
+            raise RuntimeError(f"warm-up request failed with {status}")
+    wall, cpu = time.perf_counter(), time.process_time()
+    for i in range(requests):
+        await post(app, "/search", pages[i % len(pages)])
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return {
+        "requests": requests,
+        "wall_s": round(wall, 3),
+        "cpu_s": round(cpu, 3),
+        "req_per_s": round(requests / wall, 1),
+        "req_per_cpu_s": round(requests / cpu, 1) if cpu else None,
+        "us_per_request": round(wall / requests * 1e6, 1),
+    }
+
+
+def run(requests, index_dir, metadata_file, queries=QUERIES, pages_per_query=3, limit=10):
+    apps = build_apps(index_dir, metadata_file)
+    pages = [{"query": q, "page": p, "limit": limit}
+             for q in queries for p in range(1, pages_per_query + 1)]
+    report = {"requests": requests, "distinct_pages": len(pages), "targets": {}}
+    for name, app in apps.items():
+        report["targets"][name] = asyncio.run(measure(app, requests, pages))
+    legacy, fast = report["targets"]["legacy"], report["targets"]["fast"]
+    if legacy["req_per_cpu_s"] and fast["req_per_cpu_s"]:
+        report["speedup_per_core"] = round(fast["req_per_cpu_s"] / legacy["req_per_cpu_s"], 2)
+    return report
+
+
+def main():
+    p = argparse.ArgumentParser(description="Measure /search cache-hit throughput, legacy vs pre-encoded pages")
+    p.add_argument("--requests", type=int, default=5000, help="Measured requests per handler")
+    p.add_argument("--index-dir", default=SEARCH_DIR, help="Directory holding dictionary.txt/postings.txt")
+    p.add_argument("--metadata-file", default=os.path.join(BACKEND_DIR, "scripts", "corpus.jsonl"))
+    p.add_argument("--out", help="Write the JSON report here (default: stdout only)")
+    args = p.parse_args()
+
+    report = run(args.requests, args.index_dir, args.metadata_file)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Compare fast (tier-1 champion lists) against exhaustive search results.
+
+Usage:
+    cd backend
+    python3 -m benchmarks.overlap --queries queries.txt --out overlap.json
+
+Runs every query (one per line) through search.py in both modes and reports
+mean overlap@k with the exhaustive top-k, plus per-mode latency. Fast mode skips
+the PRF round, so overlap@k compares against exhaustive results without PRF
+(the champion lists' recall loss alone), end_to_end_overlap@k against exhaustive
+results with PRF (what "auto" users see when it switches to fast).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SEARCH_DIR = os.path.join(BACKEND_DIR, 'search')
+
+
+def run_search(query, mode, topk, index_dir=SEARCH_DIR, metadata_file=None, no_prf=False):
+    # run search.py once against the index in index_dir, return (docIDs, seconds)
+    cmd = [
+        "python3", os.path.join(SEARCH_DIR, "search.py"),
+        "--dict-file", os.path.join(index_dir, "dictionary.txt"),
+        "--postings-file", os.path.join(index_dir, "postings.txt"),
+        "--metadata-file", metadata_file or os.path.join(BACKEND_DIR, "scripts", "corpus.jsonl"),
+        "--champions-dict-file", os.path.join(index_dir, "champions_dictionary.txt"),
+        "--champions-file", os.path.join(index_dir, "champions.txt"),
+        "--query", query,
+        "--topk", str(topk),
+        "--mode", mode,
+    ]
+    if no_prf:
+        cmd.append("--no-prf")
+    start = time.perf_counter()
+    output = subprocess.check_output(cmd, text=True)
+    return output.split(), time.perf_counter() - start
+
+
+def overlap_at_k(approx, exact, k):
+    # fraction of the exhaustive top-k that the approximate top-k also returned
+    exact_top = set(exact[:k])
+    if not exact_top:
+        return 1.0
+    return len(exact_top & set(approx[:k])) / len(exact_top)
+
+
+def compare_modes(queries, k=100, **kwargs):
+    per_query = []
+    for q in queries:
+        exact, t_exact = run_search(q, "exhaustive", k, **kwargs)
+        exact_no_prf, _ = run_search(q, "exhaustive", k, no_prf=True, **kwargs)
+        approx, t_fast = run_search(q, "fast", k, **kwargs)
+        per_query.append({
+            "query": q,
+            f"overlap@{k}": overlap_at_k(approx, exact_no_prf, k),
+            f"end_to_end_overlap@{k}": overlap_at_k(approx, exact, k),
+            "exhaustive_s": t_exact,
+            "fast_s": t_fast,
+        })
+    return {
+        "k": k,
+        "queries": len(per_query),
+        f"mean_overlap@{k}": statistics.mean(r[f"overlap@{k}"] for r in per_query) if per_query else None,
+        f"mean_end_to_end_overlap@{k}": statistics.mean(r[f"end_to_end_overlap@{k}"] for r in per_query) if per_query else None,
+        "exhaustive_p50_s": statistics.median(r["exhaustive_s"] for r in per_query) if per_query else None,
+        "fast_p50_s": statistics.median(r["fast_s"] for r in per_query) if per_query else None,
+        "per_query": per_query,
+    }
+
+
+def main():
+    p = argparse.ArgumentParser(description="Report overlap@k of fast mode against exhaustive results")
+    p.add_argument("--queries", required=True, help="File with one query per line")
+    p.add_argument("-k", type=int, default=100, help="Cutoff for overlap@k")
+    p.add_argument("--out", help="Write the JSON report here (default: stdout only)")
+    args = p.parse_args()
+
+    with open(args.queries, encoding='utf-8') as f:
+        queries = [line.strip() for line in f if line.strip()]
+    report = compare_modes(queries, args.k)
+
+    print(f"{report['queries']} queries, mean overlap@{args.k}: {report[f'mean_overlap@{args.k}']} "
+          f"(end to end, against exhaustive with PRF: {report[f'mean_end_to_end_overlap@{args.k}']})")
+    print(f"p50 latency: exhaustive {report['exhaustive_p50_s']}s, fast {report['fast_p50_s']}s")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark: synthetic corpus -> index -> Zipfian workload -> targets.
+
+Usage:
+    cd backend
+    python3 -m benchmarks.run --docs 10000 --queries 500 --targets cli,engine,http --out bench-results.jsonl
+
+Targets:
+    cli     search.py run once per query, as a subprocess
+    engine  PythonSearchEngine.search in this process (Redis replaced by FakeRedis)
+    resident  same, with the engine's resident mode (index loaded once, term score cache)
+    http    POST /search against the FastAPI app served by uvicorn (FakeRedis as well)
+
+Each target runs in a fresh spawned process so peak RSS is per target.
+Every run appends one JSON object to --out, runs can be compared over time.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from . import overlap
+from .corpus import generate_corpus
+from .workload import generate_queries
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SEARCH_DIR = os.path.join(BACKEND_DIR, 'search')
+TARGETS = ("cli", "engine", "resident", "http")
+
+
+def _search_module():
+    # search/ is a script directory, not a package
+    if SEARCH_DIR not in sys.path:
+        sys.path.insert(0, SEARCH_DIR)
+    import index
+    import search
+    return index, search
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    i = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[i]
+
+
+def drive(call, queries, concurrency):
+    """Run call(query) for every query on `concurrency` threads, return latency/QPS summary."""
+    errors = 0
+
+    def one(query):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            call(query)
+        except Exception as e:
+            errors += 1
+            print(f"benchmark query failed: {query!r}: {e}", file=sys.stderr)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(one, queries))
+    wall = time.perf_counter() - start
+    return {
+        "queries": len(queries),
+        "errors": errors,
+        "concurrency": concurrency,
+        "wall_s": wall,
+        "qps": len(queries) / wall if wall else None,
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+        "p95_ms": percentile(latencies, 95) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else None,
+    }
+
+
+def peak_rss_kb():
+    # ru_maxrss is in KB on Linux; children covers search.py subprocesses
+    return {
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "peak_rss_children_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+def run_cli(queries, index_dir, metadata_file, concurrency):
+    def call(query):
+        overlap.run_search(query, "exhaustive", 100, index_dir=index_dir, metadata_file=metadata_file)
+    return drive(call, queries, concurrency)
+
+
+def run_engine(queries, index_dir, metadata_file, concurrency, resident=False):
+    sys.path.insert(0, BACKEND_DIR)
+    from api.engine import PythonSearchEngine
+    from .fake_redis import FakeRedis
+    engine = PythonSearchEngine(index_dir, metadata_file, FakeRedis(), resident=resident)
+    return drive(lambda q: engine.search(q, 1, 10), queries, concurrency)
+
+
+def run_resident(queries, index_dir, metadata_file, concurrency):
+    return run_engine(queries, index_dir, metadata_file, concurrency, resident=True)
+
+
+def run_http(queries, index_dir, metadata_file, concurrency):
+    sys.path.insert(0, BACKEND_DIR)
+    import uvicorn
+    from api import main
+    from api.engine import PythonSearchEngine
+    from .fake_redis import FakeRedis
+    main.engine = PythonSearchEngine(index_dir, metadata_file, FakeRedis())
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    url = f"http://127.0.0.1:{port}/search"
+
+    def call(query):
+        body = json.dumps({"query": query, "page": 1, "limit": 10}).encode()
+        req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req) as resp:
+            resp.read()
+
+    try:
+        return drive(call, queries, concurrency)
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def _run_target(target, queries, index_dir, metadata_file, concurrency):
+    runner = {"cli": run_cli, "engine": run_engine, "resident": run_resident, "http": run_http}[target]
+    result = runner(queries, index_dir, metadata_file, concurrency)
+    result.update(peak_rss_kb())
+    return result
+
+
+def measure_index_load(index_dir, metadata_file):
+    # what every search.py invocation pays before any query work
+    _, search = _search_module()
+    start = time.perf_counter()
+    search.load_dictionary(os.path.join(index_dir, "dictionary.txt"))
+    dictionary_s = time.perf_counter() - start
+    search.load_metadata(metadata_file)
+    metadata_s = time.perf_counter() - start - dictionary_s
+    with open(os.path.join(index_dir, "postings.txt")) as f:
+        hdr = f.readline().split()
+        search.parse_lengths_line(hdr[1:])
+    total = time.perf_counter() - start
+    return {"load_s": total, "dictionary_s": dictionary_s, "metadata_s": metadata_s,
+            "header_s": total - dictionary_s - metadata_s}
+
+
+def build_index(corpus_path, index_dir):
+    index, _ = _search_module()
+    os.makedirs(index_dir, exist_ok=True)
+    path = lambda name: os.path.join(index_dir, name)
+    timings = {}
+    start = time.perf_counter()
+    index.build_index(corpus_path, path("dictionary.txt"), path("postings.txt"))
+    timings["build_s"] = time.perf_counter() - start
+    start = time.perf_counter()
+    index.build_impacts(path("dictionary.txt"), path("postings.txt"), path("impacts_dictionary.txt"), path("impacts.txt"))
+    timings["impacts_s"] = time.perf_counter() - start
+    start = time.perf_counter()
+    index.build_champions(path("dictionary.txt"), path("postings.txt"), corpus_path,
+                          path("champions_dictionary.txt"), path("champions.txt"))
+    timings["champions_s"] = time.perf_counter() - start
+    timings["bytes"] = {name: os.path.getsize(path(name)) for name in os.listdir(index_dir)}
+    return timings
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    p = argparse.ArgumentParser(description="Reproducible search benchmark")
+    p.add_argument("--docs", type=int, default=10000, help="Synthetic corpus size (10k to 10M)")
+    p.add_argument("--queries", type=int, default=500, help="Length of the query stream")
+    p.add_argument("--pool-size", type=int, default=200, help="Distinct queries in the workload")
+    p.add_argument("--targets", default="cli,engine,http", help=f"Comma-separated subset of {','.join(TARGETS)}")
+    p.add_argument("--concurrency", type=int, default=4, help="Concurrent clients per target")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--work-dir", default="/tmp/search-bench", help="Where corpus & index are generated")
+    p.add_argument("--reuse", action="store_true", help="Reuse corpus & index in --work-dir if present")
+    p.add_argument("--overlap", action="store_true", help="Also report fast-mode overlap@100 on distinct queries")
+    p.add_argument("--out", default="bench-results.jsonl", help="Append the run's JSON report here")
+    args = p.parse_args()
+
+    targets = [t for t in args.targets.split(',') if t]
+    for t in targets:
+        if t not in TARGETS:
+            p.error(f"unknown target {t}")
+
+    work_dir = os.path.join(args.work_dir, f"docs{args.docs}-seed{args.seed}")
+    index_dir = os.path.join(work_dir, "index")
+    corpus_path = os.path.join(work_dir, "corpus.jsonl")
+    os.makedirs(work_dir, exist_ok=True)
+    report = {
+        "run": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+    }
+
+    if not (args.reuse and os.path.exists(corpus_path)):
+        start = time.perf_counter()
+        generate_corpus(corpus_path, args.docs, seed=args.seed)
+        report["corpus"] = {"generate_s": time.perf_counter() - start}
+        print(f"corpus: {args.docs} docs in {report['corpus']['generate_s']:.1f}s")
+    report.setdefault("corpus", {})["bytes"] = os.path.getsize(corpus_path)
+
+    if not (args.reuse and os.path.exists(os.path.join(index_dir, "postings.txt"))):
+        report["index"] = build_index(corpus_path, index_dir)
+        print(f"index: built in {report['index']['build_s']:.1f}s")
+    report.setdefault("index", {}).update(measure_index_load(index_dir, corpus_path))
+
+    queries = [q for q, _ in generate_queries(corpus_path, args.queries, args.pool_size, seed=args.seed)]
+    report["workload"] = {"queries": len(queries), "distinct": len(set(queries))}
+
+    report["targets"] = {}
+    ctx = multiprocessing.get_context("spawn")
+    for target in targets:
+        with ctx.Pool(1) as pool:
+            result = pool.apply(_run_target, (target, queries, index_dir, corpus_path, args.concurrency))
+        report["targets"][target] = result
+        print(f"{target}: p50 {result['p50_ms']:.1f}ms p95 {result['p95_ms']:.1f}ms "
+              f"p99 {result['p99_ms']:.1f}ms, {result['qps']:.1f} qps, peak RSS {result['peak_rss_kb']} KB")
+
+    if args.overlap:
+        distinct = list(dict.fromkeys(queries))[:50]
+        result = overlap.compare_modes(distinct, 100, index_dir=index_dir, metadata_file=corpus_path)
+        result.pop("per_query")
+        report["overlap"] = result
+        print(f"overlap@100 (fast vs exhaustive, both without PRF): {result['mean_overlap@100']}, "
+              f"end to end: {result['mean_end_to_end_overlap@100']}")
+
+    with open(args.out, 'a') as f:
+        f.write(json.dumps(report) + '\n')
+    print(f"Appended report to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for search.py.
+
+Usage:
+    cd backend
+    python3 -m benchmarks.startup --runs 20 --out startup.json
+
+Every search.py invocation is a fresh interpreter, so startup is paid on every
+cache miss. This reports, as medians over --runs fresh processes:
+  - interpreter startup (python -c pass)
+  - importing the search module
+  - first-query wall time per query type, with search.py's own stage breakdown
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from .overlap import BACKEND_DIR, SEARCH_DIR
+
+STATS_PREFIX = "search-stats: "
+QUERIES = {
+    "free_text": "breach of contract damages",
+    "boolean": "contract AND damages",
+    "phrase": '"breach of contract" AND damages',
+}
+
+
+def time_process(cmd, **kwargs):
+    start = time.perf_counter()
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def interpreter_startup():
+    seconds, _ = time_process([sys.executable, "-c", "pass"])
+    return seconds
+
+
+def module_import():
+    # measured inside the child so interpreter startup isn't counted twice
+    code = "import time; t = time.perf_counter(); import search; print(time.perf_counter() - t)"
+    _, result = time_process([sys.executable, "-c", code], cwd=SEARCH_DIR)
+    return float(result.stdout)
+
+
+def first_query(query, index_dir, metadata_file):
+    cmd = [
+        sys.executable, os.path.join(SEARCH_DIR, "search.py"),
+        "--dict-file", os.path.join(index_dir, "dictionary.txt"),
+        "--postings-file", os.path.join(index_dir, "postings.txt"),
+        "--metadata-file", metadata_file,
+        "--query", query,
+        "--stats",
+    ]
+    seconds, result = time_process(cmd)
+    stages = {}
+    for line in result.stderr.splitlines():
+        if line.startswith(STATS_PREFIX):
+            stages = json.loads(line[len(STATS_PREFIX):])["times"]
+    return seconds, stages
+
+
+def median_ms(values):
+    return round(statistics.median(values) * 1000, 3)
+
+
+def run(runs, index_dir, metadata_file, queries=QUERIES):
+    report = {
+        "runs": runs,
+        "interpreter_ms": median_ms([interpreter_startup() for _ in range(runs)]),
+        "import_ms": median_ms([module_import() for _ in range(runs)]),
+        "first_query": {},
+    }
+    for qtype, query in queries.items():
+        walls, stages = [], {}
+        for _ in range(runs):
+            seconds, s = first_query(query, index_dir, metadata_file)
+            walls.append(seconds)
+            for stage, value in s.items():
+                stages.setdefault(stage, []).append(value)
+        report["first_query"][qtype] = {
+            "query": query,
+            "wall_ms": median_ms(walls),
+            "stages_ms": {stage: median_ms(values) for stage, values in stages.items()},
+        }
+    return report
+
+
+def main():
+    p = argparse.ArgumentParser(description="Measure search.py import time and first-query latency")
+    p.add_argument("--runs", type=int, default=10, help="Fresh processes per measurement")
+    p.add_argument("--index-dir", default=SEARCH_DIR, help="Directory holding dictionary.txt/postings.txt")
+    p.add_argument("--metadata-file", default=os.path.join(BACKEND_DIR, "scripts", "corpus.jsonl"))
+    p.add_argument("--out", help="Write the JSON report here (default: stdout only)")
+    args = p.parse_args()
+
+    report = run(args.runs, args.index_dir, args.metadata_file)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
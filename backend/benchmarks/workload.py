@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Query workload generator.
+
+Usage:
+    cd backend
+    python3 -m benchmarks.workload --corpus /tmp/bench/corpus.jsonl --queries 2000 --out /tmp/bench/queries.txt
+
+Builds a pool of distinct free-text, boolean (AND) and phrase queries from
+terms and bigrams that actually occur in the corpus, then draws the query
+stream from that pool with Zipfian popularity. Popular queries repeat,
+just as they do in real traffic, so the result cache sees realistic hit rates.
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+from collections import Counter
+
+from .corpus import ZipfSampler
+
+DEFAULT_MIX = {"free_text": 0.6, "boolean": 0.25, "phrase": 0.15}
+
+
+def corpus_statistics(corpus_path, sample_docs=2000):
+    # term & bigram frequencies over the first sample_docs documents, most frequent first
+    terms, bigrams = Counter(), Counter()
+    with open(corpus_path, encoding='utf-8') as f:
+        for line in itertools.islice(f, sample_docs):
+            doc = json.loads(line)
+            words = re.findall(r'[a-z]+', (doc.get("title", "") + " " + doc.get("content", "")).lower())
+            terms.update(words)
+            bigrams.update(zip(words, words[1:]))
+    return [t for t, _ in terms.most_common()], [b for b, _ in bigrams.most_common()]
+
+
+def generate_pool(terms, bigrams, size=500, mix=None, seed=7):
+    """Distinct queries in the requested type mix, as (query, type) pairs."""
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    term_sampler = ZipfSampler(terms, 0.9, rng)
+    bigram_sampler = ZipfSampler(bigrams, 0.9, rng)
+    types = list(mix)
+    weights = [mix[t] for t in types]
+    pool, seen = [], set()
+    attempts = 0
+    while len(pool) < size and attempts < size * 20:
+        attempts += 1
+        qtype = rng.choices(types, weights=weights)[0]
+        if qtype == "free_text":
+            query = ' '.join(term_sampler.sample(rng.randint(1, 4)))
+        elif qtype == "boolean":
+            query = ' AND '.join(term_sampler.sample(rng.randint(2, 3)))
+        else:
+            w1, w2 = bigram_sampler.sample(1)[0]
+            query = f'"{w1} {w2}" AND {term_sampler.sample(1)[0]}'
+        if query not in seen:
+            seen.add(query)
+            pool.append((query, qtype))
+    return pool
+
+
+def generate_queries(corpus_path, n_queries=2000, pool_size=500, mix=None, popularity_s=1.0, seed=7):
+    """Query stream of n_queries (query, type) pairs with Zipfian popularity over the pool."""
+    terms, bigrams = corpus_statistics(corpus_path)
+    pool = generate_pool(terms, bigrams, pool_size, mix, seed)
+    rng = random.Random(seed + 1)
+    rng.shuffle(pool)  # popularity rank independent of generation order
+    return ZipfSampler(pool, popularity_s, rng).sample(n_queries)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Generate a Zipfian query workload from a corpus")
+    p.add_argument("--corpus", required=True, help="corpus.jsonl the queries should match")
+    p.add_argument("--queries", type=int, default=2000, help="Length of the query stream")
+    p.add_argument("--pool-size", type=int, default=500, help="Distinct queries")
+    p.add_argument("--mix", default="free_text=0.6,boolean=0.25,phrase=0.15", help="Query type mix")
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--out", required=True, help="Where to write the queries, one per line")
+    args = p.parse_args()
+    mix = {k: float(v) for k, v in (part.split('=') for part in args.mix.split(','))}
+    queries = generate_queries(args.corpus, args.queries, args.pool_size, mix, seed=args.seed)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        for query, _ in queries:
+            f.write(query + '\n')
+    print(f"Wrote {len(queries)} queries to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
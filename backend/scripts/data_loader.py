@@ -7,58 +7,244 @@ Description:
     with one document per line for bulk loading into Elasticsearch
     or for use by the Python search index.
 
+    The CSV is cut into byte ranges at record boundaries, ranges are
+    encoded by a pool of worker processes and written back in file
+    order, so the output is identical to a single-process run.
+    With --append only documents whose id isn't in the output yet are
+    written, e.g. after new rows were added to the dump.
+
 Usage:
     cd backend/scripts
-    python3 data_loader.py
+    python3 data_loader.py [--csv ../../dataset.csv] [--out corpus.jsonl] [--workers N] [--append]
+
+    or from Python:
+        from scripts.data_loader import convert
+        convert(csv_path, jsonl_path, workers=8)
 
 Outputs:
     corpus.jsonl in the same directory
 """
+import argparse
 import csv
+import io
 import json
+import multiprocessing
 import os
+import re
 import sys
+import time
+
 
-# Increase CSV field size limit to accommodate very large fields
-try:
-    csv.field_size_limit(sys.maxsize)
-except OverflowError:
-    # For environments where sys.maxsize is too large
+def _raise_field_size_limit():
+    # Increase CSV field size limit to accommodate very large fields
     max_int = sys.maxsize
     while True:
         try:
             csv.field_size_limit(max_int)
             break
         except OverflowError:
+            # For environments where sys.maxsize is too large
             max_int = int(max_int / 10)
 
+
+_raise_field_size_limit()
+
 # Adjust these paths if necessary
 data_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 csv_path = os.path.join(data_dir, 'dataset.csv')
-jsonl_path = os.path.join(os.path.dirname(__file__), 'corpus.jsonl')
-
-if not os.path.isfile(csv_path):
-    print(f"ERROR: CSV file not found at {csv_path}")
-    sys.exit(1)
-
-print(f"Loading CSV from: {csv_path}")
-print(f"Writing JSONL to: {jsonl_path}\n")
-
-with open(csv_path, mode='r', encoding='utf-8', newline='') as csvfile, \
-     open(jsonl_path, mode='w', encoding='utf-8') as jsonlfile:
-    reader = csv.DictReader(csvfile)
-    count = 0
-    for row in reader:
-        # Create document preserving original ID
-        doc = {
-            'id': row['document_id'],  # Map document_id to id
-            'title': row.get('title', '').strip(),
-            'content': row.get('content', '').strip(),
-            'court': row.get('court', '').strip(),
-            'date': row.get('date_posted', '').strip(),  # Map date_posted to date
-        }
+jsonl_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus.jsonl')
+
+CHUNK_BYTES = 16 << 20     # CSV bytes per worker task
+SCAN_BLOCK_BYTES = 16 << 20
+WRITE_BUFFER_BYTES = 8 << 20
+REPORT_EVERY = 5.0         # seconds between progress lines
+
+# id is always written first, so existing ids can be read without parsing whole documents
+_ID_RE = re.compile(rb'^\{"id": ("(?:[^"\\]|\\.)*")')
+
+
+def row_to_doc(row):
+    # Create document preserving original ID
+    return {
+        'id': row['document_id'],  # Map document_id to id
+        'title': row.get('title', '').strip(),
+        'content': row.get('content', '').strip(),
+        'court': row.get('court', '').strip(),
+        'date': row.get('date_posted', '').strip(),  # Map date_posted to date
+    }
+
+
+def record_boundaries(path, chunk_bytes=CHUNK_BYTES, block_bytes=SCAN_BLOCK_BYTES):
+    """
+    Byte offsets where records start: the end of the header, then the first record
+    boundary at least chunk_bytes after the previous one.
+    A newline ends a record only outside a quoted field, i.e. when the number of quotes
+    before it is even (escaped quotes are doubled, so they don't change the parity).
+    """
+    points = []
+    want = 0        # next boundary must be at or after this offset
+    odd = False     # inside a quoted field at the current scan position
+    pos = 0         # file offset of block[0]
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_bytes)
+            if not block:
+                break
+            i = 0   # quotes in block[:i] are accounted for in `odd`
+            while want < pos + len(block):
+                nl = block.find(b'\n', max(want - pos, i))
+                if nl < 0:
+                    break
+                odd ^= block.count(b'"', i, nl) & 1
+                i = nl + 1
+                if odd:
+                    want = pos + i
+                else:
+                    points.append(pos + i)
+                    want = pos + i + chunk_bytes
+            odd ^= block.count(b'"', i) & 1
+            pos += len(block)
+    return points
+
+
+def split_ranges(path, chunk_bytes=CHUNK_BYTES):
+    """Header bytes & (start, end) byte ranges that each hold whole records."""
+    size = os.path.getsize(path)
+    points = record_boundaries(path, chunk_bytes)
+    if not points:
+        # header only (or an empty file)
+        points = [size]
+    with open(path, 'rb') as f:
+        header = f.read(points[0])
+    bounds = points + ([size] if points[-1] < size else [])
+    return header, list(zip(bounds, bounds[1:]))
+
+
+# worker state, set once per process by _init_worker
+_fieldnames = None
+_skip_ids = frozenset()
+
+
+def _init_worker(fieldnames, skip_ids):
+    global _fieldnames, _skip_ids
+    _fieldnames = fieldnames
+    _skip_ids = skip_ids
+
+
+def encode_range(task):
+    """Encode the CSV records in one byte range, returns (jsonl bytes, docs written, docs skipped)."""
+    path, start, end = task
+    with open(path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8')
+    out = []
+    skipped = 0
+    for row in csv.DictReader(io.StringIO(text, newline=''), fieldnames=_fieldnames):
+        doc = row_to_doc(row)
+        if doc['id'] in _skip_ids:
+            skipped += 1
+            continue
         # Write one JSON object per line
-        jsonlfile.write(json.dumps(doc, ensure_ascii=False) + '\n')
-        count += 1
+        out.append(json.dumps(doc, ensure_ascii=False))
+    data = ('\n'.join(out) + '\n').encode('utf-8') if out else b''
+    return data, len(out), skipped
+
+
+def existing_ids(path):
+    """
+    Ids already in a JSONL output. A partial last line (interrupted run) is truncated
+    so appending resumes cleanly from the last complete document.
+    """
+    ids = set()
+    good = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            m = _ID_RE.match(line)
+            ids.add(json.loads(m.group(1)) if m else json.loads(line)['id'])
+            good += len(line)
+    if good < os.path.getsize(path):
+        with open(path, 'r+b') as f:
+            f.truncate(good)
+    return ids
+
+
+def _report(done, total, docs, elapsed):
+    elapsed = max(elapsed, 1e-9)
+    print(f"  {done / max(total, 1):6.1%}  {docs} docs  "
+          f"{docs / elapsed:,.0f} docs/s  {done / elapsed / (1 << 20):.1f} MB/s", file=sys.stderr)
+
+
+def convert(csv_file=csv_path, out_file=jsonl_path, workers=None, chunk_bytes=CHUNK_BYTES,
+            append=False, report_every=REPORT_EVERY):
+    """
+    Convert csv_file to JSONL at out_file. Returns a summary dict.
+    append: keep out_file and only add documents whose id isn't in it yet;
+    otherwise out_file is rebuilt and replaced atomically when done.
+    report_every: seconds between progress lines on stderr (None to disable).
+    """
+    start_time = time.perf_counter()
+    header, ranges = split_ranges(csv_file, chunk_bytes)
+    fieldnames = next(csv.reader(io.StringIO(header.decode('utf-8'), newline='')), [])
+    total = os.path.getsize(csv_file) - len(header)
+
+    skip_ids = frozenset()
+    if append and os.path.exists(out_file):
+        skip_ids = frozenset(existing_ids(out_file))
+        target = out_file
+        mode = 'ab'
+    else:
+        target = out_file + '.tmp'
+        mode = 'wb'
+
+    docs = skipped = done = 0
+    last_report = start_time
+    tasks = [(csv_file, s, e) for s, e in ranges]
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(fieldnames, skip_ids)) as pool, \
+         open(target, mode, buffering=WRITE_BUFFER_BYTES) as out:
+        # imap keeps results in task order, so the output order is deterministic
+        for (data, n, n_skipped), (s, e) in zip(pool.imap(encode_range, tasks), ranges):
+            out.write(data)
+            docs += n
+            skipped += n_skipped
+            done += e - s
+            now = time.perf_counter()
+            if report_every is not None and now - last_report >= report_every:
+                _report(done, total, docs, now - start_time)
+                last_report = now
+    if target != out_file:
+        os.replace(target, out_file)
+
+    elapsed = time.perf_counter() - start_time
+    if report_every is not None:
+        _report(done, total, docs, elapsed)
+    return {"docs": docs, "skipped": skipped, "chunks": len(tasks), "bytes": total, "seconds": elapsed}
+
+
+def main():
+    p = argparse.ArgumentParser(description="Convert dataset.csv to corpus.jsonl")
+    p.add_argument("--csv", default=csv_path, help="Path to the CSV dump")
+    p.add_argument("--out", default=jsonl_path, help="Where to write the JSONL corpus")
+    p.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    p.add_argument("--chunk-mb", type=int, default=CHUNK_BYTES >> 20, help="CSV megabytes per worker task")
+    p.add_argument("--append", action="store_true", help="Only append documents not already in --out")
+    args = p.parse_args()
+
+    if not os.path.isfile(args.csv):
+        print(f"ERROR: CSV file not found at {args.csv}")
+        sys.exit(1)
+
+    print(f"Loading CSV from: {args.csv}")
+    print(f"Writing JSONL to: {args.out}\n")
+
+    result = convert(args.csv, args.out, args.workers, args.chunk_mb << 20, args.append)
+
+    print(f"Completed: {result['docs']} documents processed", end="")
+    if args.append:
+        print(f", {result['skipped']} already present", end="")
+    print(f" in {result['seconds']:.1f}s.")
+
 
-print(f"Completed: {count} documents processed.")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from data_loader import convert, record_boundaries, row_to_doc, split_ranges
+
+FIELDS = ["document_id", "title", "content", "court", "date_posted"]
+
+
+def make_rows(n):
+    # every third content spans several lines, some with doubled quotes inside the quoted field
+    rows = []
+    for i in range(1, n + 1):
+        content = f"Held: the \"contract\" was breached\nby the defendant,\n\nclaim {i} allowed" if i % 3 == 0 \
+            else f"damages for negligence, case {i} — §{i}"
+        rows.append({"document_id": str(i), "title": f"Case {i}\nvs Respondent" if i % 4 == 0 else f"Case {i}",
+                     "content": content, "court": "SG High Court", "date_posted": "2020-01-01"})
+    return rows
+
+
+def write_csv(path, rows):
+    # returns the byte offset after the header and after each record
+    ends = []
+    with open(path, "wb") as f:
+        for row in [dict(zip(FIELDS, FIELDS))] + rows:
+            buf = io.StringIO()
+            csv.writer(buf).writerow([row[k] for k in FIELDS])
+            f.write(buf.getvalue().encode("utf-8"))
+            ends.append(f.tell())
+    return ends
+
+
+class DataLoaderTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="data-loader-test-")
+        self.path = lambda f: os.path.join(self.dir, f)
+        self.rows = make_rows(60)
+        self.ends = write_csv(self.path("dataset.csv"), self.rows)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def expected(self):
+        return [row_to_doc(row) for row in self.rows]
+
+    def read_docs(self, path):
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_boundaries_fall_between_records(self):
+        # tiny scan blocks put quoted newlines & quotes across block ends
+        for block_bytes in (1, 7, 64, 1 << 20):
+            self.assertEqual(record_boundaries(self.path("dataset.csv"), 1, block_bytes), self.ends, block_bytes)
+            for chunk_bytes in (50, 200, 1000):
+                points = record_boundaries(self.path("dataset.csv"), chunk_bytes, block_bytes)
+                self.assertTrue(set(points) <= set(self.ends), (block_bytes, chunk_bytes))
+                self.assertEqual(points[0], self.ends[0])
+
+    def test_ranges_hold_whole_records(self):
+        header, ranges = split_ranges(self.path("dataset.csv"), 100)
+        self.assertGreater(len(ranges), 5)
+        self.assertEqual(len(header), self.ends[0])
+        self.assertEqual(ranges[-1][1], os.path.getsize(self.path("dataset.csv")))
+        with open(self.path("dataset.csv"), "rb") as f:
+            data = f.read()
+        docs = []
+        for start, end in ranges:
+            text = data[start:end].decode("utf-8")
+            docs += [row_to_doc(row) for row in csv.DictReader(io.StringIO(text, newline=""), fieldnames=FIELDS)]
+        self.assertEqual(docs, self.expected())
+
+    def test_parallel_matches_serial(self):
+        serial = convert(self.path("dataset.csv"), self.path("serial.jsonl"), workers=1, report_every=None)
+        parallel = convert(self.path("dataset.csv"), self.path("parallel.jsonl"), workers=3, chunk_bytes=100,
+                           report_every=None)
+        self.assertEqual(serial["chunks"], 1)
+        self.assertGreater(parallel["chunks"], 5)
+        with open(self.path("serial.jsonl"), "rb") as s, open(self.path("parallel.jsonl"), "rb") as p:
+            self.assertEqual(s.read(), p.read())
+        self.assertEqual(self.read_docs(self.path("parallel.jsonl")), self.expected())
+
+    def test_append_after_truncated_last_line(self):
+        # an interrupted run: the first 40 rows converted, the last document cut off mid-line
+        write_csv(self.path("partial.csv"), self.rows[:40])
+        convert(self.path("partial.csv"), self.path("corpus.jsonl"), workers=2, chunk_bytes=100, report_every=None)
+        with open(self.path("corpus.jsonl"), "r+b") as f:
+            f.truncate(os.path.getsize(self.path("corpus.jsonl")) - 20)
+
+        result = convert(self.path("dataset.csv"), self.path("corpus.jsonl"), workers=2, chunk_bytes=100,
+                         append=True, report_every=None)
+        self.assertEqual(result["skipped"], 39)
+        self.assertEqual(result["docs"], 21)
+        self.assertEqual(self.read_docs(self.path("corpus.jsonl")), self.expected())
+
+
+if __name__ == '__main__':
+    unittest.main()
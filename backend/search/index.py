@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+import sys, os, math, json, argparse, heapq, tempfile
+from collections import defaultdict
+from itertools import groupby
+from stemmer import stem, tokenize
+from search import parse_postings_line, load_dictionary, load_metadata, static_boost, PostingsFile
+
+# BM25F parameters, per-zone weights mirror the 2x title emphasis used by score_documents
+BM25_K1 = 1.2
+BM25_B = {'title': 0.5, 'content': 0.75}
+BM25_ZONE_WEIGHT = {'title': 2.0, 'content': 1.0}
+
+def read_postings(zone_key, dictionary, postings_fh):
+    _, offset, length = dictionary[zone_key]
+    return parse_postings_line(postings_fh.read(offset, length).decode())
+
+def zone_of(zone_key):
+    return zone_key.split('@', 1)[1] if '@' in zone_key else 'content'
+
+def write_postings_file(out_dict, out_postings, header, lines):
+    # write "term df offset" dictionary + one postings line per term, offsets are byte offsets
+    # lines is an iterable of (term, df, line) in the order they should be written
+    with open(out_postings, 'wb') as pf, open(out_dict, 'w') as df:
+        pf.write((header + '\n').encode())
+        for term, dfreq, line in lines:
+            df.write(f"{term} {dfreq} {pf.tell()}\n")
+            pf.write((line + '\n').encode())
+
+def encode_postings(entries):
+    # "docGap,tf:posGap,posGap,...:skip" for sorted (docID, [positions]) entries,
+    # skips every ~sqrt(n) entries point at the target index
+    step = int(math.sqrt(len(entries)))
+    toks, prev = [], 0
+    for i, (d, pos) in enumerate(entries):
+        pos_gaps = [pos[0]] + [y - x for x, y in zip(pos, pos[1:])]
+        skip = i + step if step > 1 and i % step == 0 and i + step < len(entries) else ''
+        toks.append(f"{d - prev},{len(pos)}:{','.join(map(str, pos_gaps))}:{skip}")
+        prev = d
+    return ' '.join(toks)
+
+def lengths_header(doc_lengths):
+    # postings header: "N doc:len doc:len ..."
+    return f"{len(doc_lengths)} " + ' '.join(f"{d}:{L:.6f}" for d, L in doc_lengths.items())
+
+def read_corpus(corpus_file):
+    with open(corpus_file, 'r', encoding='utf-8') as corpus:
+        for line in corpus:
+            yield json.loads(line)
+
+def build_index(corpus_file, out_dict, out_postings, block_docs=50000):
+    # build dictionary.txt/postings.txt from corpus.jsonl
+    return index_documents(read_corpus(corpus_file), out_dict, out_postings, block_docs)
+
+def index_documents(docs, out_dict, out_postings, block_docs=50000):
+    # index an iterable of corpus documents (title & content zones, positional, with skips)
+    # SPIMI-style: postings for block_docs docs at a time are flushed to sorted block files, then merged
+    doc_lengths = {}
+    blocks = []
+    tmp_dir = tempfile.mkdtemp(prefix="index-blocks-", dir=os.path.dirname(os.path.abspath(out_postings)))
+
+    def flush(block):
+        # one line per zone key: "zone_key<TAB>doc:pos,pos doc:pos,..." with absolute docIDs & positions
+        path = os.path.join(tmp_dir, f"block{len(blocks)}.txt")
+        with open(path, 'w') as f:
+            for zk in sorted(block):
+                entries = ' '.join(f"{d}:{','.join(map(str, pos))}" for d, pos in block[zk])
+                f.write(f"{zk}\t{entries}\n")
+        blocks.append(path)
+
+    block = defaultdict(list)
+    n_block = 0
+    for doc in docs:
+        d = int(doc["id"])
+        weights = []
+        for zone in ('title', 'content'):
+            positions = defaultdict(list)
+            for i, t in enumerate(tokenize(doc.get(zone, ''))):
+                positions[stem(t)].append(i)
+            for t, pos in positions.items():
+                block[f"{t}@{zone}"].append((d, pos))
+                weights.append(1 + math.log(len(pos), 10))
+        # cosine length over all zone keys, score_documents divides by it
+        doc_lengths[d] = math.sqrt(sum(w * w for w in weights)) or 1.0
+        n_block += 1
+        if n_block >= block_docs:
+            flush(block)
+            block, n_block = defaultdict(list), 0
+    if block:
+        flush(block)
+
+    def read_block(path):
+        with open(path) as f:
+            for line in f:
+                zk, entries = line.rstrip('\n').split('\t')
+                yield zk, entries
+
+    def postings_lines():
+        files = [read_block(p) for p in blocks]
+        for zk, group in groupby(heapq.merge(*files, key=lambda x: x[0]), key=lambda x: x[0]):
+            entries = []
+            for _, chunk in group:
+                for e in chunk.split():
+                    d, pos = e.split(':')
+                    entries.append((int(d), [int(p) for p in pos.split(',')]))
+            entries.sort()
+            yield zk, len(entries), encode_postings(entries)
+
+    try:
+        write_postings_file(out_dict, out_postings, lengths_header(doc_lengths), postings_lines())
+    finally:
+        for p in blocks:
+            os.remove(p)
+        os.rmdir(tmp_dir)
+    return len(doc_lengths)
+
+def build_impacts(dfile, pfile, out_dict, out_impacts, bits=8):
+    # precompute quantized BM25F impacts per (base term, doc), ordered by impact for score-at-a-time
+    dictionary, base2zones = load_dictionary(dfile)
+    postings_fh = PostingsFile(pfile)
+    N = int(postings_fh.header().split()[0])
+
+    # pass 1: field lengths (sum of tfs per doc per zone) and their averages
+    zone_lengths = defaultdict(lambda: defaultdict(int))
+    for zk in dictionary:
+        lengths = zone_lengths[zone_of(zk)]
+        for d, tf, _, _ in read_postings(zk, dictionary, postings_fh):
+            lengths[d] += tf
+    avg_lengths = {z: (sum(L.values()) / len(L) if L else 1.0) for z, L in zone_lengths.items()}
+
+    def bm25f_scores(base):
+        # BM25F: combine length-normalized zone tfs into one pseudo-tf per doc, then saturate once
+        pseudo_tf = defaultdict(float)
+        for zk in base2zones[base]:
+            z = zone_of(zk)
+            b = BM25_B.get(z, 0.75)
+            w = BM25_ZONE_WEIGHT.get(z, 1.0)
+            lengths, avg = zone_lengths[z], avg_lengths[z]
+            for d, tf, _, _ in read_postings(zk, dictionary, postings_fh):
+                norm = 1 - b + b * lengths[d] / avg if avg else 1.0
+                pseudo_tf[d] += w * tf / norm
+        idf = math.log(1 + (N - len(pseudo_tf) + 0.5) / (len(pseudo_tf) + 0.5))
+        return {d: idf * tf * (BM25_K1 + 1) / (BM25_K1 + tf) for d, tf in pseudo_tf.items()}
+
+    # pass 2: the largest impact in the index sets the (global) quantization scale
+    levels = (1 << bits) - 1
+    scale = max((max(s.values(), default=0.0) for s in map(bm25f_scores, base2zones)), default=0.0) or 1.0
+
+    def impact_lines():
+        # pass 3: quantize and write, segments by decreasing impact, docIDs gap-encoded inside a segment
+        for base in sorted(base2zones):
+            scores = bm25f_scores(base)
+            if not scores:
+                continue
+            by_impact = defaultdict(list)
+            for d, score in scores.items():
+                by_impact[max(1, min(levels, round(score / scale * levels)))].append(d)
+
+            segs = []
+            for q in sorted(by_impact, reverse=True):
+                docs = sorted(by_impact[q])
+                gaps = [docs[0]] + [y - x for x, y in zip(docs, docs[1:])]
+                segs.append(f"{q}:" + ','.join(map(str, gaps)))
+            yield base, len(scores), ' '.join(segs)
+
+    write_postings_file(out_dict, out_impacts, f"{N} {bits} {scale:.6f}", impact_lines())
+    postings_fh.close()
+
+def build_champions(dfile, pfile, mfile, out_dict, out_champions, r=200):
+    # tier 1: per zone key, keep the top-r postings by tf x static prior (court & date boost)
+    # the champion dictionary keeps the *full* df so score_documents computes the same idf on either tier
+    dictionary, _ = load_dictionary(dfile)
+    metadata = load_metadata(mfile)
+    postings_fh = PostingsFile(pfile)
+    header = postings_fh.header().strip()
+
+    def prior(posting):
+        d, tf, _, _ = posting
+        return tf * (static_boost(metadata[d]) if d in metadata else 1.0)
+
+    def champion_lines():
+        for zk in sorted(dictionary):
+            postings = read_postings(zk, dictionary, postings_fh)
+            champions = sorted(heapq.nlargest(r, postings, key=prior))
+            # same "gap,tf" layout as postings.txt, positions & skips dropped (only used for scoring)
+            prev, toks = 0, []
+            for d, tf, _, _ in champions:
+                toks.append(f"{d - prev},{tf}")
+                prev = d
+            yield zk, dictionary[zk][0], ' '.join(toks)
+
+    write_postings_file(out_dict, out_champions, header, champion_lines())
+    postings_fh.close()
+
+def parse_args():
+    p = argparse.ArgumentParser(
+        description="Build the index (dictionary/postings) and its optional impact & champion files"
+    )
+    sub = p.add_subparsers(dest="command", required=True)
+
+    b = sub.add_parser("build", help="Build dictionary.txt/postings.txt from a corpus.jsonl")
+    b.add_argument("--corpus-file", "-c", default="../scripts/corpus.jsonl", help="Path to your corpus file")
+    b.add_argument("--out-dict-file", default="dictionary.txt", help="Where to write the dictionary")
+    b.add_argument("--out-postings-file", default="postings.txt", help="Where to write the postings")
+    b.add_argument("--block-docs", type=int, default=50000, help="Documents per in-memory block")
+
+    imp = sub.add_parser("impacts", help="Build impact-ordered BM25F postings for --ranking bm25")
+    imp.add_argument("--dict-file", "-d", default="dictionary.txt", help="Path to your dictionary file")
+    imp.add_argument("--postings-file", "-p", default="postings.txt", help="Path to your postings file")
+    imp.add_argument("--out-dict-file", default="impacts_dictionary.txt", help="Where to write the impact dictionary")
+    imp.add_argument("--out-impacts-file", default="impacts.txt", help="Where to write the impact postings")
+    imp.add_argument("--bits", type=int, default=8, help="Quantization bits per impact")
+
+    ch = sub.add_parser("champions", help="Build tier-1 champion lists for --mode fast")
+    ch.add_argument("--dict-file", "-d", default="dictionary.txt", help="Path to your dictionary file")
+    ch.add_argument("--postings-file", "-p", default="postings.txt", help="Path to your postings file")
+    ch.add_argument("--metadata-file", "-m", default="../scripts/corpus.jsonl", help="Path to your metadata file")
+    ch.add_argument("--out-dict-file", default="champions_dictionary.txt", help="Where to write the champion dictionary")
+    ch.add_argument("--out-champions-file", default="champions.txt", help="Where to write the champion postings")
+    ch.add_argument("-r", type=int, default=200, help="Champion list length per zone key")
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    if args.command == "build":
+        if not os.path.exists(args.corpus_file):
+            print(f"File not found: {args.corpus_file}", file=sys.stderr)
+            sys.exit(1)
+        n = build_index(args.corpus_file, args.out_dict_file, args.out_postings_file, args.block_docs)
+        print(f"Indexed {n} documents into {args.out_dict_file} and {args.out_postings_file}")
+    elif args.command == "impacts":
+        for f in (args.dict_file, args.postings_file):
+            if not os.path.exists(f):
+                print(f"File not found: {f}", file=sys.stderr)
+                sys.exit(1)
+        build_impacts(args.dict_file, args.postings_file, args.out_dict_file, args.out_impacts_file, args.bits)
+        print(f"Wrote {args.out_dict_file} and {args.out_impacts_file}")
+    elif args.command == "champions":
+        for f in (args.dict_file, args.postings_file):
+            if not os.path.exists(f):
+                print(f"File not found: {f}", file=sys.stderr)
+                sys.exit(1)
+        build_champions(args.dict_file, args.postings_file, args.metadata_file,
+                        args.out_dict_file, args.out_champions_file, args.r)
+        print(f"Wrote {args.out_dict_file} and {args.out_champions_file}")
+
+if __name__ == '__main__':
+    main()
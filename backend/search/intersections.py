@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Materialized intersections for frequent boolean queries.
+
+Mines the query log (SEARCH_QUERY_LOG, written by the API, or any file with one
+query per line) for operand pairs that are often ANDed together and for frequent
+phrases, evaluates them once and stores the resulting docIDs next to the index:
+
+    <index dir>/intersections.json
+    <index dir>/intersections_<generation>_dictionary.txt   "key count offset"
+    <index dir>/intersections_<generation>_postings.txt     gap-encoded docIDs per key
+
+Keys are sorted operands joined by '&' (search.conjunction_key), phrases on their
+own are keyed by their '_'-joined stems. The manifest records the index version
+they were computed for, search.py (--intersections-manifest, see Intersections and
+plan_conjunction) ignores them once the index changed. Every build writes a new
+generation and replaces the manifest atomically; the generation before it is kept
+for readers that loaded the previous manifest, older ones are deleted.
+"""
+import os, sys, json, time, argparse, threading
+from collections import Counter, deque
+from itertools import combinations
+from search import (SearchIndex, parse_query, conjunction_key, evaluate_boolean_query,
+                    process_phrase_query)
+from index import write_postings_file
+
+MANIFEST = "intersections.json"
+MIN_COUNT = 3           # times a pair/phrase must occur in the log to be materialized
+MAX_QUERIES = 100000    # most recent log entries mined
+BUDGET_MB = 64          # cap on the size of the materialized postings
+REFRESH_SECONDS = 300   # how often the refresher checks the log & index
+
+
+def read_queries(log_files, max_queries=MAX_QUERIES):
+    # the most recent raw queries: JSON lines with a "query" field (the API query log), or plain text
+    queries = deque(maxlen=max_queries)
+    for log_file in log_files:
+        with open(log_file, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    line = json.loads(line)["query"]
+                except (ValueError, TypeError, KeyError):
+                    pass
+                queries.append(line)
+    return queries
+
+
+def mine(queries, min_count=MIN_COUNT):
+    """Materialization candidates: {key: occurrences} for pairs & phrases seen at least min_count times."""
+    counts = Counter()
+    for raw in queries:
+        if 'AND' not in raw:
+            continue
+        tokens, _ = parse_query(raw)
+        operands = tokens[0::2]
+        if len(tokens) % 2 == 0 or any(t != 'and' for t in tokens[1::2]) or 'and' in operands:
+            continue  # only plain conjunctions can be regrouped, see plan_conjunction
+        operands = sorted(set(operands))
+        counts.update(conjunction_key(pair) for pair in combinations(operands, 2))
+        counts.update(t for t in operands if '_' in t)
+    return {key: n for key, n in counts.items() if n >= min_count}
+
+
+def evaluate(key, index):
+    # docIDs matching a pair (a&b) or a phrase, computed by the regular boolean evaluation
+    if '&' in key:
+        a, b = key.split('&')
+        return evaluate_boolean_query([a, 'and', b], index.dictionary, index.postings_fh, index.base2zones)
+    return [d for d, _ in process_phrase_query(key.split('_'), index.dictionary, index.postings_fh, index.base2zones)]
+
+
+def encode_docs(docs):
+    prev, gaps = 0, []
+    for d in docs:
+        gaps.append(d - prev)
+        prev = d
+    return ','.join(map(str, gaps))
+
+
+def read_manifest(index_dir):
+    try:
+        with open(os.path.join(index_dir, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"generation": 0}
+
+
+def build(index_dir, queries, dict_file, postings_file, segments_manifest=None,
+          min_count=MIN_COUNT, budget_mb=BUDGET_MB):
+    """Materialize the most frequent candidates that fit the budget, returns the new manifest."""
+    t0 = time.time()
+    index = SearchIndex(dict_file, postings_file, None, segments_manifest=segments_manifest)
+    try:
+        candidates = mine(queries, min_count)
+        budget = budget_mb << 20
+        size, lines = 0, []
+        for key, _ in sorted(candidates.items(), key=lambda kv: (-kv[1], kv[0])):
+            docs = evaluate(key, index)
+            line = encode_docs(docs)
+            if size + len(line) + 1 > budget:
+                continue  # too big for what's left, a smaller (less frequent) one may still fit
+            size += len(line) + 1
+            lines.append((key, len(docs), line))
+        version = index.version
+    finally:
+        index.close()
+
+    previous = read_manifest(index_dir)
+    generation = previous["generation"] + 1
+    prefix = f"intersections_{generation:06d}"
+    lines.sort()  # dictionary in key order, like the index's
+    write_postings_file(os.path.join(index_dir, f"{prefix}_dictionary.txt"),
+                        os.path.join(index_dir, f"{prefix}_postings.txt"), version, lines)
+    manifest = {
+        "generation": generation,
+        "index_version": version,
+        "dictionary": f"{prefix}_dictionary.txt",
+        "postings": f"{prefix}_postings.txt",
+        "pairs": sum('&' in key for key, _, _ in lines),
+        "phrases": sum('&' not in key for key, _, _ in lines),
+        "candidates": len(candidates),
+        "bytes": size,
+        "queries": len(queries),
+        "built_at": round(t0, 3),
+        "build_seconds": round(time.time() - t0, 3),
+    }
+    tmp = os.path.join(index_dir, MANIFEST + ".tmp")
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(index_dir, MANIFEST))
+    collect_garbage(index_dir, generation)
+    return manifest
+
+
+def collect_garbage(index_dir, generation):
+    # keep the current & previous generation, a reader may have loaded the previous manifest
+    for f in os.listdir(index_dir):
+        parts = f.split('_')
+        if f.startswith("intersections_") and parts[1].isdigit() and int(parts[1]) < generation - 1:
+            os.remove(os.path.join(index_dir, f))
+
+
+def index_version(postings_file, segments_manifest=None):
+    # what SearchIndex.version will be, without loading the index
+    if segments_manifest:
+        with open(segments_manifest) as f:
+            return f"g{json.load(f)['generation']}"
+    st = os.stat(postings_file)
+    return f"{st.st_mtime_ns}-{st.st_size}"
+
+
+class IntersectionRefresher(threading.Thread):
+    # rebuilds the intersections every `interval` seconds if the query log grew or the index changed
+    def __init__(self, index_dir, log_files, dict_file, postings_file, segments_manifest=None,
+                 interval=REFRESH_SECONDS, **options):
+        super().__init__(daemon=True, name="intersection-refresher")
+        self.index_dir = index_dir
+        self.log_files = log_files
+        self.dict_file, self.postings_file = dict_file, postings_file
+        self.segments_manifest = segments_manifest
+        self.interval = interval
+        self.options = options  # min_count, budget_mb, max_queries
+        self._seen = None
+        self._stop_event = threading.Event()
+
+    def refresh(self):
+        manifest = read_manifest(self.index_dir)
+        state = (index_version(self.postings_file, self.segments_manifest),
+                 tuple(os.path.getsize(f) for f in self.log_files))
+        if state == self._seen and manifest.get("index_version") == state[0]:
+            return None
+        options = dict(self.options)
+        queries = read_queries(self.log_files, options.pop("max_queries", MAX_QUERIES))
+        manifest = build(self.index_dir, queries, self.dict_file, self.postings_file,
+                         self.segments_manifest, **options)
+        self._seen = state
+        return manifest
+
+    def run(self):
+        while True:
+            try:
+                manifest = self.refresh()
+                if manifest:
+                    print(f"Materialized {manifest['pairs']} pairs, {manifest['phrases']} phrases "
+                          f"({manifest['bytes']} bytes) for index {manifest['index_version']}", file=sys.stderr)
+            except Exception as e:
+                print(f"Intersection refresh failed: {e}", file=sys.stderr)
+            if self._stop_event.wait(self.interval):
+                break
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Materialize intersections of frequent boolean term pairs & phrases")
+    p.add_argument("--index-dir", "-i", default=".", help="Directory holding dictionary.txt/postings.txt, intersections are written here")
+    p.add_argument("--segments-manifest", default=None, help="Segmented index to build against (segments.json)")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    for name, description in (("build", "Mine the query log and materialize once"),
+                       ("watch", "Keep the intersections fresh as the log & index change")):
+        b = sub.add_parser(name, help=description)
+        b.add_argument("--query-log", "-q", nargs="+", required=True, help="Query log(s), JSON lines or one query per line")
+        b.add_argument("--min-count", type=int, default=MIN_COUNT, help="Occurrences needed to be materialized")
+        b.add_argument("--budget-mb", type=int, default=BUDGET_MB, help="Cap on the materialized postings size")
+        b.add_argument("--max-queries", type=int, default=MAX_QUERIES, help="Most recent log entries mined")
+        if name == "watch":
+            b.add_argument("--interval", type=float, default=REFRESH_SECONDS, help="Seconds between refresh checks")
+
+    sub.add_parser("info", help="Print the manifest")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    dict_file = os.path.join(args.index_dir, "dictionary.txt")
+    postings_file = os.path.join(args.index_dir, "postings.txt")
+    if args.command == "info":
+        print(json.dumps(read_manifest(args.index_dir), indent=2))
+        return
+    for f in args.query_log:
+        if not os.path.exists(f):
+            print(f"File not found: {f}", file=sys.stderr)
+            sys.exit(1)
+    options = {"min_count": args.min_count, "budget_mb": args.budget_mb, "max_queries": args.max_queries}
+    if args.command == "build":
+        refresher = IntersectionRefresher(args.index_dir, args.query_log, dict_file, postings_file,
+                                          args.segments_manifest, **options)
+        manifest = refresher.refresh()
+        print(f"Materialized {manifest['pairs']} pairs, {manifest['phrases']} phrases ({manifest['bytes']} bytes)")
+    elif args.command == "watch":
+        refresher = IntersectionRefresher(args.index_dir, args.query_log, dict_file, postings_file,
+                                          args.segments_manifest, args.interval, **options)
+        refresher.start()
+        try:
+            while refresher.is_alive():
+                refresher.join(1.0)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == '__main__':
+    main()
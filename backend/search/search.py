@@ -1,7 +1,55 @@
 #!/usr/bin/env python3
-import sys, re, math, string, argparse, json
-from collections import defaultdict
-import nltk
+import sys, os, re, math, string, argparse, json, heapq, time, threading
+from array import array
+from collections import defaultdict, OrderedDict
+from itertools import combinations, islice
+from operator import itemgetter
+_MODULE_START = time.perf_counter()
+# local Porter port: importing nltk took longer than most queries
+from stemmer import stem, tokenize
+IMPORT_SECONDS = time.perf_counter() - _MODULE_START
+
+class QueryStats:
+    # per-query stage timings & counters, reported back to the API with --stats
+    def __init__(self):
+        self.times = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.plan = {}
+        self._last = time.perf_counter()
+        self._nested = 0.0
+
+    def lap(self, stage):
+        # charge the time since the previous lap to `stage`, minus what nested stages already took
+        now = time.perf_counter()
+        self.times[stage] += now - self._last - self._nested
+        self._last = now
+        self._nested = 0.0
+
+    def add(self, stage, seconds):
+        # time for a stage nested inside the running lap (e.g. postings I/O during scoring)
+        self.times[stage] += seconds
+        self._nested += seconds
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+_local = threading.local()
+
+def query_stats():
+    # stats of the query running on this thread
+    if not hasattr(_local, 'stats'):
+        _local.stats = QueryStats()
+    return _local.stats
+
+def reset_query_stats():
+    _local.stats = QueryStats()
+    return _local.stats
+
+def query_type(raw):
+    # label used for per-stage metrics: boolean queries with a quoted phrase count as phrase queries
+    if 'AND' not in raw:
+        return "free_text"
+    return "phrase" if '"' in raw else "boolean"
 
 def usage():
     print(f"usage: {sys.argv[0]} -d dictionary-file -p postings-file -q query-file -o output-file")
@@ -40,20 +88,153 @@ def parse_lengths_line(items):
         L[int(doc)] = float(length)
     return L
     
+IO_THREADS = int(os.environ.get("SEARCH_IO_THREADS", "4"))
+_io_pool = None
+_io_pool_lock = threading.Lock()
+
+def io_pool():
+    # small pool shared by all queries for postings reads, created on first use
+    # (concurrent.futures is imported here so it stays off the cold-start path)
+    global _io_pool
+    if _io_pool is None:
+        with _io_pool_lock:
+            if _io_pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _io_pool = ThreadPoolExecutor(IO_THREADS, thread_name_prefix="postings-io")
+    return _io_pool
+
+class PostingsFile:
+    # postings (or impacts / champions) file read with os.pread at dictionary offsets & lengths.
+    # There is no shared file position, so one descriptor serves the I/O pool and concurrent queries
+    def __init__(self, path):
+        self.name = path
+        self.fd = os.open(path, os.O_RDONLY)
+        self.size = os.fstat(self.fd).st_size
+        if hasattr(os, 'posix_fadvise'):
+            # every read is a known extent, sequential readahead would only pull in neighbouring lists
+            os.posix_fadvise(self.fd, 0, 0, os.POSIX_FADV_RANDOM)
+
+    def _length(self, offset, length):
+        # the dictionary's last entry runs up to the end of the file
+        return self.size - offset if length is None else length
+
+    def read(self, offset, length):
+        return os.pread(self.fd, self._length(offset, length), offset)
+
+    def advise(self, offset, length):
+        # readahead hint, the kernel starts fetching while the reads queue up on the pool
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(self.fd, offset, self._length(offset, length), os.POSIX_FADV_WILLNEED)
+
+    def header(self, chunk=1 << 16):
+        # the first line ("N doc:len ..." in postings files), no dictionary entry covers it
+        parts, pos = [], 0
+        while pos < self.size:
+            block = os.pread(self.fd, chunk, pos)
+            nl = block.find(b'\n')
+            if nl >= 0 or not block:
+                parts.append(block[:nl] if nl >= 0 else block)
+                break
+            parts.append(block)
+            pos += len(block)
+        return b''.join(parts).decode()
+
+    def close(self):
+        if getattr(self, 'fd', -1) >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def __del__(self):
+        # a resident index that was swapped out is closed once its last query drops it
+        self.close()
+
+def read_extents(extents):
+    # read (PostingsFile, offset, length) extents, issued together on the I/O pool.
+    # The time the query waits for them is its postings_io (I/O wait)
+    stats = query_stats()
+    t0 = time.perf_counter()
+    if len(extents) > 1:
+        for f, offset, length in extents:
+            f.advise(offset, length)
+        futures = [io_pool().submit(f.read, offset, length) for f, offset, length in extents]
+        data = [fut.result() for fut in futures]
+    else:
+        data = [f.read(offset, length) for f, offset, length in extents]
+    stats.add('postings_io', time.perf_counter() - t0)
+    stats.count('postings_reads', len(extents))
+    stats.count('postings_bytes_read', sum(map(len, data)))
+    return [d.decode() for d in data]
+
+def decode_postings(line):
+    stats = query_stats()
+    t0 = time.perf_counter()
+    postings = parse_postings_line(line)
+    stats.add('postings_decode', time.perf_counter() - t0)
+    stats.count('postings_decoded', len(postings))
+    return postings
+
+class PrefetchedPostings:
+    # postings already fetched for a query, stands in for its postings file;
+    # zone keys that weren't prefetched are read from `source`
+    def __init__(self, postings, source):
+        self.postings = postings
+        self.source = source
+
+def fetch_postings(zone_keys, dictionary, postings_fh):
+    # {zone_key: postings} for several zone keys, all reads issued together (see read_extents)
+    if isinstance(postings_fh, PrefetchedPostings):
+        fetched = {zk: postings_fh.postings[zk] for zk in zone_keys if zk in postings_fh.postings}
+        missing = [zk for zk in zone_keys if zk not in fetched]
+        if missing:
+            fetched.update(fetch_postings(missing, dictionary, postings_fh.source))
+        return fetched
+    if isinstance(postings_fh, SegmentedIndex):
+        return postings_fh.fetch_postings(zone_keys)
+    keys = [zk for zk in dict.fromkeys(zone_keys) if zk in dictionary]
+    lines = read_extents([(postings_fh, dictionary[zk][1], dictionary[zk][2]) for zk in keys])
+    return {zk: decode_postings(line) for zk, line in zip(keys, lines)}
+
+# start of a posting ("docGap,tf" at the start of a token), positions come after the ':'
+POSTING_HEAD_RE = re.compile(r'(?<!\S)(\d+),(\d+)(?=[:\s]|$)')
+
+def iter_postings(line):
+    # (docID, tf) per posting of a postings line, decoded as it's consumed. Positions & skips are left
+    # in the line, so streaming a list costs its text rather than a decoded list of tuples
+    docID, n = 0, 0
+    for m in POSTING_HEAD_RE.finditer(line):
+        docID += int(m.group(1))
+        n += 1
+        yield docID, int(m.group(2))
+    query_stats().count('postings_decoded', n)
+
+def stream_postings(zone_keys, dictionary, postings_fh):
+    # {zone_key: iterator of (docID, tf) in docID order}, read in one batch like fetch_postings
+    if isinstance(postings_fh, SegmentedIndex):
+        return postings_fh.stream_postings(zone_keys)
+    keys = [zk for zk in dict.fromkeys(zone_keys) if zk in dictionary]
+    lines = read_extents([(postings_fh, dictionary[zk][1], dictionary[zk][2]) for zk in keys])
+    return {zk: iter_postings(line) for zk, line in zip(keys, lines)}
+
 def get_postings(zone_key, dictionary, postings_fh):
-    # get postings for a zone_key (like 'phone@title' etc), from dict[term] by offset
+    # get postings for a zone_key (like 'phone@title' etc), from dict[term] by offset & length
     if zone_key not in dictionary:
         return []
-    df, offset = dictionary[zone_key]
-    postings_fh.seek(offset)
-    return parse_postings_line(postings_fh.readline())
+    return fetch_postings([zone_key], dictionary, postings_fh).get(zone_key, [])
     
 def get_postings_all(base, dictionary, postings_fh, base2zones):
     # merge all zone_key postings for a base term
 
+    zones = base2zones.get(base, [])
+    if len(zones) == 1:
+        return get_postings(zones[0], dictionary, postings_fh)
+    # several zones: merge by docID (intersect_with_skips needs sorted lists), one entry per doc.
+    # skip pointers index into their own zone's list, so they're meaningless once merged
     merged = []
-    for zk in base2zones.get(base, []):
-        merged.extend(get_postings(zk, dictionary, postings_fh))
+    for d, tf, positions, _ in heapq.merge(*(get_postings(zk, dictionary, postings_fh) for zk in zones),
+                                           key=lambda p: p[0]):
+        if merged and merged[-1][0] == d:
+            continue
+        merged.append((d, tf, positions, -1))
     return merged
 
 def shunting_yard(query_tokens):
@@ -92,12 +273,12 @@ def intersect_with_skips(p1, p2):
             i += 1
             j += 1
         elif doc1 < doc2:
-            if skip1 != -1 and i + skip1 < len(p1) and p1[skip1][0] <= doc2:
+            if skip1 != -1 and i < skip1 < len(p1) and p1[skip1][0] <= doc2:
                 i = skip1
             else:
                 i += 1
         else:  # doc2 < doc1
-            if skip2 != -1 and j + skip2 < len(p2) and p2[skip2][0] <= doc1:
+            if skip2 != -1 and j < skip2 < len(p2) and p2[skip2][0] <= doc1:
                 j = skip2
             else:
                 j += 1
@@ -160,13 +341,88 @@ def process_phrase_query(words, dictionary, postings_fh, base2zones):
         if not candidates:
             return []  # no more candidates, phrase cannot exist
     
-    # convert to format used by boolean operations
-    return [(doc, -1) for doc in candidates.keys()]
+    # convert to format used by boolean operations, sorted by docID like any postings list
+    # (candidates come out in zone order, intersect_with_skips needs sorted input)
+    return [(doc, -1) for doc in sorted(candidates)]
 
-def evaluate_boolean_query(query_tokens, dictionary, postings_fh, base2zones):
+def conjunction_key(operands):
+    # materialized conjunctions are keyed by their sorted operands (terms, or phrases as '_'-joined stems)
+    return '&'.join(sorted(operands))
+
+def parse_docs_line(line):
+    # gap-encoded "gap,gap,..." docIDs (materialized conjunctions), '' for an empty result
+    docs, prev = [], 0
+    for g in line.strip().split(',') if line.strip() else []:
+        prev += int(g)
+        docs.append(prev)
+    return docs
+
+class Intersections:
+    # conjunctions of frequent operand pairs & phrase matches, materialized by intersections.py
+    # for one index version. The manifest is replaced atomically on every refresh
+    def __init__(self, manifest_file):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+        self.index_version = manifest["index_version"]
+        root = os.path.dirname(os.path.abspath(manifest_file))
+        self.dictionary = {key: (count, offset, length) for key, count, offset, length
+                           in read_dictionary_entries(os.path.join(root, manifest["dictionary"]))}
+        self.postings_fh = PostingsFile(os.path.join(root, manifest["postings"]))
+
+    def fetch(self, keys):
+        keys = [k for k in dict.fromkeys(keys) if k in self.dictionary]
+        lines = read_extents([(self.postings_fh, self.dictionary[k][1], self.dictionary[k][2]) for k in keys])
+        return {k: parse_docs_line(line) for k, line in zip(keys, lines)}
+
+    def close(self):
+        self.postings_fh.close()
+
+def plan_conjunction(query_tokens, intersections):
+    # regroup a plain conjunction (a and b and ...) around materialized pairs & phrases, AND being
+    # commutative. Returns (query tokens, {materialized key: docIDs}), tokens unchanged if nothing applies
+    operands = query_tokens[0::2]
+    if (len(query_tokens) % 2 == 0 or any(t != 'and' for t in query_tokens[1::2])
+            or 'and' in operands):
+        return query_tokens, {}
+    rest = list(dict.fromkeys(operands))  # repeating an operand doesn't change a conjunction
+    chosen = []
+    # pairs first, smallest materialized result first
+    pairs = sorted((intersections.dictionary[key][0], key, a, b) for a, b in combinations(rest, 2)
+                   for key in [conjunction_key((a, b))] if key in intersections.dictionary)
+    for _, key, a, b in pairs:
+        if a in rest and b in rest:
+            rest.remove(a)
+            rest.remove(b)
+            chosen.append(key)
+    # then phrases on their own
+    for t in list(rest):
+        if '_' in t and t in intersections.dictionary:
+            rest.remove(t)
+            chosen.append(t)
+    if not chosen:
+        return query_tokens, {}
+    tokens = []
+    for t in chosen + rest:
+        tokens += [t, 'and']
+    return tokens[:-1], intersections.fetch(chosen)
+
+def evaluate_boolean_query(query_tokens, dictionary, postings_fh, base2zones, intersections=None):
     # use shunting yard to evaluate bool query
+    # intersections: optional Intersections for this index, used for the subexpressions it materialized
+    materialized = {}
+    if intersections is not None:
+        query_tokens, materialized = plan_conjunction(query_tokens, intersections)
+        stats = query_stats()
+        stats.count('intersections_used' if materialized else 'intersections_missed')
+        if materialized:
+            stats.plan["materialized"] = list(materialized)
     tokens = shunting_yard(query_tokens)
     stack = []
+    
+    # fetch every zone list the query touches (terms & phrase words) in one batch
+    zone_keys = [zk for token in tokens if token not in ('and', 'or', 'not') and token not in materialized
+                 for word in token.split('_') for zk in base2zones.get(word, [])]
+    postings_fh = PrefetchedPostings(fetch_postings(zone_keys, dictionary, postings_fh), postings_fh)
 
     for token in tokens:
         if token == 'and':
@@ -210,6 +466,9 @@ def evaluate_boolean_query(query_tokens, dictionary, postings_fh, base2zones):
             
             commons = intersect_with_skips(p1, p2)
             stack.append([(d, -1) for d in commons])
+        elif token in materialized:
+            # a materialized conjunction or phrase, already a sorted docID list
+            stack.append([(d, -1) for d in materialized[token]])
         else:
             # Current token is a term or phrase
             if '_' in token:
@@ -276,6 +535,57 @@ def calculate_date_boost(doc_date):
         # try except just in case if date parsing fails
         return 1.0
 
+# EXPERIMENT: to place more emphasis on courts which prof indicated to have higher level in the hierarchy
+COURT_BOOST = {
+    # Most important
+    "SG Court of Appeal": 1.5,
+    "SG Privy Council": 1.5,
+    "UK House of Lords": 1.5,
+    "UK Supreme Court": 1.5,
+    "High Court of Australia": 1.5,
+    "CA Supreme Court": 1.5,
+    
+    # Important
+    "SG High Court": 1.2,
+    "Singapore International Commercial Court": 1.2,
+    "HK High Court": 1.2,
+    "HK Court of First Instance": 1.2,
+    "UK Crown Court": 1.2,
+    "UK Court of Appeal": 1.2,
+    "UK High Court": 1.2,
+    "Federal Court of Australia": 1.2,
+    "NSW Court of Appeal": 1.2,
+    "NSW Court of Criminal Appeal": 1.2,
+    "NSW Supreme Court": 1.2,
+    
+    # Default
+    "default": 1.0
+}
+
+# largest value static_boost can return (top court x most recent date), used as an upper bound
+MAX_STATIC_BOOST = 1.5 * 1.3
+
+def static_boost(doc_meta):
+    # query-independent prior for a doc: court boost x date (recency) boost
+    boost = 1.0
+    if "court" in doc_meta:
+        boost *= COURT_BOOST.get(doc_meta["court"], COURT_BOOST["default"])
+    if "date" in doc_meta:
+        boost *= calculate_date_boost(doc_meta["date"])
+    return boost
+
+def apply_boosts(scores, doc_lengths, metadata):
+    # length normalize & apply the court & date boosts, in place
+    for d in list(scores):
+        # Length normalization
+        L = doc_lengths.get(d, 1.0)
+        if L > 0:
+            scores[d] /= L
+        
+        # apply court and date boosts only if metadata file is available
+        if metadata and d in metadata:
+            scores[d] *= static_boost(metadata[d])
+
 # EXPERIMENT: Trying out NLTK's WordNet to expand query - NOT GOOD EVEN AFTER REFINING, COMMENTED OUT
 # def expand_with_wordnet(term, stemmer):
 #     # skip expansion for these terms that don't expand well in legal context
@@ -344,30 +654,33 @@ def refine_query(initial_results, query_tokens, query_token_freqs, dictionary, p
     expanded_tokens = list(query_tokens)
     expanded_freqs = dict(query_token_freqs)
     
+    # every zone list used below, read once in one batch. Only the feedback docs' tfs are kept
+    feedback = set(feedback_docs)
+    streams = stream_postings([zk for base in expanded_freqs for zk in base2zones.get(base, [])],
+                              dictionary, postings_fh)
+    feedback_tfs = {zk: {d: tf for d, tf in postings if d in feedback} for zk, postings in streams.items()}
+
     # build "doc zones" for efficient processing
     # maps docID to list of zone_keys that term appears in
     doc_zones = defaultdict(list)
     for base in expanded_freqs:
         for zk in base2zones.get(base, []):
-            for d, _, _, _ in get_postings(zk, dictionary, postings_fh):
-                if d in feedback_docs:
-                    doc_zones[d].append(zk)
+            for d in feedback_tfs.get(zk, {}):
+                doc_zones[d].append(zk)
     
     # helper function to build vector for a document
     def doc_vector(doc_id):
         v = defaultdict(float)
         # only consider zone_keys that appear in the top K docs
         for zk in set(z for d in feedback_docs for z in doc_zones.get(d, [])):
-            df, _ = dictionary[zk]
+            df = dictionary[zk][0]
             if df == 0:
                 continue
             idf = math.log(N/df, 10)
             
-            # Search postings just once
-            for d, tf, _, _ in get_postings(zk, dictionary, postings_fh):
-                if d == doc_id:
-                    v[zk] = (1 + math.log(tf, 10)) * idf
-                    break
+            tf = feedback_tfs[zk].get(doc_id)
+            if tf is not None:
+                v[zk] = (1 + math.log(tf, 10)) * idf
         return v
     
     # Original query vector q0
@@ -378,7 +691,7 @@ def refine_query(initial_results, query_tokens, query_token_freqs, dictionary, p
             zone_weight = 2.0 if '@title' in zk else 1.0
             # EXPERIMENT: to place more emphasis on title
             
-            df, _ = dictionary[zk]
+            df = dictionary[zk][0]
             if df == 0:
                 continue
             idf = math.log(N/df, 10)
@@ -439,14 +752,106 @@ def refine_query(initial_results, query_tokens, query_token_freqs, dictionary, p
     
     return expanded_tokens, expanded_freqs
 
-def score_documents(query_token_freqs, dictionary, postings_fh, N, base2zones):
-    # tf-idf score per zone (weight title zone more)
-    scores = defaultdict(float)
-    
-    # Prepare all terms in advance
-    terms = list(query_token_freqs.items())
-    
-    for t, qf in terms:
+def df_class(df):
+    # coarse df bucket used to label term cache lookups (a label per term would be unbounded)
+    for limit, label in ((100, "lt100"), (1000, "lt1k"), (10000, "lt10k"), (100000, "lt100k")):
+        if df < limit:
+            return label
+    return "ge100k"
+
+class TermScoreCache:
+    # (index version, zone_key) -> that zone's weighted score vector (docIDs & tf_w * idf * zone_weight),
+    # so queries sharing terms only fetch & score the terms that aren't cached yet. Shared across queries
+    # in a long-lived process (the API's resident mode), bounded by max_bytes, least recently used out first.
+    # Weights depend on df & N, hence the version: queries use the cache through bind(index.version).
+    # Entries of a replaced version aren't dropped on the switch, queries still running on it keep using
+    # them while a reload overlaps, and they age out through the LRU once nothing reads them anymore
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.version = None  # last version bound, for /debug/term-cache
+        self.bytes = 0
+        self._entries = OrderedDict()  # (version, zone_key) -> [docs, weights, nbytes, df, hits]
+        self._lock = threading.Lock()
+
+    def bind(self, version):
+        # the cache as seen by queries on one index version, they only read & add that version's entries
+        with self._lock:
+            self.version = version
+        return BoundTermScoreCache(self, version)
+
+    def get(self, version, zone_key, df):
+        with self._lock:
+            entry = self._entries.get((version, zone_key))
+            if entry is not None:
+                self._entries.move_to_end((version, zone_key))
+                entry[4] += 1
+        query_stats().count(f"term_cache_{'hit' if entry else 'miss'}:{df_class(df)}")
+        return (entry[0], entry[1]) if entry else None
+
+    def put(self, version, zone_key, df, docs, weights):
+        nbytes = sys.getsizeof(docs) + sys.getsizeof(weights) + sys.getsizeof(zone_key)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if (version, zone_key) in self._entries:
+                return
+            self._entries[(version, zone_key)] = [docs, weights, nbytes, df, 0]
+            self.bytes += nbytes
+            evictions = 0
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted[2]
+                evictions += 1
+        if evictions:
+            query_stats().count('term_cache_evictions', evictions)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def top(self, n=50):
+        # most hit entries, for the API's /debug/term-cache
+        with self._lock:
+            entries = list(self._entries.items())
+        entries.sort(key=lambda e: -e[1][4])
+        return [{"zone_key": zk, "df": df, "postings": len(docs), "bytes": nbytes, "hits": hits}
+                for (_, zk), (docs, _, nbytes, df, hits) in entries[:n]]
+
+class BoundTermScoreCache:
+    # TermScoreCache for one index version, what score_documents takes
+    def __init__(self, cache, version):
+        self.cache = cache
+        self.version = version
+
+    def get(self, zone_key, df):
+        return self.cache.get(self.version, zone_key, df)
+
+    def put(self, zone_key, df, docs, weights):
+        self.cache.put(self.version, zone_key, df, docs, weights)
+
+def zone_scores(zone_key, postings, idf):
+    # one zone's contribution per doc before query weighting, title zone counts double
+    zone_weight = 2.0 if '@title' in zone_key else 1.0
+    # EXPERIMENT: to place more emphasis on title
+    docs, weights = array('q'), array('d')
+    for docID, tf, _, _ in postings:
+        if tf <= 0:
+            continue
+        docs.append(docID)
+        weights.append((1 + math.log(tf, 10)) * idf * zone_weight)
+    return docs, weights
+
+# peak bytes per doc a capped query keeps: its (score, docID) heap entry, the returned score dict
+# and the sorted (doc, score) list, measured with tracemalloc. Converts the memory cap to a doc count
+CANDIDATE_BYTES = 256
+
+def candidate_limit(max_mb):
+    # docs a query may keep under a max_mb cap, None for no cap
+    return (max_mb << 20) // CANDIDATE_BYTES if max_mb > 0 else None
+
+def plan_zones(query_token_freqs, dictionary, N, base2zones, term_cache=None):
+    # (zone_key, df_sum, idf, qf_w, cached vector or None) per zone of the query terms
+    zone_plan = []
+    for t, qf in query_token_freqs.items():
         zones = base2zones.get(t)
         if not zones:
             continue
@@ -457,83 +862,276 @@ def score_documents(query_token_freqs, dictionary, postings_fh, N, base2zones):
             continue
             
         idf = math.log(N/df_sum, 10)
-        
-        # score each zone separately with weighting
+        qf_w = 1 + math.log(qf, 10)
         for zone_key in zones:
-            # Apply zone weight directly to this zone's contribution
-            zone_weight = 2.0 if '@title' in zone_key else 1.0
-            # EXPERIMENT: to place more emphasis on title
-            
-            for docID, tf, _, _ in get_postings(zone_key, dictionary, postings_fh):
-                if tf <= 0:
-                    continue
-                    
-                tf_w = 1 + math.log(tf, 10)
-                qf_w = 1 + math.log(qf, 10)
-                scores[docID] += tf_w * qf_w * idf * zone_weight
+            cached = term_cache.get(zone_key, df_sum) if term_cache is not None else None
+            zone_plan.append((zone_key, df_sum, idf, qf_w, cached))
+    return zone_plan
+
+def score_documents(query_token_freqs, dictionary, postings_fh, N, base2zones, term_cache=None):
+    # tf-idf score per zone (weight title zone more)
+    # term_cache: TermScoreCache bound to this index's version, None to always score from postings
+    scores = defaultdict(float)
+    
+    # Prepare all terms in advance: (zone_key, df_sum, idf, qf_w, cached vector or None)
+    zone_plan = plan_zones(query_token_freqs, dictionary, N, base2zones, term_cache)
+    
+    # the zones that aren't cached are read in one batch
+    fetched = fetch_postings([zk for zk, _, _, _, cached in zone_plan if not cached], dictionary, postings_fh)
+    
+    # score each zone separately with weighting
+    for zone_key, df_sum, idf, qf_w, cached in zone_plan:
+        if cached:
+            docs, weights = cached
+        else:
+            docs, weights = zone_scores(zone_key, fetched.get(zone_key, []), idf)
+            if term_cache is not None:
+                term_cache.put(zone_key, df_sum, docs, weights)
+        for docID, w in zip(docs, weights):
+            scores[docID] += w * qf_w
     
     return scores
 
-def parse_args():
-    p = argparse.ArgumentParser(
-        description="Search script (supports JSON output)"
-    )
-    p.add_argument(
-        "--query", "-q",
-        help="The query string to search for",
-        required=True
-    )
-    p.add_argument(
-        "--topk",
-        help="Number of top results to return",
-        type=int, default=10
-    )
-    p.add_argument(
-        "--output-format",
-        help="text (one-line IDs) or json",
-        choices=["text","json"],
-        default="text"
-    )
-    p.add_argument(
-        "--dict-file", "-d",
-        help="Path to your dictionary file",
-        default="dictionary.txt"
-    )
-    p.add_argument(
-        "--postings-file", "-p",
-        help="Path to your postings file",
-        default="postings.txt"
-    )
-    p.add_argument(
-        "--metadata-file", "-m",
-        help="Path to your metadata file",
-        default="../scripts/corpus.jsonl"
-    )
-    return p.parse_args()
+def candidate_bound(query_token_freqs, dictionary, base2zones):
+    # most docs a query can score: the dfs of its terms' zone keys
+    return sum(dictionary[zk][0] for t in query_token_freqs for zk in base2zones.get(t, []))
 
+def sum_by_doc(streams):
+    # (docID, summed weight) per doc over docID-sorted (docID, weight) streams, in docID order.
+    # heapq.merge is stable, so a doc's weights are added in the order of `streams`
+    current, total = None, 0.0
+    for d, w in heapq.merge(*streams, key=itemgetter(0)):
+        if d != current:
+            if current is not None:
+                yield current, total
+            current, total = d, 0.0
+        total += w
+    if current is not None:
+        yield current, total
 
-def main():
-    args = parse_args()
-    dfile = args.dict_file
-    pfile = args.postings_file
-    mfile = args.metadata_file
-    query_str = args.query
-    topk = args.topk
-    out_fmt = args.output_format
+def keep_top(heap, k, docID, score):
+    # k-sized min-heap of (score, -docID): the best k in result order (score desc, docID asc)
+    entry = (score, -docID)
+    if len(heap) < k:
+        heapq.heappush(heap, entry)
+    elif entry > heap[0]:
+        heapq.heapreplace(heap, entry)
+
+def score_documents_topk(query_token_freqs, dictionary, postings_fh, N, base2zones, doc_lengths, metadata,
+                         k, term_cache=None, only=None):
+    # the k best of score_documents + apply_boosts, with memory bounded by k instead of by the candidates.
+    # Zone lists are sorted by docID, so they're merged doc-at-a-time: a doc's score is complete once the
+    # merge moves past it, then it's boosted and competes for a k-sized heap. Postings are decoded as the
+    # merge reaches them (see stream_postings). Scores are the same floats as the term-at-a-time pass.
+    # Cached zone vectors are used, uncached zones aren't added (that would hold their full vectors).
+    # only: score just these docs, all of them are returned
+    stats = query_stats()
+    zone_plan = plan_zones(query_token_freqs, dictionary, N, base2zones, term_cache)
+    streams = stream_postings([zk for zk, _, _, _, cached in zone_plan if not cached], dictionary, postings_fh)
+    
+    def weighted(zone_key, idf, qf_w, cached):
+        # (docID, w * qf_w) of one zone, as score_documents adds them
+        if cached:
+            for docID, w in zip(*cached):
+                yield docID, w * qf_w
+            return
+        zone_weight = 2.0 if '@title' in zone_key else 1.0
+        for docID, tf in streams.get(zone_key, ()):
+            if tf > 0:
+                yield docID, (1 + math.log(tf, 10)) * idf * zone_weight * qf_w
+    
+    if only is not None:
+        k = len(only)
+    heap, candidates = [], 0
+    for docID, s in sum_by_doc(weighted(zk, idf, qf_w, cached) for zk, _, idf, qf_w, cached in zone_plan):
+        if only is not None and docID not in only:
+            continue
+        candidates += 1
+        L = doc_lengths.get(docID, 1.0)
+        if L > 0:
+            s /= L
+        if metadata and docID in metadata:
+            s *= static_boost(metadata[docID])
+        keep_top(heap, k, docID, s)
+    stats.count('candidates_scored', candidates)
+    if only is None and candidates > k:
+        stats.count('candidates_capped')
+    return {-neg_d: s for s, neg_d in heap}
+
+def parse_impacts_line(line):
+    # parse a line like "q:gap,gap,... q:gap,...", return list of (impact, [docIDs])
+    # segments are stored by decreasing impact, docIDs within a segment are gap-encoded
+    out = []
+    for seg in line.strip().split():
+        q, gaps = seg.split(':')
+        prev = 0
+        docs = []
+        for g in gaps.split(','):
+            prev += int(g)
+            docs.append(prev)
+        out.append((int(q), docs))
+    return out
+
+def load_impacts_dictionary(ifile):
+    # impact dictionary lines are "base df offset", same layout as dictionary.txt
+    return {term: (dfreq, offset, length) for term, dfreq, offset, length in read_dictionary_entries(ifile)}
+
+def score_bm25_saat(query_token_freqs, impacts_dict, impacts_fh, metadata, topk):
+    # BM25F scoring, score-at-a-time over impact-ordered postings (built by index.py)
+    # impacts are already quantized BM25F contributions (title/content fields folded in),
+    # so a query is just summing integer impacts, highest first. Once no unseen doc can reach the
+    # top-k, new docs are no longer admitted and only the accumulated docs are completed.
+    # Only admission is bounded: completing the admitted docs' scores still decodes & walks every
+    # remaining segment, so the I/O and decode work is that of a full pass. On broad terms the
+    # low-impact tail keeps the bound above the k-th score and admission rarely stops at all.
+    stats = query_stats()
+    terms = []
+    wanted = [(t, qf) for t, qf in query_token_freqs.items() if t in impacts_dict]
+    lines = read_extents([(impacts_fh, impacts_dict[t][1], impacts_dict[t][2]) for t, _ in wanted])
+    for (t, qf), line in zip(wanted, lines):
+        t0 = time.perf_counter()
+        segs = parse_impacts_line(line)
+        stats.add('postings_decode', time.perf_counter() - t0)
+        stats.count('postings_decoded', sum(len(docs) for _, docs in segs))
+        if segs:
+            terms.append((1 + math.log(qf, 10), segs))
+    
+    boosts = {}
+    def boost(d):
+        # memoized court & date prior, applied on top of BM25 like the tf-idf path
+        if d not in boosts:
+            boosts[d] = static_boost(metadata[d]) if metadata and d in metadata else 1.0
+        return boosts[d]
+    
+    # heads[i] = contribution of term i's next unprocessed segment (0 when exhausted)
+    heads = [qf_w * segs[0][0] for qf_w, segs in terms]
+    heap = [(-heads[i], i, 0) for i in range(len(terms))]
+    heapq.heapify(heap)
+    
+    # no metadata -> no boosts, so unseen docs are bounded by the raw remaining impact
+    max_boost = MAX_STATIC_BOOST if metadata else 1.0
+    acc = defaultdict(float)
+    admitting = True  # whether docs not in acc yet can still make the top-k
+    check_at = None   # bound on unseen docs at which the k-th score is looked at next
+    while heap:
+        neg_w, i, s = heapq.heappop(heap)
+        qf_w, segs = terms[i]
+        w = -neg_w
+        docs = segs[s][1]
+        if not admitting:
+            # top-k membership is settled for unseen docs, the rest only completes the scores in acc
+            for d in docs:
+                if d in acc:
+                    acc[d] += w
+        else:
+            for d in docs:
+                acc[d] += w
         
-    nltk.download('punkt', quiet=True)
+        # advance term i to its next segment
+        if s + 1 < len(segs):
+            heads[i] = qf_w * segs[s + 1][0]
+            heapq.heappush(heap, (-heads[i], i, s + 1))
+        else:
+            heads[i] = 0.0
+        
+        if not admitting or not heap or len(acc) < topk:
+            continue  # (nothing left to skip once every segment is summed)
+        # the most a doc not in acc yet can still score
+        bound = sum(heads) * max_boost
+        if check_at is not None and bound > check_at:
+            continue
+        # the k-th score is an O(n) pass, so it's only looked at again once the bound has closed
+        # half of the gap to it (the k-th score only grows, the bound only shrinks). The unboosted
+        # k-th score times max_boost bounds it from above and is cheap, boosts are only looked up below that
+        kth = heapq.nlargest(topk, acc.values())[-1] * max_boost
+        if bound < kth:
+            # the k-th doc in result order (score desc, docID asc)
+            top = heapq.nlargest(topk, acc, key=lambda d: (acc[d] * boost(d), -d))
+            kth = acc[top[-1]] * boost(top[-1])
+        # a doc reaching exactly the k-th score still gets in with a smaller docID, and the bound is summed
+        # in another order than doc scores are: a tie (within rounding) keeps admitting
+        if bound < kth and not math.isclose(bound, kth, rel_tol=1e-9):
+            # unseen docs can't reach the top-k anymore: stop admitting docs, but keep summing
+            # the remaining segments into the docs already in acc, so every returned score is exact
+            admitting = False
+            stats.plan["saat_admitted"] = len(acc)
+        else:
+            check_at = kth + (bound - kth) / 2
+    
+    return {d: s * boost(d) for d, s in acc.items()}
+
+IMPACT_SEGMENT_RE = re.compile(r'(\d+):([\d,]+)')
+DIGITS_RE = re.compile(r'\d+')
+
+def iter_segment_docs(gaps):
+    # docIDs of one impact segment ("gap,gap,..."), decoded as they're consumed
+    docID, n = 0, 0
+    for m in DIGITS_RE.finditer(gaps):
+        docID += int(m.group())
+        n += 1
+        yield docID
+    query_stats().count('postings_decoded', n)
+
+def score_bm25_topk(query_token_freqs, impacts_dict, impacts_fh, metadata, k, only=None):
+    # the k best of score_bm25_saat with memory bounded by k instead of by the accumulator: every
+    # segment is sorted by docID, so they're all merged doc-at-a-time into a k-sized heap, decoding
+    # docIDs as the merge reaches them. Segments are merged in the order score-at-a-time sums them
+    # (highest contribution first), so the scores are the same floats.
+    # only: score just these docs, all of them are returned
+    stats = query_stats()
+    wanted = [(t, qf) for t, qf in query_token_freqs.items() if t in impacts_dict]
+    lines = read_extents([(impacts_fh, impacts_dict[t][1], impacts_dict[t][2]) for t, _ in wanted])
+    segments = []  # (-contribution, term, segment no, its docIDs)
+    for i, ((t, qf), line) in enumerate(zip(wanted, lines)):
+        qf_w = 1 + math.log(qf, 10)
+        for s, m in enumerate(IMPACT_SEGMENT_RE.finditer(line)):
+            segments.append((-qf_w * int(m.group(1)), i, s, m.group(2)))
+    segments.sort(key=itemgetter(0, 1, 2))
+    
+    def weighted(w, gaps):
+        for d in iter_segment_docs(gaps):
+            yield d, w
     
-    # load dictionary and build base:zone_key map
+    if only is not None:
+        k = len(only)
+    heap, candidates = [], 0
+    for d, s in sum_by_doc(weighted(-neg_w, gaps) for neg_w, _, _, gaps in segments):
+        if only is not None and d not in only:
+            continue
+        candidates += 1
+        if metadata and d in metadata:
+            s *= static_boost(metadata[d])
+        keep_top(heap, k, d, s)
+    stats.count('candidates_scored', candidates)
+    if only is None and candidates > k:
+        stats.count('candidates_capped')
+    return {-neg_d: s for s, neg_d in heap}
+
+def read_dictionary_entries(dfile):
+    # (term, df, offset, byte length) per "term df offset" line. A list runs up to the next larger
+    # offset in the file (whatever order the lines are in), the last one (length None) up to the end
+    with open(dfile) as df:
+        entries = [L.split() for L in df]
+    offsets = sorted({int(e[2]) for e in entries})
+    ends = dict(zip(offsets, offsets[1:] + [None]))
+    for term, dfreq, offset in entries:
+        offset = int(offset)
+        end = ends[offset]
+        yield term, int(dfreq), offset, (end - offset if end is not None else None)
+
+def load_dictionary(dfile):
+    # dictionary lines are "zone_key df offset", zone_key like 'phone@title'
+    # values are (df, offset, byte length)
     dictionary = {}
     base2zones = defaultdict(list)
-    with open(dfile) as df:
-        for L in df:
-            term, dfreq, offset = L.split()
-            dictionary[term] = (int(dfreq), int(offset))
-            base = term.split('@', 1)[0]
-            base2zones[base].append(term)
-    
-    # load metadata if available (for court boosting)
+    for term, dfreq, offset, length in read_dictionary_entries(dfile):
+        dictionary[term] = (dfreq, offset, length)
+        base = term.split('@', 1)[0]
+        base2zones[base].append(term)
+    return dictionary, base2zones
+
+def load_metadata(mfile):
+    # docID -> court/date/title/content from the corpus file, {} if it can't be read
     metadata = {}
     try:
         with open(mfile, "r") as m:
@@ -549,24 +1147,268 @@ def main():
     except Exception as e:
         print(f"Error loading metadata: {e}", file=sys.stderr)
         metadata = {}
-    
-    # open postings, read header
-    postings_fh = open(pfile, 'r')
-    hdr = postings_fh.readline().split()
-    N = int(hdr[0])
-    doc_lengths = parse_lengths_line(hdr[1:])
-    
-    # read & preprocess query
-    raw = query_str  # Only read the first line
-    
-    # Check if it's a boolean query
-    is_boolean = 'AND' in raw
-    
-    stemmer = nltk.stem.porter.PorterStemmer()
-    
-    # Process query differently based on type
-    if is_boolean:
-        # for boolean queries, preserve structure including AND operators and phrases
+    return metadata
+
+class SegmentedIndex:
+    # read-only view over the segments in a segments.json manifest (see segments.py), shaped like
+    # one index: `dictionary` holds global dfs summed over segments, N counts every segment doc,
+    # get_postings merges the segments' lists by docID and leaves out tombstoned docs.
+    # Deleted docs count towards df & N until a merge drops them, so idf doesn't move on every delete.
+    def __init__(self, manifest_file, retries=3):
+        for attempt in range(retries):
+            try:
+                self._open(manifest_file)
+                return
+            except FileNotFoundError:
+                # a merge retired a segment between reading the manifest and opening it, re-read
+                self.close()
+                if attempt == retries - 1:
+                    raise
+
+    def _open(self, manifest_file):
+        self.segments = []  # (dictionary, PostingsFile, deleted docIDs)
+        self.dictionary = {}
+        self.base2zones = defaultdict(list)
+        self.doc_lengths = {}
+        self.N = 0
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+        self.generation = manifest["generation"]
+        seg_root = os.path.dirname(os.path.abspath(manifest_file))
+        # just the untouched base index (see segments.py): its impacts & champion lists still hold
+        self.base_only = [seg.get("base") for seg in manifest["segments"]] == [True] and \
+            not manifest["segments"][0].get("deleted")
+        for seg in manifest["segments"]:
+            # the base index lives elsewhere ("path"), tombstones are always under the segment's name
+            path = os.path.join(seg_root, seg.get("path", seg["name"]))
+            postings_fh = PostingsFile(os.path.join(path, "postings.txt"))
+            dictionary, _ = load_dictionary(os.path.join(path, "dictionary.txt"))
+            deleted = set()
+            self.segments.append((dictionary, postings_fh, deleted))
+            hdr = postings_fh.header().split()
+            lengths = parse_lengths_line(hdr[1:])
+            if seg.get("tombstones"):
+                # one bit per doc, in header order
+                with open(os.path.join(seg_root, seg["name"], seg["tombstones"]), 'rb') as tf:
+                    bits = tf.read()
+                docs = list(lengths)
+                deleted.update(docs[i] for i in range(len(docs)) if bits[i >> 3] >> (i & 7) & 1)
+            self.N += int(hdr[0])
+            for d, L in lengths.items():
+                if d not in deleted:
+                    self.doc_lengths[d] = L
+            for zk, (df, _, _) in dictionary.items():
+                self.dictionary[zk] = (self.dictionary.get(zk, (0,))[0] + df, None, None)
+        for zk in self.dictionary:
+            self.base2zones[zk.split('@', 1)[0]].append(zk)
+
+    def fetch_postings(self, zone_keys):
+        # every segment's list of every zone key is read in one batch
+        wanted = [(zk, dictionary, postings_fh, deleted)
+                  for zk in dict.fromkeys(zone_keys) if zk in self.dictionary
+                  for dictionary, postings_fh, deleted in self.segments if zk in dictionary]
+        lines = read_extents([(postings_fh, dictionary[zk][1], dictionary[zk][2])
+                              for zk, dictionary, postings_fh, _ in wanted])
+        lists = defaultdict(list)
+        for (zk, _, _, deleted), line in zip(wanted, lines):
+            postings = decode_postings(line)
+            if deleted:
+                # skip pointers index into the unfiltered list
+                postings = [(d, tf, pos, -1) for d, tf, pos, _ in postings if d not in deleted]
+            lists[zk].append(postings)
+        # a docID is live in at most one segment (re-added docs tombstone their old copy)
+        return {zk: ls[0] if len(ls) == 1 else
+                [(d, tf, pos, -1) for d, tf, pos, _ in heapq.merge(*ls, key=lambda p: p[0])]
+                for zk, ls in lists.items()}
+
+    def stream_postings(self, zone_keys):
+        # like fetch_postings, but each zone key's segment lists are decoded lazily (see iter_postings)
+        wanted = [(zk, dictionary, postings_fh, deleted)
+                  for zk in dict.fromkeys(zone_keys) if zk in self.dictionary
+                  for dictionary, postings_fh, deleted in self.segments if zk in dictionary]
+        lines = read_extents([(postings_fh, dictionary[zk][1], dictionary[zk][2])
+                              for zk, dictionary, postings_fh, _ in wanted])
+        streams = defaultdict(list)
+        for (zk, _, _, deleted), line in zip(wanted, lines):
+            postings = iter_postings(line)
+            if deleted:
+                postings = filter(lambda p, deleted=deleted: p[0] not in deleted, postings)
+            streams[zk].append(postings)
+        return {zk: ss[0] if len(ss) == 1 else heapq.merge(*ss, key=itemgetter(0))
+                for zk, ss in streams.items()}
+
+    def get_postings(self, zone_key):
+        return self.fetch_postings([zone_key]).get(zone_key, [])
+
+    def close(self):
+        for _, postings_fh, _ in getattr(self, 'segments', []):
+            postings_fh.close()
+
+SIZE_SAMPLES = 1000  # entries sampled per structure by estimate_sizeof
+
+def deep_sizeof(obj):
+    # bytes held by obj and everything it references (containers, strings, numbers, arrays)
+    seen, size, stack = set(), 0, [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or (type(o) is int and -5 <= o <= 256):  # small ints are shared singletons
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+    return size
+
+def estimate_sizeof(container, samples=SIZE_SAMPLES):
+    # deep size of a dict/list, extrapolated from `samples` evenly spaced entries so that sizing
+    # a multi-million entry structure stays cheap. Approximate: objects shared between entries
+    # (or with other structures, like zone keys in dictionary & base2zones) are counted every time
+    n = len(container)
+    if n <= samples:
+        return deep_sizeof(container)
+    if isinstance(container, dict):
+        sample = [deep_sizeof(k) + deep_sizeof(v) for k, v in islice(container.items(), 0, None, n // samples)]
+    else:
+        sample = [deep_sizeof(e) for e in islice(container, 0, None, n // samples)]
+    return sys.getsizeof(container) + n * sum(sample) // len(sample)
+
+_tracing = threading.Lock()
+
+def trace_memory(fn, top=10):
+    # run fn() under tracemalloc, returns (its result, {peak bytes allocated while it ran, the top
+    # allocation sites still held at the end}). tracemalloc is process-wide: allocations of other
+    # threads running at the same time are included
+    import tracemalloc
+    if tracemalloc.is_tracing() or not _tracing.acquire(blocking=False):
+        raise RuntimeError("A memory trace is already running")
+    try:
+        tracemalloc.start()
+        try:
+            result = fn()
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+    finally:
+        _tracing.release()
+    sites = [{"file": os.path.basename(st.traceback[0].filename), "line": st.traceback[0].lineno,
+              "bytes": st.size, "blocks": st.count}
+             for st in snapshot.statistics('lineno')[:top]]
+    return result, {"peak_bytes": peak, "top": sites}
+
+class SearchIndex:
+    # everything a query reads from disk, loaded once: per process by main(), or kept resident by the API.
+    # Postings are read with pread, so concurrent queries can share one SearchIndex
+    def __init__(self, dict_file="dictionary.txt", postings_file="postings.txt",
+                 metadata_file="../scripts/corpus.jsonl",
+                 impacts_dict_file="impacts_dictionary.txt", impacts_file="impacts.txt",
+                 champions_dict_file="champions_dictionary.txt", champions_file="champions.txt",
+                 segments_manifest=None, intersections_manifest=None):
+        stats = query_stats()
+        self.intersections_manifest = intersections_manifest
+        self._intersections = None  # (manifest mtime, Intersections)
+        self.impacts_dict_file, self.impacts_file = impacts_dict_file, impacts_file
+        self.champions_dict_file, self.champions_file = champions_dict_file, champions_file
+        self.segmented = bool(segments_manifest)
+        self._impacts = None  # (impacts dictionary, PostingsFile), loaded on first use
+        self._champions = None
+        
+        if self.segmented:
+            # every segment's dictionary & header, merged into one view with global statistics
+            self.postings_fh = SegmentedIndex(segments_manifest)
+            self.dictionary, self.base2zones = self.postings_fh.dictionary, self.postings_fh.base2zones
+            self.N, self.doc_lengths = self.postings_fh.N, self.postings_fh.doc_lengths
+            self.version = f"g{self.postings_fh.generation}"
+            stats.lap('dictionary_load')
+        else:
+            # load dictionary and build base:zone_key map
+            self.dictionary, self.base2zones = load_dictionary(dict_file)
+            stats.lap('dictionary_load')
+        
+        # load metadata if available (for court boosting)
+        self.metadata = load_metadata(metadata_file) if metadata_file else {}
+        stats.lap('metadata_load')
+        
+        if not self.segmented:
+            # open postings, read header
+            self.postings_fh = PostingsFile(postings_file)
+            hdr = self.postings_fh.header().split()
+            self.N = int(hdr[0])
+            self.doc_lengths = parse_lengths_line(hdr[1:])
+            st = os.fstat(self.postings_fh.fd)
+            self.version = f"{st.st_mtime_ns}-{st.st_size}"
+            stats.lap('header_load')
+
+    def has_impacts(self):
+        return os.path.exists(self.impacts_dict_file) and os.path.exists(self.impacts_file)
+
+    def has_champions(self):
+        return os.path.exists(self.champions_dict_file) and os.path.exists(self.champions_file)
+
+    def impacts(self):
+        if self._impacts is None:
+            self._impacts = (load_impacts_dictionary(self.impacts_dict_file), PostingsFile(self.impacts_file))
+        return self._impacts
+
+    def champions(self):
+        if self._champions is None:
+            self._champions = (load_dictionary(self.champions_dict_file)[0], PostingsFile(self.champions_file))
+        return self._champions
+
+    def memory_usage(self):
+        # {structure: {"entries", "bytes"}} for what this index keeps in memory, see estimate_sizeof
+        structures = {
+            "dictionary": self.dictionary,
+            "base2zones": self.base2zones,
+            "doc_lengths": self.doc_lengths,
+            "metadata": self.metadata,
+        }
+        if self._impacts:
+            structures["impacts_dictionary"] = self._impacts[0]
+        if self._champions:
+            structures["champions_dictionary"] = self._champions[0]
+        if self._intersections:
+            structures["intersections_dictionary"] = self._intersections[1].dictionary
+        usage = {name: {"entries": len(s), "bytes": estimate_sizeof(s)} for name, s in structures.items()}
+        if self.segmented:
+            dictionaries = [dictionary for dictionary, _, _ in self.postings_fh.segments]
+            usage["segment_dictionaries"] = {"entries": sum(map(len, dictionaries)),
+                                             "bytes": sum(map(estimate_sizeof, dictionaries))}
+        return usage
+
+    def intersections(self):
+        # materialized conjunctions for this index version, None if there are none (or they're for
+        # another version). Re-read whenever the refresh job replaced the manifest
+        if not self.intersections_manifest:
+            return None
+        try:
+            mtime = os.stat(self.intersections_manifest).st_mtime_ns
+            if self._intersections is None or self._intersections[0] != mtime:
+                self._intersections = (mtime, Intersections(self.intersections_manifest))
+        except (OSError, ValueError, KeyError) as e:
+            # not built yet, or a refresh retired the files between reading the manifest & opening them
+            if not isinstance(e, FileNotFoundError):
+                print(f"Failed to load intersections: {e}", file=sys.stderr)
+            return None
+        intersections = self._intersections[1]
+        if intersections.index_version != self.version:
+            query_stats().count('intersections_stale')
+            return None
+        return intersections
+
+    def close(self):
+        self.postings_fh.close()
+        for loaded in (self._impacts, self._champions, self._intersections):
+            if loaded:
+                loaded[1].close()
+
+def parse_query(raw):
+    # (query tokens, query term freqs). Boolean queries keep their structure ('and', phrases as
+    # stems joined by '_'), their terms are also counted for the free-text fallback
+    if 'AND' in raw:
         parts = re.findall(r'"[^"]+"|\S+', raw)
         query_tokens = []
         query_token_freqs = {}
@@ -577,8 +1419,7 @@ def main():
             elif tok.startswith('"') and tok.endswith('"'):
                 # Handle quoted phrases
                 phrase = tok[1:-1].lower().translate(str.maketrans('', '', string.punctuation))
-                terms = nltk.word_tokenize(phrase)
-                stems = [stemmer.stem(t) for t in terms]
+                stems = [stem(t) for t in tokenize(phrase)]
                 query_tokens.append('_'.join(stems))
                 
                 # Also track individual terms for free-text fallback
@@ -588,76 +1429,129 @@ def main():
                 w = tok.lower().translate(str.maketrans('', '', string.punctuation))
                 if not w:
                     continue
-                stem = stemmer.stem(w)
-                query_tokens.append(stem)
-                query_token_freqs[stem] = query_token_freqs.get(stem, 0) + 1
+                s = stem(w)
+                query_tokens.append(s)
+                query_token_freqs[s] = query_token_freqs.get(s, 0) + 1
     else:
         # for free-text queries, simple tokenization
-        toks = re.findall(r'\w+', raw.lower())
-        query_tokens = [stemmer.stem(t) for t in toks]
+        query_tokens = [stem(t) for t in tokenize(raw)]
         
         # compute query term frequencies
         query_token_freqs = defaultdict(int)
         for t in query_tokens:
             query_token_freqs[t] += 1
+    return query_tokens, query_token_freqs
+
+def run_query(index, raw, topk=10, ranking="tfidf", mode="exhaustive", no_prf=False, term_cache=None,
+              max_candidates=None):
+    # rank one query against a loaded SearchIndex, returns the top-k results with their metadata.
+    # term_cache: optional TermScoreCache, shared by the queries of a long-lived process
+    # max_candidates: docs a query may keep (see candidate_limit), queries that can match more are scored
+    # doc-at-a-time into a bounded top-k instead of term-at-a-time. None for no bound. Results are the same
+    stats = query_stats()
+    if term_cache is not None:
+        term_cache = term_cache.bind(index.version)
+    dictionary, base2zones, postings_fh = index.dictionary, index.base2zones, index.postings_fh
+    N, doc_lengths, metadata = index.N, index.doc_lengths, index.metadata
     
-    # score documents for free-text retrieval
-    scores = score_documents(query_token_freqs, dictionary, postings_fh, N, base2zones)
+    # BM25 needs the impact files, fall back to tf-idf if they haven't been built
+    if ranking == "bm25" and not index.has_impacts():
+        print("Impact files not found, falling back to tf-idf ranking (run index.py impacts)", file=sys.stderr)
+        ranking = "tfidf"
+    # same for the tier-1 champion lists used by fast mode
+    if mode == "fast" and not index.has_champions():
+        print("Champion files not found, falling back to exhaustive mode (run index.py champions)", file=sys.stderr)
+        mode = "exhaustive"
+    # impacts & champion lists are built from the base index, once segments were added to it (or
+    # docs deleted from it) they'd miss documents: tf-idf over every segment instead, recorded in the plan
+    if index.segmented and not postings_fh.base_only and (ranking != "tfidf" or mode != "exhaustive"):
+        print("Segmented index: using tf-idf ranking in exhaustive mode", file=sys.stderr)
+        stats.plan["downgraded"] = {"ranking": ranking, "mode": mode}
+        stats.count('segmented_downgrades')
+        ranking, mode = "tfidf", "exhaustive"
+    if index.segmented:
+        stats.plan["index_generation"] = postings_fh.generation
     
-    # length normalize & apply the court & date boosts
-    for d in list(scores):
-        # Length normalization
-        L = doc_lengths.get(d, 1.0)
-        if L > 0:
-            scores[d] /= L
+    # Check if it's a boolean query
+    is_boolean = 'AND' in raw
+    query_tokens, query_token_freqs = parse_query(raw)
+    stats.lap('tokenize')
+    # the bounded pass keeps enough docs for the results, PRF's feedback docs & the boolean merge
+    keep = max(max_candidates, topk, 500 if is_boolean else 30) if max_candidates is not None else None
+    bounded = False
+    stats.plan.update({
+        "query_type": query_type(raw),
+        "ranking": ranking,
+        "mode": mode,
+        "tokens": query_tokens,
+    })
+    
+    # score documents for free-text retrieval
+    if ranking == "bm25":
+        # BM25F already normalizes for field length, boosts are applied inside
+        impacts_dict, impacts_fh = index.impacts()
+        bounded = keep is not None and sum(impacts_dict[t][0] for t in query_token_freqs
+                                           if t in impacts_dict) > keep
+        if bounded:
+            scores = score_bm25_topk(query_token_freqs, impacts_dict, impacts_fh, metadata, keep)
+        else:
+            scores = score_bm25_saat(query_token_freqs, impacts_dict, impacts_fh, metadata, topk)
+        stats.lap('scoring')
+    else:
+        scores = {}
+        if mode == "fast":
+            # tier 1: champion lists only (same zone keys and full dfs, so idf is unchanged)
+            champions_dict, champions_fh = index.champions()
+            # (champion lists are r docs per zone key, so tier 1 is bounded already)
+            scores = score_documents(query_token_freqs, champions_dict, champions_fh, N, base2zones)
+            stats.plan["tier"] = "champions"
+        if len(scores) < topk:
+            # tier 2: full postings, either exhaustive mode or tier 1 came back with fewer than k candidates
+            bounded = (keep is not None
+                       and candidate_bound(query_token_freqs, dictionary, base2zones) > keep)
+            if bounded:
+                scores = score_documents_topk(query_token_freqs, dictionary, postings_fh, N, base2zones,
+                                              doc_lengths, metadata, keep, term_cache)
+            else:
+                scores = score_documents(query_token_freqs, dictionary, postings_fh, N, base2zones, term_cache)
+            stats.plan["tier"] = "full"
+        stats.lap('scoring')
         
-        # apply court and date boosts only if metadata file is available
-        if metadata and d in metadata:
-            # EXPERIMENT: to place more emphasis on courts which prof indicated to have higher level in the hierarchy
-            if "court" in metadata[d]:
-                court = metadata[d]["court"]
-                court_boost = {
-                    # Most important
-                    "SG Court of Appeal": 1.5,
-                    "SG Privy Council": 1.5,
-                    "UK House of Lords": 1.5,
-                    "UK Supreme Court": 1.5,
-                    "High Court of Australia": 1.5,
-                    "CA Supreme Court": 1.5,
-                    
-                    # Important
-                    "SG High Court": 1.2,
-                    "Singapore International Commercial Court": 1.2,
-                    "HK High Court": 1.2,
-                    "HK Court of First Instance": 1.2,
-                    "UK Crown Court": 1.2,
-                    "UK Court of Appeal": 1.2,
-                    "UK High Court": 1.2,
-                    "Federal Court of Australia": 1.2,
-                    "NSW Court of Appeal": 1.2,
-                    "NSW Court of Criminal Appeal": 1.2,
-                    "NSW Supreme Court": 1.2,
-                    
-                    # Default
-                    "default": 1.0
-                }
-                court_boost_value = court_boost.get(court, court_boost["default"])
-                scores[d] *= court_boost_value
-            
-            # Date boost
-            if "date" in metadata[d]:
-                date_boost_value = calculate_date_boost(metadata[d]["date"])
-                scores[d] *= date_boost_value
+        # length normalize & apply the court & date boosts (the bounded pass applied them already)
+        if not bounded:
+            apply_boosts(scores, doc_lengths, metadata)
+    stats.lap('boost')  # BM25 applies its boosts inside scoring
+    if bounded:
+        stats.plan["candidate_cap"] = keep
+    else:
+        stats.count('candidates_scored', len(scores))
     
     ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))
     free_text_results = [d for d, _ in ranked]
+    stats.lap('sort')
     
     # for boolean queries, also evaluate as boolean and merge results
     if is_boolean:
-        boolean_results = evaluate_boolean_query(query_tokens, dictionary, postings_fh, base2zones)
+        boolean_results = evaluate_boolean_query(query_tokens, dictionary, postings_fh, base2zones,
+                                                 index.intersections())
         doc_ids = merge_boolean_and_free(boolean_results, free_text_results)
+        if bounded or ranking == "bm25" or mode == "fast":
+            # boolean matches outside the kept top-k (BM25's early-terminated accumulator, or the
+            # champion lists in fast mode) still get their full score, from the full postings
+            missing = {d for d in doc_ids[:topk] if d not in scores}
+            if missing and ranking == "bm25":
+                scores.update(score_bm25_topk(query_token_freqs, impacts_dict, impacts_fh, metadata,
+                                              None, missing))
+            elif missing:
+                scores.update(score_documents_topk(query_token_freqs, dictionary, postings_fh, N, base2zones,
+                                                   doc_lengths, metadata, None, term_cache, missing))
         # Get scores for these docs
         final_scores = {d: scores.get(d, 0.0) for d in doc_ids[:topk]}
+        stats.lap('boolean')
+    elif ranking == "bm25" or mode == "fast" or no_prf:
+        # no PRF round for BM25 (keep the comparison against tf-idf about the ranking function)
+        # nor in fast mode / when the API is shedding load (a second scoring pass is what they avoid)
+        final_scores = {d: s for d, s in ranked[:topk]}
     else:
         # For free text queries, apply query refinement
         initial_results = free_text_results
@@ -687,58 +1581,29 @@ def main():
             dictionary, postings_fh, N, base2zones
         )
         # print(f"Final expanded query: {' '.join(refined_tokens)}") # debug
+        stats.lap('prf')
+        stats.plan["prf"] = True
+        stats.plan["expanded"] = refined_tokens[len(query_tokens):]
+        stats.count('terms_expanded', len(refined_tokens) - len(query_tokens))
         
-        # re-run scoring with expanded query
-        refined_scores = score_documents(refined_freqs, dictionary, postings_fh, N, base2zones)
-        
-        # length normalize & re-apply boosts
-        for d in list(refined_scores):
-            # length normalization
-            L = doc_lengths.get(d, 1.0)
-            if L > 0:
-                refined_scores[d] /= L
+        # re-run scoring with expanded query, the original terms come out of the term cache
+        if keep is not None and candidate_bound(refined_freqs, dictionary, base2zones) > keep:
+            refined_scores = score_documents_topk(refined_freqs, dictionary, postings_fh, N, base2zones,
+                                                  doc_lengths, metadata, keep, term_cache)
+            stats.lap('scoring')
+            stats.plan["candidate_cap"] = keep
+        else:
+            refined_scores = score_documents(refined_freqs, dictionary, postings_fh, N, base2zones, term_cache)
+            stats.lap('scoring')
+            stats.count('candidates_scored', len(refined_scores))
             
-            # apply court and date boosts if metadata available
-            if metadata and d in metadata:
-                # EXPERIMENT: to place more emphasis on courts which prof indicated to have higher level in the hierarchy
-
-                if "court" in metadata[d]:
-                    court = metadata[d]["court"]
-                    court_boost = {
-                        # Most important
-                        "SG Court of Appeal": 1.5,
-                        "SG Privy Council": 1.5,
-                        "UK House of Lords": 1.5,
-                        "UK Supreme Court": 1.5,
-                        "High Court of Australia": 1.5,
-                        "CA Supreme Court": 1.5,
-                        
-                        # Important
-                        "SG High Court": 1.2,
-                        "Singapore International Commercial Court": 1.2,
-                        "HK High Court": 1.2,
-                        "HK Court of First Instance": 1.2,
-                        "UK Crown Court": 1.2,
-                        "UK Court of Appeal": 1.2,
-                        "UK High Court": 1.2,
-                        "Federal Court of Australia": 1.2,
-                        "NSW Court of Appeal": 1.2,
-                        "NSW Court of Criminal Appeal": 1.2,
-                        "NSW Supreme Court": 1.2,
-                        
-                        # Default
-                        "default": 1.0
-                    }
-                    court_boost_value = court_boost.get(court, court_boost["default"])
-                    refined_scores[d] *= court_boost_value
-                
-                # apply recency boost (via date)
-                if "date" in metadata[d]:
-                    date_boost_value = calculate_date_boost(metadata[d]["date"])
-                    refined_scores[d] *= date_boost_value
+            # length normalize & re-apply boosts
+            apply_boosts(refined_scores, doc_lengths, metadata)
+        stats.lap('boost')
         
         refined_ranked = sorted(refined_scores.items(), key=lambda x: (-x[1], x[0]))
         final_scores = {d: s for d, s in refined_ranked[:topk]}
+        stats.lap('sort')
     
     # Format results with full document information
     final_results = []
@@ -763,15 +1628,154 @@ def main():
             })
             
         final_results.append(result)
+    stats.lap('format')
+    return final_results
+
+def parse_args():
+    p = argparse.ArgumentParser(
+        description="Search script (supports JSON output)"
+    )
+    p.add_argument(
+        "--query", "-q",
+        help="The query string to search for",
+        required=True
+    )
+    p.add_argument(
+        "--topk",
+        help="Number of top results to return",
+        type=int, default=10
+    )
+    p.add_argument(
+        "--output-format",
+        help="text (one-line IDs) or json",
+        choices=["text","json"],
+        default="text"
+    )
+    p.add_argument(
+        "--dict-file", "-d",
+        help="Path to your dictionary file",
+        default="dictionary.txt"
+    )
+    p.add_argument(
+        "--postings-file", "-p",
+        help="Path to your postings file",
+        default="postings.txt"
+    )
+    p.add_argument(
+        "--metadata-file", "-m",
+        help="Path to your metadata file",
+        default="../scripts/corpus.jsonl"
+    )
+    p.add_argument(
+        "--ranking",
+        help="tfidf (zone-weighted tf-idf + PRF) or bm25 (BM25F over impact-ordered postings)",
+        choices=["tfidf", "bm25"],
+        default="tfidf"
+    )
+    p.add_argument(
+        "--impacts-dict-file",
+        help="Path to the impact dictionary file (built by index.py, needed for --ranking bm25)",
+        default="impacts_dictionary.txt"
+    )
+    p.add_argument(
+        "--impacts-file",
+        help="Path to the impact-ordered postings file (built by index.py, needed for --ranking bm25)",
+        default="impacts.txt"
+    )
+    p.add_argument(
+        "--mode",
+        help="exhaustive (full postings) or fast (tier-1 champion lists first, approximate top-k)",
+        choices=["exhaustive", "fast"],
+        default="exhaustive"
+    )
+    p.add_argument(
+        "--champions-dict-file",
+        help="Path to the tier-1 champion dictionary file (built by index.py, needed for --mode fast)",
+        default="champions_dictionary.txt"
+    )
+    p.add_argument(
+        "--champions-file",
+        help="Path to the tier-1 champion postings file (built by index.py, needed for --mode fast)",
+        default="champions.txt"
+    )
+    p.add_argument(
+        "--no-prf",
+        help="Skip the pseudo-relevance feedback (Rocchio) round",
+        action="store_true"
+    )
+    p.add_argument(
+        "--segments-manifest",
+        help="Search the segmented index in this segments.json instead of --dict-file/--postings-file",
+        default=None
+    )
+    p.add_argument(
+        "--intersections-manifest",
+        help="Materialized boolean conjunctions (intersections.json, built by intersections.py)",
+        default=None
+    )
+    p.add_argument(
+        "--max-candidate-mb",
+        help="Per-query cap on candidate memory, broader queries keep a bounded exact top-k instead (0 = no cap)",
+        type=int, default=0
+    )
+    p.add_argument(
+        "--trace-memory",
+        help="Trace the query's allocations with tracemalloc, reported with --stats",
+        action="store_true"
+    )
+    p.add_argument(
+        "--term-cache-mb",
+        help="Memory for cached per-term score vectors, 0 to disable",
+        type=int, default=64
+    )
+    p.add_argument(
+        "--stats",
+        help="Print per-stage timings, counters and the query plan as one JSON line on stderr",
+        action="store_true"
+    )
+    return p.parse_args()
+
+
+def main():
+    stats = reset_query_stats()
+    stats.times['module_import'] = IMPORT_SECONDS
+    args = parse_args()
+    
+    index = SearchIndex(
+        args.dict_file, args.postings_file, args.metadata_file,
+        args.impacts_dict_file, args.impacts_file,
+        args.champions_dict_file, args.champions_file,
+        args.segments_manifest, args.intersections_manifest,
+    )
+    # even within one process the PRF round re-scores the original terms
+    term_cache = TermScoreCache(args.term_cache_mb << 20) if args.term_cache_mb > 0 else None
+    
+    run = lambda: run_query(index, args.query, args.topk, args.ranking, args.mode, args.no_prf, term_cache,
+                            candidate_limit(args.max_candidate_mb))
+    memory = None
+    if args.trace_memory:
+        final_results, memory = trace_memory(run)
+        memory["index"] = index.memory_usage()
+    else:
+        final_results = run()
     
     # write out results
-    if out_fmt == "json":
+    if args.output_format == "json":
         print(json.dumps(final_results))
     else:
         # one-line, space-separated IDs for backward compatibility
         print(" ".join(str(d["id"]) for d in final_results))
+    stats.lap('serialize')
+    
+    index.close()
     
-    postings_fh.close()
+    if args.stats:
+        # one line on stderr, picked up by the API for its stage metrics & slow-query log
+        stats.times['total'] = time.perf_counter() - _MODULE_START
+        report = {"times": stats.times, "counters": stats.counters, "plan": stats.plan}
+        if memory:
+            report["memory"] = memory
+        print("search-stats: " + json.dumps(report), file=sys.stderr)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+Segment-based incremental index.
+
+New documents are indexed into small immutable segments, each a complete
+dictionary.txt/postings.txt pair in the usual format. The segments are listed in a
+manifest (segments.json) that is replaced atomically on every change, so readers
+(search.py --segments-manifest, see SegmentedIndex) see a consistent set of
+segments and never wait on writers.
+
+    <segments dir>/segments.json
+    <segments dir>/seg_000001/dictionary.txt
+    <segments dir>/seg_000001/postings.txt
+    <segments dir>/seg_000001/tombstones_<generation>.bits
+
+The full index built by index.py is the base segment (init, done by the first ingest):
+the manifest lists it as "seg_base" with a "path" to its directory, and corpus_offset
+starts at the end of the corpus it was built from, so segments only hold documents
+added after the build. Its tombstones live in <segments dir>/seg_base/. Merges never
+touch the base, rebuild it with index.py and re-run init --force to fold the segments
+back in. search.py keeps BM25 & fast mode (the base's impacts & champion lists) while
+the base is the only segment and nothing in it is deleted, see SegmentedIndex.base_only.
+
+Deletes never touch a segment's postings. A tombstone bitset is written instead,
+one bit per doc in header order, under a new name for every generation
+(copy-on-write, the manifest says which one is current). Re-indexing a docID
+tombstones its old copy. A background tiered merge combines segments of similar
+size and drops tombstoned docs. Segments retired by a merge are deleted after a
+grace period, so readers that loaded the previous manifest can still open them.
+"""
+import os, sys, json, math, time, shutil, fcntl, argparse, threading, itertools
+from contextlib import contextmanager
+from collections import defaultdict
+from search import parse_lengths_line, load_dictionary, PostingsFile
+from index import encode_postings, index_documents, lengths_header, write_postings_file, read_postings
+
+MANIFEST = "segments.json"
+SEGMENT_DOCS = 1000        # docs per flushed segment
+MERGE_FACTOR = 10          # segments of one tier merged at once
+MAX_DELETED_RATIO = 0.3    # segments with more tombstoned docs than this are rewritten on their own
+GRACE_SECONDS = 60         # how long retired segments stay on disk for in-flight readers
+BUILDING = ".building"     # marker in segments that aren't published yet, garbage collection skips them
+BASE = "seg_base"          # the full index's entry in the manifest
+
+# docIDs per segment in header order, segments are immutable so this never goes stale
+_segment_docs = {}
+
+
+def empty_manifest():
+    return {"generation": 0, "next_segment": 1, "corpus_offset": 0, "segments": []}
+
+
+def read_manifest(seg_dir):
+    try:
+        with open(os.path.join(seg_dir, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return empty_manifest()
+
+
+def write_manifest(seg_dir, manifest):
+    # bump the generation and publish atomically: readers see the old or the new manifest, never half of one
+    manifest["generation"] += 1
+    tmp = os.path.join(seg_dir, MANIFEST + ".tmp")
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(seg_dir, MANIFEST))
+
+
+@contextmanager
+def manifest_lock(seg_dir):
+    # serializes manifest updates between ingestion, deletes and merges (also across processes)
+    os.makedirs(seg_dir, exist_ok=True)
+    with open(os.path.join(seg_dir, ".lock"), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def segment_path(seg_dir, seg):
+    # directory holding a segment's dictionary.txt/postings.txt: its own, or the base index's
+    return os.path.join(seg_dir, seg.get("path", seg["name"]))
+
+
+def segment_docs(seg_dir, seg):
+    name = seg["name"]
+    if name not in _segment_docs:
+        with open(os.path.join(segment_path(seg_dir, seg), "postings.txt")) as f:
+            _segment_docs[name] = [int(p.split(':')[0]) for p in f.readline().split()[1:]]
+    return _segment_docs[name]
+
+
+def read_tombstones(seg_dir, seg):
+    n = len(segment_docs(seg_dir, seg))
+    bits = bytearray((n + 7) // 8)
+    if seg.get("tombstones"):
+        with open(os.path.join(seg_dir, seg["name"], seg["tombstones"]), 'rb') as f:
+            bits[:] = f.read()
+    return bits
+
+
+def deleted_docs(seg_dir, seg):
+    bits = read_tombstones(seg_dir, seg)
+    docs = segment_docs(seg_dir, seg)
+    return {docs[i] for i in range(len(docs)) if bits[i >> 3] >> (i & 7) & 1}
+
+
+def _tombstone(seg_dir, manifest, doc_ids, names=None):
+    # mark doc_ids deleted wherever they're live (or only in the named segments),
+    # writing new bitsets for the next generation
+    doc_ids = set(doc_ids)
+    deleted = 0
+    for seg in manifest["segments"]:
+        if names is not None and seg["name"] not in names:
+            continue
+        docs = segment_docs(seg_dir, seg)
+        positions = [i for i, d in enumerate(docs) if d in doc_ids]
+        if not positions:
+            continue
+        bits = read_tombstones(seg_dir, seg)
+        fresh = [i for i in positions if not bits[i >> 3] >> (i & 7) & 1]
+        if not fresh:
+            continue
+        for i in fresh:
+            bits[i >> 3] |= 1 << (i & 7)
+        name = f"tombstones_{manifest['generation'] + 1}.bits"
+        with open(os.path.join(seg_dir, seg["name"], name), 'wb') as f:
+            f.write(bits)
+        if seg.get("tombstones"):
+            # superseded: the grace period for readers of the old manifest starts now
+            os.utime(os.path.join(seg_dir, seg["name"], seg["tombstones"]))
+        seg["tombstones"] = name
+        seg["deleted"] = seg.get("deleted", 0) + len(fresh)
+        deleted += len(fresh)
+    return deleted
+
+
+def init_base(seg_dir, base_dir, corpus_file, corpus_offset=None, force=False):
+    """
+    Start the segmented index from the full index in base_dir, built by index.py from corpus_file.
+    Ingestion starts at corpus_offset (default: the end of the corpus), so only documents added
+    after the build get segments. Returns the new manifest, None if one exists already and not force.
+    With force the manifest is replaced: run it after rebuilding the base from the whole corpus,
+    the segments it held are retired (and collected after the grace period).
+    """
+    with manifest_lock(seg_dir):
+        manifest = read_manifest(seg_dir)
+        if os.path.exists(os.path.join(seg_dir, MANIFEST)) and not force:
+            return None
+        base = {"name": BASE, "path": os.path.relpath(base_dir, seg_dir), "base": True,
+                "docs": 0, "deleted": 0, "tombstones": None}
+        _segment_docs.pop(BASE, None)
+        base["docs"] = len(segment_docs(seg_dir, base))
+        # holds the base's tombstones, a previous base's are stale
+        shutil.rmtree(os.path.join(seg_dir, BASE), ignore_errors=True)
+        os.makedirs(os.path.join(seg_dir, BASE))
+        retired = [seg["name"] for seg in manifest["segments"] if not seg.get("base")]
+        manifest["segments"] = [base]
+        manifest["corpus_offset"] = os.path.getsize(corpus_file) if corpus_offset is None else corpus_offset
+        write_manifest(seg_dir, manifest)
+    # the grace period for readers of the old manifest starts now
+    for name in retired:
+        os.utime(os.path.join(seg_dir, name))
+    return manifest
+
+
+def has_index(index_dir):
+    return all(os.path.exists(os.path.join(index_dir, f)) for f in ("dictionary.txt", "postings.txt"))
+
+
+def _reserve_segment(seg_dir):
+    # creating the directory reserves the name, the segment is invisible until the manifest lists it
+    with manifest_lock(seg_dir):
+        n = read_manifest(seg_dir)["next_segment"]
+        while True:
+            name = f"seg_{n:06d}"
+            try:
+                os.mkdir(os.path.join(seg_dir, name))
+            except FileExistsError:
+                n += 1
+                continue
+            open(os.path.join(seg_dir, name, BUILDING), 'w').close()
+            return name
+
+
+def _publish(seg_dir, manifest, name):
+    # write the manifest that lists the new segment (call with the lock held)
+    manifest["next_segment"] = max(manifest["next_segment"], int(name[4:]) + 1)
+    write_manifest(seg_dir, manifest)
+    os.remove(os.path.join(seg_dir, name, BUILDING))
+
+
+def add_documents(seg_dir, docs, corpus_offset=None):
+    """
+    Index docs into one new segment and publish it. Older copies of the same docIDs are
+    tombstoned in the same manifest update, so a re-indexed doc is never live twice.
+    corpus_offset (if given) is recorded in the same update, so ingestion resumes exactly
+    after the last published document.
+    """
+    # a docID repeated within the batch keeps its last version
+    docs = list({int(doc["id"]): doc for doc in docs}.values())
+    name = _reserve_segment(seg_dir)
+    path = os.path.join(seg_dir, name)
+    # built outside the lock, readers and other writers carry on meanwhile
+    n = index_documents(docs, os.path.join(path, "dictionary.txt"), os.path.join(path, "postings.txt"))
+    with manifest_lock(seg_dir):
+        manifest = read_manifest(seg_dir)
+        _tombstone(seg_dir, manifest, (int(doc["id"]) for doc in docs))
+        manifest["segments"].append({"name": name, "docs": n, "deleted": 0, "tombstones": None})
+        if corpus_offset is not None:
+            manifest["corpus_offset"] = corpus_offset
+        _publish(seg_dir, manifest, name)
+    return name
+
+
+def delete_documents(seg_dir, doc_ids):
+    """Tombstone doc_ids in every segment that holds them, returns how many docs were deleted."""
+    with manifest_lock(seg_dir):
+        manifest = read_manifest(seg_dir)
+        deleted = _tombstone(seg_dir, manifest, doc_ids)
+        if deleted:
+            write_manifest(seg_dir, manifest)
+    return deleted
+
+
+def ingest(seg_dir, corpus_file, segment_size=SEGMENT_DOCS, base_dir=None):
+    """
+    Index the documents appended to corpus_file since the last call (the manifest keeps
+    the byte offset), segment_size docs per segment. Returns the number of docs indexed.
+    A trailing line without its newline is left for the next call. The first call starts
+    from the full index in base_dir if there is one (see init_base), else from an empty index.
+    """
+    if base_dir and has_index(base_dir):
+        init_base(seg_dir, base_dir, corpus_file)
+    offset = read_manifest(seg_dir)["corpus_offset"]
+    if os.path.getsize(corpus_file) <= offset:
+        return 0
+    indexed = 0
+    batch = []
+    with open(corpus_file, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            offset += len(line)
+            if line.strip():
+                batch.append(json.loads(line))
+            if len(batch) >= segment_size:
+                add_documents(seg_dir, batch, offset)
+                indexed += len(batch)
+                batch = []
+    if batch:
+        add_documents(seg_dir, batch, offset)
+        indexed += len(batch)
+    return indexed
+
+
+def tier(docs, factor=MERGE_FACTOR, base=SEGMENT_DOCS):
+    # segments within the same power of `factor` (in live docs) share a tier
+    return int(math.log(max(docs, base) / base, factor))
+
+
+def find_merges(manifest, factor=MERGE_FACTOR, base=SEGMENT_DOCS, max_deleted_ratio=MAX_DELETED_RATIO):
+    """
+    Tiered merge policy. Returns lists of segment names to merge (each list becomes one segment):
+      - `factor` segments from the same tier, smallest first
+      - a single segment whose tombstoned share exceeds max_deleted_ratio (rewritten without them)
+    """
+    merges = []
+    tiers = defaultdict(list)
+    for seg in manifest["segments"]:
+        if seg.get("base"):
+            continue  # rebuilt by index.py, not merged
+        live = seg["docs"] - seg.get("deleted", 0)
+        if seg["docs"] and seg.get("deleted", 0) / seg["docs"] > max_deleted_ratio:
+            merges.append([seg["name"]])
+        else:
+            tiers[tier(live, factor, base)].append((live, seg["name"]))
+    for t in sorted(tiers):
+        candidates = sorted(tiers[t])
+        while len(candidates) >= factor:
+            merges.append([name for _, name in candidates[:factor]])
+            candidates = candidates[factor:]
+    return merges
+
+
+def merge_segments(seg_dir, names):
+    """
+    Merge the named segments into one, dropping tombstoned docs, and swap it into the manifest.
+    Readers keep using the old segments until they load the new manifest. Deletes that land on
+    the sources while the merge runs are carried over to the merged segment.
+    """
+    by_name = {seg["name"]: seg for seg in read_manifest(seg_dir)["segments"]}
+    sources = [by_name[n] for n in names]
+    name = _reserve_segment(seg_dir)
+    path = os.path.join(seg_dir, name)
+    deleted = [deleted_docs(seg_dir, seg) for seg in sources]
+    doc_lengths = {}
+    dictionaries = []
+    postings_fhs = []
+    try:
+        for seg, dead in zip(sources, deleted):
+            seg_path = segment_path(seg_dir, seg)
+            fh = PostingsFile(os.path.join(seg_path, "postings.txt"))
+            postings_fhs.append(fh)
+            for d, L in parse_lengths_line(fh.header().split()[1:]).items():
+                if d not in dead:
+                    doc_lengths[d] = L
+            dictionaries.append(load_dictionary(os.path.join(seg_path, "dictionary.txt"))[0])
+
+        def postings_lines():
+            for zk in sorted(set(itertools.chain.from_iterable(dictionaries))):
+                entries = []
+                for dictionary, fh, dead in zip(dictionaries, postings_fhs, deleted):
+                    if zk not in dictionary:
+                        continue
+                    entries.extend((d, pos) for d, _, pos, _ in read_postings(zk, dictionary, fh) if d not in dead)
+                if entries:
+                    entries.sort()
+                    yield zk, len(entries), encode_postings(entries)
+
+        write_postings_file(os.path.join(path, "dictionary.txt"), os.path.join(path, "postings.txt"),
+                            lengths_header(doc_lengths), postings_lines())
+    finally:
+        for fh in postings_fhs:
+            fh.close()
+
+    with manifest_lock(seg_dir):
+        manifest = read_manifest(seg_dir)
+        current = {seg["name"]: seg for seg in manifest["segments"]}
+        if any(n not in current for n in names):
+            # another merge retired one of the sources first
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        # deletes that happened since the merge started
+        late = set()
+        for seg, dead in zip(sources, deleted):
+            late |= deleted_docs(seg_dir, current[seg["name"]]) - dead
+        # the merged segment takes the place of the first source, keeping segments in creation order;
+        # if every doc was deleted there's nothing left to keep
+        merged = [{"name": name, "docs": len(doc_lengths), "deleted": 0, "tombstones": None}] if doc_lengths else []
+        segments = []
+        for seg in manifest["segments"]:
+            if seg["name"] == names[0]:
+                segments.extend(merged)
+            elif seg["name"] not in names:
+                segments.append(seg)
+        manifest["segments"] = segments
+        # only in the merged segment: a late delete may have been a re-add whose new copy lives elsewhere
+        _tombstone(seg_dir, manifest, late, names={name})
+        _publish(seg_dir, manifest, name)
+    # the grace period for readers of the old manifest starts now
+    for n in names:
+        os.utime(os.path.join(seg_dir, n))
+    if not doc_lengths:
+        shutil.rmtree(path, ignore_errors=True)
+        return None
+    return name
+
+
+def collect_garbage(seg_dir, grace=GRACE_SECONDS):
+    # remove segment directories (and stale tombstone files) the manifest stopped referencing > grace seconds ago
+    manifest = read_manifest(seg_dir)
+    live = {seg["name"]: seg.get("tombstones") for seg in manifest["segments"]}
+    cutoff = time.time() - grace
+    for entry in os.listdir(seg_dir):
+        path = os.path.join(seg_dir, entry)
+        if not entry.startswith("seg_") or not os.path.isdir(path):
+            continue
+        if entry not in live:
+            # retired segments are touched when retired; segments still being built have files in use
+            if os.path.getmtime(path) < cutoff and not os.path.exists(os.path.join(path, BUILDING)):
+                shutil.rmtree(path, ignore_errors=True)
+                _segment_docs.pop(entry, None)
+            continue
+        for f in os.listdir(path):
+            if f.startswith("tombstones_") and f != live[entry] and os.path.getmtime(os.path.join(path, f)) < cutoff:
+                os.remove(os.path.join(path, f))
+
+
+def maybe_merge(seg_dir, **policy):
+    """Run every merge the policy asks for, returns the names of the segments it created."""
+    merged = []
+    while True:
+        merges = find_merges(read_manifest(seg_dir), **policy)
+        if not merges:
+            break
+        for names in merges:
+            name = merge_segments(seg_dir, names)
+            # None: every doc was deleted, or another merge retired a source first
+            if name:
+                merged.append(name)
+    collect_garbage(seg_dir)
+    return merged
+
+
+class BackgroundMerger(threading.Thread):
+    # runs the merge policy every `interval` seconds until stop() is called
+    def __init__(self, seg_dir, interval=10.0, **policy):
+        super().__init__(daemon=True, name="segment-merger")
+        self.seg_dir = seg_dir
+        self.interval = interval
+        self.policy = policy
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                for name in maybe_merge(self.seg_dir, **self.policy):
+                    print(f"Merged segments into {name}", file=sys.stderr)
+            except Exception as e:
+                print(f"Segment merge failed: {e}", file=sys.stderr)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def watch(seg_dir, corpus_file, interval=2.0, segment_size=SEGMENT_DOCS, merge_interval=10.0, base_dir=None):
+    """Index new corpus documents every `interval` seconds while merging in the background."""
+    merger = BackgroundMerger(seg_dir, merge_interval)
+    merger.start()
+    try:
+        while True:
+            n = ingest(seg_dir, corpus_file, segment_size, base_dir)
+            if n:
+                print(f"Indexed {n} new documents", file=sys.stderr)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        merger.stop()
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Maintain the segmented index (segments.json)")
+    p.add_argument("--segments-dir", "-s", default="segments", help="Directory holding segments.json")
+    p.add_argument("--base-index-dir", "-b", default=None,
+                   help="Full index (dictionary.txt/postings.txt) the segments start from, default: the segments dir's parent")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    i = sub.add_parser("init", help="Start from the base index, only documents added after its build get segments")
+    i.add_argument("--corpus-file", "-c", default="../scripts/corpus.jsonl", help="Corpus the base index was built from")
+    i.add_argument("--corpus-offset", type=int, default=None, help="Where ingestion starts, default: the end of the corpus")
+    i.add_argument("--force", action="store_true", help="Replace an existing manifest (after rebuilding the base)")
+
+    ing = sub.add_parser("ingest", help="Index documents appended to the corpus since the last run")
+    ing.add_argument("--corpus-file", "-c", default="../scripts/corpus.jsonl", help="Path to your corpus file")
+    ing.add_argument("--segment-docs", type=int, default=SEGMENT_DOCS, help="Documents per segment")
+
+    w = sub.add_parser("watch", help="Keep ingesting new documents, merging in the background")
+    w.add_argument("--corpus-file", "-c", default="../scripts/corpus.jsonl", help="Path to your corpus file")
+    w.add_argument("--segment-docs", type=int, default=SEGMENT_DOCS, help="Documents per segment")
+    w.add_argument("--interval", type=float, default=2.0, help="Seconds between corpus checks")
+    w.add_argument("--merge-interval", type=float, default=10.0, help="Seconds between merge policy runs")
+
+    d = sub.add_parser("delete", help="Tombstone documents by id")
+    d.add_argument("ids", nargs="+", type=int, help="Document ids")
+
+    sub.add_parser("merge", help="Run the tiered merge policy once")
+    sub.add_parser("info", help="Print the manifest")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    seg_dir = args.segments_dir
+    os.makedirs(seg_dir, exist_ok=True)
+    base_dir = args.base_index_dir or os.path.dirname(os.path.abspath(seg_dir))
+    if args.command in ("init", "ingest", "watch") and not os.path.exists(args.corpus_file):
+        print(f"File not found: {args.corpus_file}", file=sys.stderr)
+        sys.exit(1)
+    if args.command == "init":
+        if not has_index(base_dir):
+            print(f"No index in {base_dir}, build it with index.py first", file=sys.stderr)
+            sys.exit(1)
+        manifest = init_base(seg_dir, base_dir, args.corpus_file, args.corpus_offset, args.force)
+        if manifest is None:
+            print(f"{os.path.join(seg_dir, MANIFEST)} exists already, use --force to replace it", file=sys.stderr)
+            sys.exit(1)
+        print(f"Base index {base_dir} ({manifest['segments'][0]['docs']} documents), "
+              f"ingestion starts at byte {manifest['corpus_offset']}")
+    elif args.command == "ingest":
+        n = ingest(seg_dir, args.corpus_file, args.segment_docs, base_dir)
+        print(f"Indexed {n} new documents")
+    elif args.command == "watch":
+        watch(seg_dir, args.corpus_file, args.interval, args.segment_docs, args.merge_interval, base_dir)
+    elif args.command == "delete":
+        print(f"Deleted {delete_documents(seg_dir, args.ids)} documents")
+    elif args.command == "merge":
+        merged = maybe_merge(seg_dir)
+        print(f"Merged into {', '.join(merged)}" if merged else "Nothing to merge")
+    elif args.command == "info":
+        print(json.dumps(read_manifest(seg_dir), indent=2))
+
+if __name__ == '__main__':
+    main()
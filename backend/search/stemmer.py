@@ -0,0 +1,185 @@
+"""
+Porter stemmer & tokenizer for the query path and the index builder.
+
+A dependency-free port of nltk's PorterStemmer in its default NLTK_EXTENSIONS
+mode, stem for stem, so indexes built with nltk keep matching. Importing nltk
+costs ~200ms per search.py invocation, importing this module costs nothing.
+"""
+import re
+from functools import lru_cache
+
+# bounded, so a long-running process (index build, resident engine) can't grow it without limit
+STEM_CACHE_SIZE = 65536
+
+VOWELS = frozenset("aeiou")
+
+# NLTK_EXTENSIONS irregular forms
+IRREGULAR = {
+    "sky": "sky", "skies": "sky",
+    "dying": "die", "lying": "lie", "tying": "tie",
+    "news": "news",
+    "innings": "inning", "inning": "inning",
+    "outings": "outing", "outing": "outing",
+    "cannings": "canning", "canning": "canning",
+    "howe": "howe",
+    "proceed": "proceed", "exceed": "exceed", "succeed": "succeed",
+}
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    # same tokens as the index builder: runs of word characters, lowercased
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _consonants(word):
+    # y is a consonant at the start of a word or after a vowel
+    flags = []
+    for i, ch in enumerate(word):
+        if ch in VOWELS:
+            flags.append(False)
+        elif ch == 'y':
+            flags.append(i == 0 or not flags[i - 1])
+        else:
+            flags.append(True)
+    return flags
+
+
+def _is_consonant(word, i):
+    return _consonants(word[:i + 1])[i]
+
+
+def _measure(stem):
+    # m in [C](VC){m}[V]
+    flags = _consonants(stem)
+    return sum(1 for a, b in zip(flags, flags[1:]) if not a and b)
+
+
+def _contains_vowel(stem):
+    return not all(_consonants(stem))
+
+
+def _ends_double_consonant(word):
+    return len(word) >= 2 and word[-1] == word[-2] and _is_consonant(word, len(word) - 1)
+
+
+def _ends_cvc(word):
+    if len(word) >= 3:
+        flags = _consonants(word)
+        if flags[-3] and not flags[-2] and flags[-1] and word[-1] not in "wxy":
+            return True
+    return len(word) == 2 and not _is_consonant(word, 0) and _is_consonant(word, 1)
+
+
+def _m_gt_0(stem):
+    return _measure(stem) > 0
+
+
+def _m_gt_1(stem):
+    return _measure(stem) > 1
+
+
+def _apply_rules(word, rules):
+    # the first rule whose suffix matches decides, whether or not its condition holds
+    for suffix, replacement, condition in rules:
+        if suffix == "*d":
+            if _ends_double_consonant(word):
+                stem = word[:-2]
+                return stem + replacement if condition is None or condition(stem) else word
+            continue
+        if word.endswith(suffix):
+            stem = word[:len(word) - len(suffix)]
+            return stem + replacement if condition is None or condition(stem) else word
+    return word
+
+
+def _step1a(word):
+    if word.endswith("ies") and len(word) == 4:
+        return word[:-3] + "ie"
+    return _apply_rules(word, [("sses", "ss", None), ("ies", "i", None), ("ss", "ss", None), ("s", "", None)])
+
+
+def _step1b(word):
+    if word.endswith("ied"):
+        return word[:-3] + ("ie" if len(word) == 4 else "i")
+    if word.endswith("eed"):
+        stem = word[:-3]
+        return stem + "ee" if _measure(stem) > 0 else word
+    for suffix in ("ed", "ing"):
+        if word.endswith(suffix) and _contains_vowel(word[:-len(suffix)]):
+            stem = word[:-len(suffix)]
+            break
+    else:
+        return word
+    return _apply_rules(stem, [
+        ("at", "ate", None),
+        ("bl", "ble", None),
+        ("iz", "ize", None),
+        ("*d", stem[-1], lambda s: stem[-1] not in "lsz"),
+        ("", "e", lambda s: _measure(s) == 1 and _ends_cvc(s)),
+    ])
+
+
+def _step1c(word):
+    # y -> i only after a consonant that isn't the whole stem: happy -> happi, enjoy -> enjoy
+    return _apply_rules(word, [("y", "i", lambda s: len(s) > 1 and _is_consonant(s, len(s) - 1))])
+
+
+STEP2_RULES = [
+    ("ational", "ate"), ("tional", "tion"), ("enci", "ence"), ("anci", "ance"), ("izer", "ize"),
+    ("bli", "ble"), ("alli", "al"), ("entli", "ent"), ("eli", "e"), ("ousli", "ous"),
+    ("ization", "ize"), ("ation", "ate"), ("ator", "ate"), ("alism", "al"), ("iveness", "ive"),
+    ("fulness", "ful"), ("ousness", "ous"), ("aliti", "al"), ("iviti", "ive"), ("biliti", "ble"),
+    ("fulli", "ful"),
+]
+
+
+def _step2(word):
+    if word.endswith("alli") and _m_gt_0(word[:-4]):
+        return _step2(word[:-4] + "al")
+    rules = [(suffix, replacement, _m_gt_0) for suffix, replacement in STEP2_RULES]
+    rules.append(("logi", "log", lambda s: _m_gt_0(word[:-3])))
+    return _apply_rules(word, rules)
+
+
+def _step3(word):
+    return _apply_rules(word, [
+        ("icate", "ic", _m_gt_0), ("ative", "", _m_gt_0), ("alize", "al", _m_gt_0), ("iciti", "ic", _m_gt_0),
+        ("ical", "ic", _m_gt_0), ("ful", "", _m_gt_0), ("ness", "", _m_gt_0),
+    ])
+
+
+STEP4_SUFFIXES = ["al", "ance", "ence", "er", "ic", "able", "ible", "ant", "ement", "ment", "ent",
+                  "ion", "ou", "ism", "ate", "iti", "ous", "ive", "ize"]
+
+
+def _step4(word):
+    rules = [(suffix, "", _m_gt_1) for suffix in STEP4_SUFFIXES]
+    rules[STEP4_SUFFIXES.index("ion")] = ("ion", "", lambda s: _m_gt_1(s) and s[-1] in "st")
+    return _apply_rules(word, rules)
+
+
+def _step5a(word):
+    if word.endswith("e"):
+        stem = word[:-1]
+        m = _measure(stem)
+        if m > 1 or (m == 1 and not _ends_cvc(stem)):
+            return stem
+    return word
+
+
+def _step5b(word):
+    return _apply_rules(word, [("ll", "l", lambda s: _m_gt_1(word[:-1]))])
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem(word):
+    w = word.lower()
+    if w in IRREGULAR:
+        return IRREGULAR[w]
+    if len(w) <= 2:
+        return w
+    for step in (_step1a, _step1b, _step1c, _step2, _step3, _step4, _step5a, _step5b):
+        w = step(w)
+    return w
@@ -0,0 +1,138 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from array import array
+
+from index import index_documents, build_champions, build_impacts
+from search import (
+    PostingsFile, SearchIndex, TermScoreCache, fetch_postings, load_dictionary, read_dictionary_entries,
+    run_query, query_stats, score_bm25_saat, score_bm25_topk,
+)
+
+
+def make_docs(ids):
+    # docs up to 20 mention the query terms i times, so the highest of them are the champions
+    return [{"id": str(i), "title": f"Case {i}",
+             "content": "breach of contract damages " * i if i <= 20 else "negligence duty of care",
+             "court": "SG High Court", "date": "2020-01-01"} for i in ids]
+
+
+class FastModeBooleanTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="search-test-")
+        self.path = lambda f: os.path.join(self.dir, f)
+        with open(self.path("corpus.jsonl"), "w") as f:
+            for doc in make_docs(range(1, 41)):
+                f.write(json.dumps(doc) + "\n")
+        index_documents(make_docs(range(1, 41)), self.path("dictionary.txt"), self.path("postings.txt"))
+        build_champions(self.path("dictionary.txt"), self.path("postings.txt"), self.path("corpus.jsonl"),
+                        self.path("champions_dictionary.txt"), self.path("champions.txt"), r=3)
+        self.index = SearchIndex(self.path("dictionary.txt"), self.path("postings.txt"), self.path("corpus.jsonl"),
+                                 champions_dict_file=self.path("champions_dictionary.txt"),
+                                 champions_file=self.path("champions.txt"))
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_boolean_matches_outside_champions_are_scored(self):
+        # the boolean results (lowest docIDs first) aren't in the 3-doc champion lists
+        fast = run_query(self.index, "contract AND damages", 3, mode="fast")
+        self.assertEqual(query_stats().plan["tier"], "champions")
+        exhaustive = run_query(self.index, "contract AND damages", 3)
+        self.assertEqual([r["id"] for r in fast], ["1", "2", "3"])
+        self.assertTrue(all(r["score"] > 0 for r in fast))
+        self.assertEqual([(r["id"], r["score"]) for r in fast], [(r["id"], r["score"]) for r in exhaustive])
+
+
+class Bm25EarlyTerminationTest(unittest.TestCase):
+    # docs with the same terms score the same, the top-k among ties goes to the smallest docIDs
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="search-test-")
+        self.path = lambda f: os.path.join(self.dir, f)
+        terms = ["contract", "damages", "contract damages", "negligence"]
+        docs = [{"id": str(i), "title": f"Case {i}", "content": terms[i % 4] + " case"} for i in range(1, 81)]
+        index_documents(docs, self.path("dictionary.txt"), self.path("postings.txt"))
+        build_impacts(self.path("dictionary.txt"), self.path("postings.txt"),
+                      self.path("impacts_dictionary.txt"), self.path("impacts.txt"))
+        self.index = SearchIndex(self.path("dictionary.txt"), self.path("postings.txt"), None,
+                                 self.path("impacts_dictionary.txt"), self.path("impacts.txt"))
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_top_k_matches_a_full_evaluation(self):
+        impacts_dict, impacts_fh = self.index.impacts()
+        for query in ({"contract": 1, "damag": 1}, {"contract": 1, "neglig": 1}, {"damag": 2, "case": 1}):
+            full = score_bm25_topk(query, impacts_dict, impacts_fh, {}, 80)
+            for topk in (1, 5, 20, 25):
+                saat = score_bm25_saat(query, impacts_dict, impacts_fh, {}, topk)
+                ranked = lambda scores: sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:topk]
+                self.assertEqual(ranked(saat), ranked(full), (query, topk))
+
+
+class DictionaryEntriesTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="search-test-")
+        self.path = lambda f: os.path.join(self.dir, f)
+        # postings lines at 14 ("1,1:0:"), 21 ("1,2:0,1:"), 30 ("1,1:0: 1,1:3:"), listed out of file order
+        with open(self.path("postings.txt"), "wb") as f:
+            f.write(b"2 1:1.0 2:1.0\n1,1:0:\n1,2:0,1:\n1,1:0: 1,1:3:\n")
+        with open(self.path("dictionary.txt"), "w") as f:
+            f.write("damag@content 2 30\nbreach@content 1 14\ncontract@title 1 21\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_lengths_run_to_the_next_larger_offset(self):
+        entries = list(read_dictionary_entries(self.path("dictionary.txt")))
+        self.assertEqual(entries, [("damag@content", 2, 30, None), ("breach@content", 1, 14, 7),
+                                   ("contract@title", 1, 21, 9)])
+
+    def test_postings_read_with_the_lengths(self):
+        dictionary, _ = load_dictionary(self.path("dictionary.txt"))
+        postings_fh = PostingsFile(self.path("postings.txt"))
+        try:
+            fetched = fetch_postings(list(dictionary), dictionary, postings_fh)
+        finally:
+            postings_fh.close()
+        self.assertEqual({zk: [(d, tf) for d, tf, _, _ in p] for zk, p in fetched.items()},
+                         {"damag@content": [(1, 1), (2, 1)], "breach@content": [(1, 1)],
+                          "contract@title": [(1, 2)]})
+
+
+class TermScoreCacheTest(unittest.TestCase):
+    def vector(self, n):
+        return array('q', range(n)), array('d', [1.0] * n)
+
+    def test_reload_keeps_entries_of_the_previous_version(self):
+        cache = TermScoreCache(1 << 20)
+        old = cache.bind("v1")
+        old.put("contract@content", 5, *self.vector(5))
+        new = cache.bind("v2")
+        new.put("contract@content", 6, *self.vector(6))
+        # a query still running on v1 while v2 is loaded keeps its entries, each version sees only its own
+        old = cache.bind("v1")
+        self.assertEqual(len(old.get("contract@content", 5)[0]), 5)
+        self.assertEqual(len(new.get("contract@content", 6)[0]), 6)
+        self.assertIsNone(cache.bind("v3").get("contract@content", 6))
+
+    def test_unused_old_version_ages_out(self):
+        docs, weights = self.vector(100)
+        nbytes = sys.getsizeof(docs) + sys.getsizeof(weights) + sys.getsizeof("t0@content")
+        cache = TermScoreCache(3 * nbytes)
+        old = cache.bind("v1")
+        old.put("t0@content", 100, docs, weights)
+        new = cache.bind("v2")
+        for t in ("t0@content", "t1@content", "t2@content"):
+            new.put(t, 100, *self.vector(100))
+        self.assertIsNone(old.get("t0@content", 100))
+        self.assertEqual(len(cache), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+import segments
+from index import index_documents, build_impacts
+from search import SearchIndex, run_query, query_stats, reset_query_stats
+
+
+def make_docs(ids):
+    return [{"id": str(i), "title": f"Case {i}", "content": f"breach of contract damages case {i}",
+             "court": "SG High Court", "date": "2020-01-01"} for i in ids]
+
+
+class DeleteAllThenMergeTest(unittest.TestCase):
+    def setUp(self):
+        self.seg_dir = tempfile.mkdtemp(prefix="segments-test-")
+        segments._segment_docs.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.seg_dir, ignore_errors=True)
+
+    def test_merge_drops_fully_deleted_segment(self):
+        name = segments.add_documents(self.seg_dir, make_docs(range(1, 11)))
+        self.assertEqual(segments.delete_documents(self.seg_dir, range(1, 11)), 10)
+
+        self.assertEqual(segments.maybe_merge(self.seg_dir), [])
+        self.assertEqual(segments.read_manifest(self.seg_dir)["segments"], [])
+        # the retired segment stays on disk for in-flight readers until the grace period is over
+        self.assertTrue(os.path.isdir(os.path.join(self.seg_dir, name)))
+        segments.collect_garbage(self.seg_dir, grace=-1)
+        self.assertEqual([e for e in os.listdir(self.seg_dir) if e.startswith("seg_")], [])
+
+    def test_merge_command_with_everything_deleted(self):
+        segments.add_documents(self.seg_dir, make_docs(range(1, 11)))
+        segments.delete_documents(self.seg_dir, range(1, 11))
+        out = io.StringIO()
+        with mock.patch("sys.argv", ["segments.py", "-s", self.seg_dir, "merge"]), redirect_stdout(out):
+            segments.main()
+        self.assertEqual(out.getvalue().strip(), "Nothing to merge")
+
+    def test_merge_keeps_live_docs(self):
+        segments.add_documents(self.seg_dir, make_docs(range(1, 11)))
+        segments.add_documents(self.seg_dir, make_docs(range(11, 21)))
+        segments.delete_documents(self.seg_dir, range(11, 21))
+        segments.delete_documents(self.seg_dir, range(1, 6))
+
+        merged = segments.maybe_merge(self.seg_dir)
+        self.assertEqual(len(merged), 1)
+        manifest = segments.read_manifest(self.seg_dir)
+        self.assertEqual([seg["name"] for seg in manifest["segments"]], merged)
+        self.assertEqual(manifest["segments"][0]["docs"], 5)
+
+        index = SearchIndex(segments_manifest=os.path.join(self.seg_dir, segments.MANIFEST), metadata_file=None)
+        try:
+            self.assertEqual(sorted(index.doc_lengths), list(range(6, 11)))
+        finally:
+            index.close()
+
+
+class BaseSegmentTest(unittest.TestCase):
+    # the full index is the base segment, segments only get documents added after it was built
+    def setUp(self):
+        self.index_dir = tempfile.mkdtemp(prefix="base-test-")
+        self.path = lambda f: os.path.join(self.index_dir, f)
+        self.seg_dir = self.path("segments")
+        self.corpus = self.path("corpus.jsonl")
+        segments._segment_docs.clear()
+        self.append(make_docs(range(1, 21)))
+        index_documents(make_docs(range(1, 21)), self.path("dictionary.txt"), self.path("postings.txt"))
+        build_impacts(self.path("dictionary.txt"), self.path("postings.txt"),
+                      self.path("impacts_dictionary.txt"), self.path("impacts.txt"))
+
+    def tearDown(self):
+        shutil.rmtree(self.index_dir, ignore_errors=True)
+
+    def append(self, docs):
+        with open(self.corpus, "a") as f:
+            for doc in docs:
+                f.write(json.dumps(doc) + "\n")
+
+    def open_index(self):
+        return SearchIndex(segments_manifest=os.path.join(self.seg_dir, segments.MANIFEST), metadata_file=self.corpus,
+                           impacts_dict_file=self.path("impacts_dictionary.txt"), impacts_file=self.path("impacts.txt"))
+
+    def test_first_ingest_starts_after_the_base(self):
+        self.assertEqual(segments.ingest(self.seg_dir, self.corpus, base_dir=self.index_dir), 0)
+        manifest = segments.read_manifest(self.seg_dir)
+        self.assertEqual([seg["name"] for seg in manifest["segments"]], [segments.BASE])
+        self.assertEqual(manifest["segments"][0]["docs"], 20)
+        self.assertEqual(manifest["corpus_offset"], os.path.getsize(self.corpus))
+
+        self.append(make_docs([21, 22]))
+        self.assertEqual(segments.ingest(self.seg_dir, self.corpus, base_dir=self.index_dir), 2)
+        manifest = segments.read_manifest(self.seg_dir)
+        self.assertEqual(len(manifest["segments"]), 2)
+        self.assertEqual(manifest["segments"][1]["docs"], 2)
+        index = self.open_index()
+        try:
+            self.assertEqual(sorted(index.doc_lengths), list(range(1, 23)))
+        finally:
+            index.close()
+
+    def test_bm25_on_the_base_alone_then_downgraded(self):
+        segments.ingest(self.seg_dir, self.corpus, base_dir=self.index_dir)
+        index = self.open_index()
+        try:
+            self.assertTrue(index.postings_fh.base_only)
+            reset_query_stats()
+            results = run_query(index, "contract damages", 5, ranking="bm25")
+            self.assertNotIn("downgraded", query_stats().plan)
+            self.assertEqual(query_stats().plan["ranking"], "bm25")
+            self.assertEqual(len(results), 5)
+        finally:
+            index.close()
+
+        self.append(make_docs([21]))
+        segments.ingest(self.seg_dir, self.corpus, base_dir=self.index_dir)
+        index = self.open_index()
+        try:
+            self.assertFalse(index.postings_fh.base_only)
+            reset_query_stats()
+            run_query(index, "contract damages", 5, ranking="bm25")
+            stats = query_stats()
+            self.assertEqual(stats.plan["downgraded"], {"ranking": "bm25", "mode": "exhaustive"})
+            self.assertEqual(stats.plan["ranking"], "tfidf")
+            self.assertEqual(stats.counters["segmented_downgrades"], 1)
+        finally:
+            index.close()
+
+    def test_delete_from_base_and_merge_leaves_it(self):
+        segments.ingest(self.seg_dir, self.corpus, base_dir=self.index_dir)
+        self.assertEqual(segments.delete_documents(self.seg_dir, [3, 4]), 2)
+        self.assertEqual(segments.maybe_merge(self.seg_dir, max_deleted_ratio=0.0), [])
+        manifest = segments.read_manifest(self.seg_dir)
+        self.assertEqual([seg["name"] for seg in manifest["segments"]], [segments.BASE])
+        index = self.open_index()
+        try:
+            self.assertFalse(index.postings_fh.base_only)
+            self.assertNotIn(3, index.doc_lengths)
+            self.assertNotIn("3", [r["id"] for r in run_query(index, "contract", 20)])
+        finally:
+            index.close()
+
+    def test_init_force_retires_segments(self):
+        segments.ingest(self.seg_dir, self.corpus, base_dir=self.index_dir)
+        self.append(make_docs([21]))
+        segments.ingest(self.seg_dir, self.corpus, base_dir=self.index_dir)
+        self.assertIsNone(segments.init_base(self.seg_dir, self.index_dir, self.corpus))
+        manifest = segments.init_base(self.seg_dir, self.index_dir, self.corpus, force=True)
+        self.assertEqual([seg["name"] for seg in manifest["segments"]], [segments.BASE])
+        self.assertEqual(manifest["corpus_offset"], os.path.getsize(self.corpus))
+
+
+if __name__ == '__main__':
+    unittest.main()